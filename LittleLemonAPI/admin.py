@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Category, MenuItem, Cart, Order, OrderItem
+from .models import Category, MenuItem, Cart, Order, OrderItem, Job
 
 # Register your models here.
-admin.site.register([Category, MenuItem, Cart, Order, OrderItem])
+admin.site.register([Category, MenuItem, Cart, Order, OrderItem, Job])
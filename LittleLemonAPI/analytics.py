@@ -0,0 +1,230 @@
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DecimalField, F, Q, Sum
+
+from .models import DailyCrewDeliveries, DailyItemSales, DailyRevenue, Order, OrderItem
+
+#------------------------------------------------------------
+# Rollup deltas
+#------------------------------------------------------------
+# Each rollup is keyed by some of its fields; a delta maps a key tuple to
+# the amounts to add to that row, e.g. {(date,): {'orders': 1, ...}}
+ROLLUP_KEYS = {
+    DailyRevenue: ('date',),
+    DailyItemSales: ('date', 'menuitem_id'),
+    DailyCrewDeliveries: ('date', 'delivery_crew_id'),
+}
+
+ORDER_STATE_FIELDS = ('date', 'status', 'total', 'delivery_crew_id')
+
+# Sums of prices and totals can exceed the 6 digits of a single price
+MONEY = DecimalField(max_digits=12, decimal_places=2)
+
+
+def merge(deltas, key, amounts):
+    row = deltas.setdefault(key, {})
+    for field, amount in amounts.items():
+        row[field] = row.get(field, 0) + amount
+
+
+# What an order in `state` (ORDER_STATE_FIELDS) adds to the revenue and crew
+# rollups; sign=-1 takes it back out
+def order_deltas(state, sign=1):
+    deltas = {DailyRevenue: {}, DailyCrewDeliveries: {}}
+    date, delivered, total = state['date'], bool(state['status']), Decimal(state['total'])
+    merge(deltas[DailyRevenue], (date,), {
+        'orders': sign,
+        'delivered_orders': sign if delivered else 0,
+        'revenue': sign * total,
+    })
+    if delivered and state['delivery_crew_id']:
+        merge(deltas[DailyCrewDeliveries], (date, state['delivery_crew_id']), {'delivered': sign, 'revenue': sign * total})
+    return deltas
+
+
+# items: dicts or objects with menuitem_id, quantity and price
+def item_deltas(date, items, sign=1):
+    deltas = {}
+    for item in items:
+        if isinstance(item, dict):
+            menuitem_id, quantity, price = item['menuitem_id'], item['quantity'], item['price']
+        else:
+            menuitem_id, quantity, price = item.menuitem_id, item.quantity, item.price
+        merge(deltas, (date, menuitem_id), {'quantity': sign * quantity, 'revenue': sign * Decimal(price)})
+    return {DailyItemSales: deltas}
+
+
+def order_state(order):
+    state = {field: getattr(order, field) for field in ORDER_STATE_FIELDS}
+    state['date'] = Order._meta.get_field('date').to_python(state['date'])
+    return state
+
+
+#------------------------------------------------------------
+# Applying deltas
+#------------------------------------------------------------
+# Adds the amounts to existing rows with UPDATE ... SET x = x + amount and
+# inserts the missing ones: one SELECT, one bulk UPDATE and one bulk INSERT
+# per rollup at most, however many keys. Rows left all zero are kept, they
+# are harmless and are the likeliest to be needed again.
+def apply_deltas(deltas):
+    for model, rows in deltas.items():
+        rows = {key: amounts for key, amounts in rows.items() if any(amounts.values())}
+        if rows:
+            apply_rollup_deltas(model, rows)
+
+
+def apply_rollup_deltas(model, rows):
+    key_fields = ROLLUP_KEYS[model]
+    lookup = Q()
+    for key in rows:
+        lookup |= Q(**dict(zip(key_fields, key)))
+    existing = {
+        tuple(getattr(row, field) for field in key_fields): row
+        for row in model.objects.filter(lookup).only('id', *key_fields)
+    }
+
+    missing = [key for key in rows if key not in existing]
+    if missing:
+        try:
+            with transaction.atomic():
+                model.objects.bulk_create([model(**dict(zip(key_fields, key)), **rows[key]) for key in missing])
+        except IntegrityError:
+            # Another transaction created some of them first; start over,
+            # they will be updated this time
+            return apply_rollup_deltas(model, rows)
+
+    to_update = []
+    fields = set()
+    for key, amounts in rows.items():
+        row = existing.get(key)
+        if row is None:
+            continue
+        for field, amount in amounts.items():
+            setattr(row, field, F(field) + amount)
+            fields.add(field)
+        to_update.append(row)
+    if to_update:
+        model.objects.bulk_update(to_update, sorted(fields))
+
+
+#------------------------------------------------------------
+# Incremental updates
+#------------------------------------------------------------
+# Order saves and deletes are followed through signals.py. Order items are
+# bulk inserted by checkout, which reports them here itself; rows written
+# any other way are picked up by rebuild_analytics. QuerySet.update() skips
+# signals too, callers report those changes with record_order_change.
+def record_order_change(before, after, order_id=None):
+    record_order_changes([(before, after, order_id)])
+
+
+# Changes to many orders, [(before, after, order_id), ...], merged and
+# applied together: one round of rollup queries for the lot, for bulk
+# updates that send no signals
+def record_order_changes(changes):
+    deltas = {}
+    for before, after, order_id in changes:
+        for state, sign in ((before, -1), (after, 1)):
+            if state is not None:
+                for model, rows in order_deltas(state, sign).items():
+                    for key, amounts in rows.items():
+                        merge(deltas.setdefault(model, {}), key, amounts)
+        # Item sales are filed under the order's date, move them along with it
+        if before is not None and after is not None and before['date'] != after['date'] and order_id is not None:
+            items = list(OrderItem.objects.filter(order_id=order_id).values('menuitem_id', 'quantity', 'price'))
+            for state, sign in ((before, -1), (after, 1)):
+                for key, amounts in item_deltas(state['date'], items, sign)[DailyItemSales].items():
+                    merge(deltas.setdefault(DailyItemSales, {}), key, amounts)
+    apply_deltas(deltas)
+
+
+def record_order_items(order, items):
+    apply_deltas(item_deltas(order_state(order)['date'], items))
+
+
+def record_order_deleted(order):
+    state = order_state(order)
+    items = list(OrderItem.objects.filter(order_id=order.pk).values('menuitem_id', 'quantity', 'price'))
+    deltas = order_deltas(state, -1)
+    deltas.update(item_deltas(state['date'], items, -1))
+    apply_deltas(deltas)
+
+
+#------------------------------------------------------------
+# Rebuilding
+#------------------------------------------------------------
+# Recomputes the rollups from the orders, batch_size orders at a time. Each
+# batch is aggregated by the database and merged in memory, so only the
+# rollup rows are held, never the orders. Runs in one transaction: readers
+# never see a half rebuilt table and orders placed meanwhile aren't lost.
+@transaction.atomic
+def rebuild_rollups(batch_size=5000, progress=None):
+    deltas = {model: {} for model in ROLLUP_KEYS}
+    last_id = 0
+    while True:
+        ids = list(Order.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:batch_size])
+        if not ids:
+            break
+        orders = Order.objects.filter(id__gte=ids[0], id__lte=ids[-1])
+        for row in orders.values('date', 'status').annotate(count=Count('id'), revenue=Sum('total', output_field=MONEY)):
+            merge(deltas[DailyRevenue], (row['date'],), {
+                'orders': row['count'],
+                'delivered_orders': row['count'] if row['status'] else 0,
+                'revenue': row['revenue'],
+            })
+        delivered = orders.filter(status=True, delivery_crew__isnull=False)
+        for row in delivered.values('date', 'delivery_crew_id').annotate(count=Count('id'), revenue=Sum('total', output_field=MONEY)):
+            merge(deltas[DailyCrewDeliveries], (row['date'], row['delivery_crew_id']), {
+                'delivered': row['count'],
+                'revenue': row['revenue'],
+            })
+        items = OrderItem.objects.filter(order_id__gte=ids[0], order_id__lte=ids[-1])
+        for row in items.values('order__date', 'menuitem_id').annotate(sold=Sum('quantity'), revenue=Sum('price', output_field=MONEY)):
+            merge(deltas[DailyItemSales], (row['order__date'], row['menuitem_id']), {
+                'quantity': row['sold'],
+                'revenue': row['revenue'],
+            })
+        last_id = ids[-1]
+        if progress is not None:
+            progress(last_id, len(ids))
+
+    for model, rows in deltas.items():
+        key_fields = ROLLUP_KEYS[model]
+        model.objects.all().delete()
+        model.objects.bulk_create(
+            [model(**dict(zip(key_fields, key)), **amounts) for key, amounts in rows.items()],
+            batch_size=batch_size,
+        )
+    return {model.__name__: len(rows) for model, rows in deltas.items()}
+
+
+#------------------------------------------------------------
+# Reports
+#------------------------------------------------------------
+# Read only from the rollups: at most one row per day (and item or crew
+# member) whatever the number of orders.
+
+def revenue_by_day(date_from, date_to):
+    return DailyRevenue.objects.filter(date__gte=date_from, date__lte=date_to).order_by('-date')
+
+
+def top_menu_items(date_from, date_to, limit=10):
+    return (
+        DailyItemSales.objects.filter(date__gte=date_from, date__lte=date_to)
+        .values('menuitem_id', 'menuitem__title')
+        .annotate(quantity_sold=Sum('quantity'), revenue_total=Sum('revenue', output_field=MONEY))
+        .filter(quantity_sold__gt=0)
+        .order_by('-quantity_sold', '-revenue_total', 'menuitem_id')[:limit]
+    )
+
+
+def crew_throughput(date_from, date_to):
+    return (
+        DailyCrewDeliveries.objects.filter(date__gte=date_from, date__lte=date_to)
+        .values('delivery_crew_id', 'delivery_crew__username')
+        .annotate(delivered_total=Sum('delivered'), revenue_total=Sum('revenue', output_field=MONEY))
+        .filter(delivered_total__gt=0)
+        .order_by('-delivered_total', 'delivery_crew_id')
+    )
@@ -0,0 +1,140 @@
+import math
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.views import View
+from rest_framework import exceptions, status
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+
+from .cache import acached_menu_response, conditional
+from .filters import MenuItemFilter
+from .models import MenuItem, Cart, Order, OrderItem
+from .pagination import MenuItemPagination
+from .roles import get_user_roles, MANAGER, CUSTOMER, DELIVERY_CREW
+from .serializers import MenuItemSerializer, CartSerializer, OrderSerializer, OrderItemSerializer
+from .views import cart_validators, order_list_validators
+
+
+# Async variants of the hot read endpoints, for serving from core.asgi.
+# They return the same payloads as their APIView counterparts in views.py but
+# read through Django's async ORM, so a slow client doesn't hold a worker.
+
+
+def json_response(data, status=status.HTTP_200_OK):
+    return JsonResponse(data, status=status, safe=False, encoder=JSONEncoder)
+
+
+#------------------------------------------------------------
+# Async base view
+#------------------------------------------------------------
+class AsyncAPIView(View):
+    # Authenticates with the DRF authentication classes from REST_FRAMEWORK,
+    # applies its throttles, and hands the handler a DRF Request, so
+    # query_params and the helpers shared with the sync views work unchanged.
+    http_method_names = ['get', 'head', 'options']
+    throttle_scope = None
+
+    async def dispatch(self, request, *args, **kwargs):
+        handler = getattr(self, request.method.lower(), None)
+        if request.method.lower() not in self.http_method_names or handler is None:
+            return await self.http_method_not_allowed(request, *args, **kwargs)
+
+        request = Request(request, authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES])
+        try:
+            user = await sync_to_async(lambda: request.user)()
+        except exceptions.AuthenticationFailed as exc:
+            return json_response({'detail': exc.detail}, status=status.HTTP_401_UNAUTHORIZED)
+        if not user.is_authenticated:
+            return json_response(
+                {'detail': exceptions.NotAuthenticated.default_detail}, status=status.HTTP_401_UNAUTHORIZED
+            )
+
+        wait = await sync_to_async(self.check_throttles)(request)
+        if wait is not None:
+            exc = exceptions.Throttled(wait)
+            response = json_response({'detail': exc.detail}, status=exc.status_code)
+            response['Retry-After'] = str(math.ceil(wait))
+            return response
+
+        try:
+            return await handler(request, *args, **kwargs)
+        except exceptions.APIException as exc:
+            return json_response(exc.detail, status=exc.status_code)
+
+    # None if every throttle lets the request through, else the longest wait
+    def check_throttles(self, request):
+        waits = []
+        for throttle in (throttle_class() for throttle_class in api_settings.DEFAULT_THROTTLE_CLASSES):
+            if not throttle.allow_request(request, self):
+                waits.append(throttle.wait() or 0)
+        return max(waits) if waits else None
+
+    async def get_roles(self, request):
+        return await sync_to_async(get_user_roles)(request.user)
+
+
+#------------------------------------------------------------
+# Menu
+#------------------------------------------------------------
+class AsyncMenuItemView(AsyncAPIView):
+    @conditional('menu')
+    async def get(self, request):
+        if not await sync_to_async(request.user.has_perm)('LittleLemonAPI.view_menuitem'):
+            return json_response("Not authorized to view this page", status=status.HTTP_401_UNAUTHORIZED)
+
+        async def build_payload():
+            menu_items = MenuItemSerializer.read_queryset(MenuItem.objects.all(), request)
+            menu_items = MenuItemFilter().filter_queryset(request, menu_items, self)
+            paginator = MenuItemPagination()
+            page_queryset = paginator.get_page_queryset(menu_items, request)
+            page = paginator.build_page([item async for item in page_queryset.aiterator()])
+            return paginator.get_paginated_response(MenuItemSerializer.read_data(page, request)).data
+
+        return await acached_menu_response(request, 'menu-items', build_payload, json_response)
+
+
+class AsyncMenuItemDetail(AsyncAPIView):
+    @conditional('menu')
+    async def get(self, request, id):
+        async def build_payload():
+            try:
+                menu_item = await MenuItemSerializer.setup_eager_loading(MenuItem.objects.all(), request).aget(id=id)
+            except MenuItem.DoesNotExist:
+                menu_item = None
+            return MenuItemSerializer(menu_item, context={'request': request}).data
+
+        return await acached_menu_response(request, f'menu-item:{id}', build_payload, json_response)
+
+
+#------------------------------------------------------------
+# Cart and orders
+#------------------------------------------------------------
+class AsyncCartView(AsyncAPIView):
+    throttle_scope = 'cart'
+
+    @conditional('cart', cart_validators)
+    async def get(self, request):
+        if CUSTOMER not in await self.get_roles(request):
+            return json_response("Not authorized to view this page", status=status.HTTP_401_UNAUTHORIZED)
+        carts = CartSerializer.read_queryset(Cart.objects.filter(user=request.user), request)
+        return json_response(CartSerializer.read_data([cart async for cart in carts.aiterator()], request))
+
+
+class AsyncOrderView(AsyncAPIView):
+    throttle_scope = 'orders'
+
+    @conditional('orders', order_list_validators)
+    async def get(self, request):
+        roles = await self.get_roles(request)
+        if CUSTOMER in roles:
+            serializer_class, rows = OrderSerializer, Order.objects.filter(user=request.user)
+        elif MANAGER in roles:
+            serializer_class, rows = OrderItemSerializer, OrderItem.objects.all()
+        elif DELIVERY_CREW in roles:
+            serializer_class, rows = OrderSerializer, Order.objects.filter(delivery_crew=request.user)
+        else:
+            return json_response("Not authorized...", status=status.HTTP_401_UNAUTHORIZED)
+        rows = serializer_class.read_queryset(rows, request)
+        return json_response(serializer_class.read_data([row async for row in rows.aiterator()], request))
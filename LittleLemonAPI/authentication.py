@@ -0,0 +1,72 @@
+import hashlib
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import router
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+
+#------------------------------------------------------------
+# Cached token authentication
+#------------------------------------------------------------
+def token_cache_key(key):
+    # Hashed so raw tokens never end up in a shared cache's key space
+    return 'littlelemon:token:' + hashlib.sha256(key.encode()).hexdigest()
+
+
+def user_cache_key(user_id):
+    return f'littlelemon:user:{user_id}'
+
+
+def invalidate_token(key):
+    cache.delete(token_cache_key(key))
+
+
+def invalidate_user(user_id):
+    cache.delete(user_cache_key(user_id))
+
+
+# What is cached of a user: enough for the views and permission checks, but
+# not the password hash. Any other field is loaded from the database when
+# read, and saving the user only writes these (see Model.from_db, which
+# takes them in the model's field order).
+USER_SNAPSHOT_FIELDS = ('id', 'is_superuser', 'username', 'first_name', 'last_name', 'email', 'is_staff', 'is_active')
+
+
+def user_snapshot(user):
+    return [getattr(user, name) for name in USER_SNAPSHOT_FIELDS]
+
+
+def user_from_snapshot(snapshot):
+    return User.from_db(router.db_for_read(User), USER_SNAPSHOT_FIELDS, snapshot)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    # Same contract as TokenAuthentication, but caches the token's user id
+    # and a snapshot of the user (USER_SNAPSHOT_FIELDS, never the token or
+    # the password hash) for TOKEN_CACHE_TIMEOUT seconds (0 turns the cache
+    # off, see settings), so a request authenticates without a query. The
+    # snapshot is dropped when the user is saved or deleted and the token
+    # when it is deleted (djoser logout), see signals.py. Writes that skip
+    # the signals (queryset.update) are seen when the entries expire. Roles
+    # come from the per-user roles cache, see roles.get_user_roles.
+    def authenticate_credentials(self, key):
+        if not settings.TOKEN_CACHE_TIMEOUT:
+            return super().authenticate_credentials(key)
+        token_key = token_cache_key(key)
+        user_id = cache.get(token_key)
+        snapshot = cache.get(user_cache_key(user_id)) if user_id is not None else None
+        if snapshot is None:
+            user, token = super().authenticate_credentials(key)
+            cache.set_many({
+                token_key: user.pk, user_cache_key(user.pk): user_snapshot(user),
+            }, timeout=settings.TOKEN_CACHE_TIMEOUT)
+            return (user, token)
+        user = user_from_snapshot(snapshot)
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+        return (user, Token(key=key, user=user))
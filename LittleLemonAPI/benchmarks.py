@@ -0,0 +1,162 @@
+import random
+import statistics
+import time
+from contextlib import contextmanager
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group, Permission, User
+from django.db import connection, transaction
+from django.test.utils import override_settings
+from rest_framework.authtoken.models import Token
+
+from .analytics import rebuild_rollups
+from .models import Cart, Category, MenuItem, Order, OrderItem
+from .roles import CUSTOMER, DELIVERY_CREW, MANAGER
+from .search import get_search_index
+
+BENCHMARK_PASSWORD = 'network123'
+
+
+#------------------------------------------------------------
+# Helpers shared by the bench_* management commands
+#------------------------------------------------------------
+# Runs the benchmark against a throwaway test database so the configured
+# database is never touched. Benchmarks that use several threads need an
+# on-disk SQLite database, pass its path as test_name. Throttling is off,
+# the benchmarks send far more requests per user than the limits allow.
+@contextmanager
+def benchmark_database(verbosity=0, test_name=None):
+    old_name = connection.settings_dict['NAME']
+    old_test_name = connection.settings_dict['TEST'].get('NAME')
+    if test_name is not None:
+        connection.settings_dict['TEST']['NAME'] = test_name
+    connection.creation.create_test_db(verbosity=verbosity, autoclobber=True)
+    try:
+        with override_settings(THROTTLE_RATES=None, THROTTLE_SCOPE_RATES={}):
+            yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=verbosity)
+        connection.settings_dict['TEST']['NAME'] = old_test_name
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+# Summary of a list of durations in seconds, reported in milliseconds
+def summarize(samples):
+    return {
+        'count': len(samples),
+        'mean_ms': round(statistics.fmean(samples) * 1000, 3) if samples else 0.0,
+        'p50_ms': round(percentile(samples, 50) * 1000, 3),
+        'p95_ms': round(percentile(samples, 95) * 1000, 3),
+        'p99_ms': round(percentile(samples, 99) * 1000, 3),
+        'max_ms': round(max(samples) * 1000, 3) if samples else 0.0,
+    }
+
+
+#------------------------------------------------------------
+# Synthetic data
+#------------------------------------------------------------
+DEFAULT_SCALE = {
+    'categories': 10,
+    'menu_items': 500,
+    'customers': 50,
+    'delivery_crew': 5,
+    'cart_lines': 5,
+    'orders': 1000,
+    'items_per_order': 3,
+}
+
+
+# Seeds categories, menu items, users in every role, carts and orders with
+# bulk inserts, then builds the sales rollups. All users share one password
+# hash, hashing is too slow to do per user. Returns ids and tokens for the
+# benchmarks to use.
+@transaction.atomic
+def seed_benchmark_data(seed=0, **scale):
+    scale = dict(DEFAULT_SCALE, **scale)
+    rng = random.Random(seed)
+    password = make_password(BENCHMARK_PASSWORD)
+
+    groups = {name: Group.objects.get_or_create(name=name)[0] for name in (MANAGER, CUSTOMER, DELIVERY_CREW)}
+    categories = Category.objects.bulk_create([
+        Category(slug=f'category-{i}', title=f'Category {i}') for i in range(scale['categories'])
+    ])
+    menu_items = MenuItem.objects.bulk_create([
+        MenuItem(
+            title=f'Dish {i}',
+            price=Decimal(rng.randint(300, 3000)) / 100,
+            featured=rng.random() < 0.1,
+            category=categories[i % len(categories)],
+        )
+        for i in range(scale['menu_items'])
+    ])
+
+    def create_users(prefix, count, group):
+        users = User.objects.bulk_create([
+            User(username=f'{prefix}-{i}', password=password) for i in range(count)
+        ])
+        group.user_set.add(*users)
+        return users
+
+    manager = create_users('bench-manager', 1, groups[MANAGER])[0]
+    manager.user_permissions.add(Permission.objects.get(codename='view_menuitem'))
+    customers = create_users('bench-customer', scale['customers'], groups[CUSTOMER])
+    crew = create_users('bench-crew', scale['delivery_crew'], groups[DELIVERY_CREW])
+
+    Cart.objects.bulk_create([
+        Cart(user=customer, menuitem=item, quantity=1, unit_price=item.price, price=item.price)
+        for customer in customers
+        for item in rng.sample(menu_items, min(scale['cart_lines'], len(menu_items)))
+    ])
+
+    today = date.today()
+    orders = Order.objects.bulk_create([
+        Order(
+            user=rng.choice(customers),
+            delivery_crew=rng.choice(crew) if crew and rng.random() < 0.7 else None,
+            status=rng.random() < 0.5,
+            total=0,
+            date=today - timedelta(days=rng.randint(0, 90)),
+        )
+        for _ in range(scale['orders'])
+    ])
+    order_items = []
+    for order in orders:
+        for item in rng.sample(menu_items, min(scale['items_per_order'], len(menu_items))):
+            order_items.append(OrderItem(order=order, menuitem=item, quantity=1, unit_price=item.price, price=item.price))
+            order.total += item.price
+    OrderItem.objects.bulk_create(order_items, batch_size=2000)
+    Order.objects.bulk_update(orders, ['total'], batch_size=2000)
+    # Bulk writes skip the signals that keep the rollups and search index current
+    rebuild_rollups()
+    get_search_index().rebuild()
+
+    return {
+        'scale': scale,
+        'password': password,
+        'groups': groups,
+        'menu_items': [item.id for item in menu_items],
+        'categories': [category.id for category in categories],
+        'orders': [order.id for order in orders],
+        'users': {'manager': manager, 'customer': customers[0], 'crew': crew[0] if crew else None},
+        'customers': customers,
+        'tokens': {
+            'manager': Token.objects.create(user=manager).key,
+            'customer': Token.objects.create(user=customers[0]).key,
+            'crew': Token.objects.create(user=crew[0]).key if crew else None,
+        },
+    }
@@ -0,0 +1,172 @@
+import asyncio
+import functools
+import hashlib
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+
+
+#------------------------------------------------------------
+# Versioned read-through cache for the menu
+#------------------------------------------------------------
+MENU_VERSION_KEY = 'littlelemon:menu:version'
+
+
+# The version is a nanosecond timestamp of the last menu change. Cached
+# payloads are keyed by it, so bumping the version invalidates every menu
+# entry at once and stale ones simply age out of the LRU. Being time based,
+# it doubles as the Last-Modified value and never repeats if the key itself
+# gets evicted.
+def get_menu_version():
+    version = cache.get(MENU_VERSION_KEY)
+    if version is None:
+        version = time.time_ns()
+        if not cache.add(MENU_VERSION_KEY, version, timeout=None):
+            version = cache.get(MENU_VERSION_KEY, version)
+    return version
+
+
+def bump_menu_version():
+    current = cache.get(MENU_VERSION_KEY) or 0
+    version = max(time.time_ns(), current + 1)
+    cache.set(MENU_VERSION_KEY, version, timeout=None)
+    return version
+
+
+# The format the response is rendered in (json, msgpack...): one payload,
+# a representation (and ETag) per format
+def response_format(request):
+    return getattr(getattr(request, 'accepted_renderer', None), 'format', 'json')
+
+
+def menu_cache_keys(request, name, version):
+    key = hashlib.md5(f'{name}:{request.build_absolute_uri()}'.encode()).hexdigest()
+    etag = quote_etag(f'{key}-{version}-{response_format(request)}')
+    last_modified = version // 1_000_000_000
+    return f'littlelemon:menu:{version}:{key}', etag, last_modified
+
+
+def set_validators(response, etag, last_modified):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+# Serves a menu payload from the cache, building it on a miss, and answers
+# If-None-Match / If-Modified-Since with a 304 before anything is built.
+def cached_menu_response(request, name, build_payload):
+    cache_key, etag, last_modified = menu_cache_keys(request, name, get_menu_version())
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        payload = cache.get(cache_key)
+        if payload is None:
+            payload = build_payload()
+            cache.set(cache_key, payload, timeout=settings.MENU_CACHE_TIMEOUT)
+        response = Response(payload)
+    return set_validators(response, etag, last_modified)
+
+
+# Async counterpart for the ASGI views; build_payload is a coroutine function
+async def acached_menu_response(request, name, build_payload, response_class):
+    version = await sync_to_async(get_menu_version)()
+    cache_key, etag, last_modified = menu_cache_keys(request, name, version)
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        payload = await cache.aget(cache_key)
+        if payload is None:
+            payload = await build_payload()
+            await cache.aset(cache_key, payload, timeout=settings.MENU_CACHE_TIMEOUT)
+        response = response_class(payload)
+    return set_validators(response, etag, last_modified)
+
+
+#------------------------------------------------------------
+# Conditional GET
+#------------------------------------------------------------
+# Validators of a queryset: its row count and latest updated_at, in one
+# aggregate query. A changed or added row moves the timestamp, a deleted
+# one the count. Payloads that nest menu items also depend on the menu
+# version.
+def queryset_validators(queryset, nested_menu=False):
+    state = queryset.aggregate(count=Count('pk'), last=Max('updated_at'))
+    version = (state['count'], state['last'])
+    last_modified = int(state['last'].timestamp()) if state['last'] else None
+    if nested_menu:
+        menu_version = get_menu_version()
+        version += (menu_version,)
+        last_modified = max(last_modified or 0, menu_version // 1_000_000_000)
+    return version, last_modified
+
+
+def make_validators(request, version, last_modified):
+    # ETags are per user and URL: the same list differs between customers
+    key = f'{request.user.pk}:{request.get_full_path()}:{response_format(request)}:{version}'
+    return quote_etag(hashlib.md5(key.encode()).hexdigest()), last_modified
+
+
+# Sets the Cache-Control policy named `policy` in settings.CACHE_CONTROL.
+# Responses depend on who is asking and the format asked for, so they vary
+# on the credentials and Accept.
+def set_cache_control(response, policy):
+    patch_cache_control(response, **settings.CACHE_CONTROL[policy])
+    patch_vary_headers(response, ('Accept', 'Authorization', 'Cookie'))
+    return response
+
+
+def not_modified(request, etag, last_modified):
+    if etag is None:
+        return None
+    return get_conditional_response(request, etag=etag, last_modified=last_modified)
+
+
+# Decorates a GET handler of an APIView (sync or async). `validators(view,
+# request, *args, **kwargs)` returns (version, last_modified) cheaply, without
+# loading the rows; when it matches If-None-Match / If-Modified-Since the
+# handler isn't called and a 304 goes back without serializing anything.
+# Successful responses get ETag and Last-Modified, and every response gets
+# the Cache-Control policy. Pass validators=None to only set the policy.
+# The 304 is answered before the handler runs, so validators must return
+# None for a caller the handler would turn away: otherwise they could probe
+# whether something they may not see exists or changed. Checks in the
+# view's permission_classes run first anyway.
+def conditional(policy, validators=None):
+    def decorator(handler):
+        def check(view, request, *args, **kwargs):
+            if validators is None or request.method not in ('GET', 'HEAD'):
+                return None, None
+            state = validators(view, request, *args, **kwargs)
+            if state is None:
+                return None, None
+            return make_validators(request, *state)
+
+        def finish(response, etag, last_modified):
+            ok = 200 <= response.status_code < 300 or response.status_code == 304
+            if etag is not None and ok and not response.has_header('ETag'):
+                set_validators(response, etag, last_modified)
+            return set_cache_control(response, policy)
+
+        if asyncio.iscoroutinefunction(handler):
+            @functools.wraps(handler)
+            async def async_wrapper(view, request, *args, **kwargs):
+                etag, last_modified = await sync_to_async(check)(view, request, *args, **kwargs)
+                response = not_modified(request, etag, last_modified)
+                if response is None:
+                    response = await handler(view, request, *args, **kwargs)
+                return finish(response, etag, last_modified)
+            return async_wrapper
+
+        @functools.wraps(handler)
+        def wrapper(view, request, *args, **kwargs):
+            etag, last_modified = check(view, request, *args, **kwargs)
+            response = not_modified(request, etag, last_modified)
+            if response is None:
+                response = handler(view, request, *args, **kwargs)
+            return finish(response, etag, last_modified)
+        return wrapper
+    return decorator
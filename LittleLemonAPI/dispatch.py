@@ -0,0 +1,133 @@
+import heapq
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from .analytics import ORDER_STATE_FIELDS, record_order_changes
+from .events import publish_order_change
+from .models import Order, OrderItem
+from .roles import DELIVERY_CREW
+
+
+#------------------------------------------------------------
+# Delivery dispatch
+#------------------------------------------------------------
+def pending_orders():
+    return Order.objects.filter(status=False, delivery_crew__isnull=True)
+
+
+# Active delivery crew members with their open (undelivered) order counts,
+# in one aggregate query
+def crew_loads():
+    return dict(
+        User.objects.filter(groups__name=DELIVERY_CREW, is_active=True)
+        .annotate(open_orders=Count('delivery_crew', filter=Q(delivery_crew__status=False)))
+        .values_list('id', 'open_orders')
+    )
+
+
+# Assigns up to `limit` pending orders, oldest first, each to the crew member
+# with the fewest open orders at that point. Reads the loads once and keeps
+# them in a heap as orders are handed out. The assignments are written with
+# one UPDATE ... WHERE id IN (...) per crew member rather than bulk_update,
+# whose per-row CASE expressions cost far more to build (see bench_dispatch).
+# max_open caps a member's open orders (0 for no cap); orders that don't fit
+# stay pending. Returns {crew member id: orders assigned}.
+def dispatch_batch(limit=None, max_open=None):
+    limit = settings.DISPATCH_BATCH_SIZE if limit is None else limit
+    max_open = settings.DISPATCH_MAX_OPEN_ORDERS if max_open is None else max_open
+    with transaction.atomic():
+        loads = crew_loads()
+        heap = [(load, crew_id) for crew_id, load in loads.items() if not max_open or load < max_open]
+        if not heap:
+            return {}
+        heapq.heapify(heap)
+
+        orders = pending_orders().select_for_update().order_by('date', 'id').values_list('id', 'user_id')[:limit]
+        assignments = {}
+        for order_id, user_id in orders:
+            if not heap:
+                break
+            load, crew_id = heapq.heappop(heap)
+            assignments.setdefault(crew_id, []).append(order_id)
+            # update() sends no signals, so the event is published here
+            publish_order_change(order_id, user_id, False, crew_id)
+            if not max_open or load + 1 < max_open:
+                heapq.heappush(heap, (load + 1, crew_id))
+
+        # update() skips auto_now fields, updated_at is set by hand
+        now = timezone.now()
+        for crew_id, ids in assignments.items():
+            Order.objects.filter(id__in=ids).update(delivery_crew_id=crew_id, updated_at=now)
+    return {crew_id: len(ids) for crew_id, ids in assignments.items()}
+
+
+# Dispatches batch after batch, each in its own transaction, until nothing
+# is pending or nobody can take more. Returns the merged assignments.
+def dispatch_all(batch_size=None, max_open=None):
+    batch_size = settings.DISPATCH_BATCH_SIZE if batch_size is None else batch_size
+    # An empty batch would never end the loop
+    if batch_size < 1:
+        raise ValueError("batch_size must be at least 1")
+    total = {}
+    while True:
+        assigned = dispatch_batch(batch_size, max_open)
+        for crew_id, count in assigned.items():
+            total[crew_id] = total.get(crew_id, 0) + count
+        if sum(assigned.values()) < batch_size:
+            return total
+
+
+#------------------------------------------------------------
+# Crew worklist
+#------------------------------------------------------------
+def open_orders(crew):
+    return Order.objects.filter(delivery_crew=crew, status=False)
+
+
+# The crew member's open orders, oldest first, each with the customer and
+# the lines to hand over: two queries however many orders there are
+def crew_worklist(crew):
+    orders = list(
+        open_orders(crew).order_by('date', 'id')
+        .values('id', 'user', 'total', 'date', 'updated_at', username=F('user__username'))
+    )
+    by_id = {order['id']: dict(order, items=[]) for order in orders}
+    lines = (
+        OrderItem.objects.filter(order__in=open_orders(crew)).order_by('id')
+        .values('order_id', 'quantity', menu_item=F('menuitem_id'), title=F('menuitem__title'))
+    )
+    for line in lines:
+        # An order delivered between the two queries is left out
+        order = by_id.get(line.pop('order_id'))
+        if order is not None:
+            order['items'].append(line)
+    return list(by_id.values())
+
+
+# Marks the crew member's orders in order_ids delivered, with one UPDATE
+# for the lot. update() sends no signals, so the rollups (one merged change
+# for the batch) and the order events are handled here. Orders delivered
+# already count as delivered, so a retried request gets the same answer.
+# Returns (delivered ids, ids not assigned to the crew member).
+def mark_delivered(crew, order_ids):
+    with transaction.atomic():
+        orders = list(
+            Order.objects.select_for_update().filter(id__in=order_ids, delivery_crew=crew)
+            .values('id', 'user_id', *ORDER_STATE_FIELDS)
+        )
+        delivering = [order for order in orders if not order['status']]
+        if delivering:
+            # update() skips auto_now fields, updated_at is set by hand
+            Order.objects.filter(id__in=[order['id'] for order in delivering]).update(status=True, updated_at=timezone.now())
+            changes = []
+            for order in delivering:
+                before = {field: order[field] for field in ORDER_STATE_FIELDS}
+                changes.append((before, dict(before, status=True), order['id']))
+                publish_order_change(order['id'], order['user_id'], True, crew.pk)
+            record_order_changes(changes)
+    assigned = {order['id'] for order in orders}
+    return [id for id in order_ids if id in assigned], [id for id in order_ids if id not in assigned]
@@ -0,0 +1,151 @@
+import asyncio
+import itertools
+import json
+import threading
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+
+#------------------------------------------------------------
+# Pub/sub brokers
+#------------------------------------------------------------
+# A broker delivers events published on a channel to everyone subscribed to
+# it. publish() is synchronous and thread safe, so model signals can call it
+# from any thread. subscribe() is a coroutine returning a subscription with
+# an async get() and close().
+
+class Subscription:
+    def __init__(self, broker, channel, max_queued):
+        self.broker = broker
+        self.channel = channel
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=max_queued)
+
+    # Called from any thread; a client too slow to keep up loses its oldest
+    # events rather than growing the queue without bound
+    def put(self, event):
+        self.loop.call_soon_threadsafe(self._put, event)
+
+    def _put(self, event):
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(event)
+
+    async def get(self):
+        return await self.queue.get()
+
+    async def close(self):
+        self.broker.unsubscribe(self)
+
+
+class InProcessBroker:
+    # Events reach subscribers of the same process only: enough for a single
+    # ASGI worker, or for tests
+    def __init__(self, max_queued=100):
+        self.max_queued = max_queued
+        self.lock = threading.Lock()
+        self.subscriptions = {}
+
+    def publish(self, channel, event):
+        with self.lock:
+            subscriptions = list(self.subscriptions.get(channel, ()))
+        for subscription in subscriptions:
+            subscription.put(event)
+
+    async def subscribe(self, channel):
+        subscription = Subscription(self, channel, self.max_queued)
+        with self.lock:
+            self.subscriptions.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            subscriptions = self.subscriptions.get(subscription.channel, set())
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                self.subscriptions.pop(subscription.channel, None)
+
+
+class RedisSubscription:
+    def __init__(self, pubsub):
+        self.pubsub = pubsub
+
+    async def get(self):
+        while True:
+            message = await self.pubsub.get_message(ignore_subscribe_messages=True, timeout=None)
+            if message is not None:
+                return json.loads(message['data'])
+
+    async def close(self):
+        await self.pubsub.close()
+
+
+class RedisBroker:
+    # Events go through Redis pub/sub, so every worker's subscribers get
+    # them. Needs the redis package; location is the Redis URL.
+    def __init__(self, location, prefix='littlelemon:events:'):
+        try:
+            import redis
+            import redis.asyncio
+        except ImportError as exc:
+            raise ImproperlyConfigured("RedisBroker requires the redis package") from exc
+        self.location = location
+        self.prefix = prefix
+        self.client = redis.Redis.from_url(location)
+        self.async_client = redis.asyncio.Redis.from_url(location)
+
+    def publish(self, channel, event):
+        self.client.publish(self.prefix + channel, json.dumps(event))
+
+    async def subscribe(self, channel):
+        pubsub = self.async_client.pubsub()
+        await pubsub.subscribe(self.prefix + channel)
+        return RedisSubscription(pubsub)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+# The broker configured in settings.EVENTS_BACKEND, created on first use
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                backend = import_string(settings.EVENTS_BACKEND)
+                _broker = backend(**settings.EVENTS_OPTIONS)
+    return _broker
+
+
+#------------------------------------------------------------
+# Order events
+#------------------------------------------------------------
+_event_ids = itertools.count(1)
+
+
+def user_channel(user_id):
+    return f'user:{user_id}'
+
+
+# Tells the order's customer and its delivery crew (the previous one too, on
+# a reassignment) that its status or assignment changed. Sent once the
+# transaction commits, so nobody hears of a change that is rolled back.
+def publish_order_change(order_id, user_id, status, delivery_crew_id, previous_crew_id=None):
+    event = {
+        'id': next(_event_ids),
+        'type': 'order',
+        'order': order_id,
+        'status': bool(status),
+        'delivery_crew': delivery_crew_id,
+    }
+    recipients = {user_id, delivery_crew_id, previous_crew_id} - {None}
+
+    def send():
+        broker = get_broker()
+        for recipient in recipients:
+            broker.publish(user_channel(recipient), event)
+    transaction.on_commit(send)
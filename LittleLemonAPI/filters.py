@@ -0,0 +1,60 @@
+from decimal import Decimal, InvalidOperation
+
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+
+#------------------------------------------------------------
+# Menu item filtering
+#------------------------------------------------------------
+class MenuItemFilter(BaseFilterBackend):
+    # Server-side filters for the menu listing. Every filter maps onto an
+    # indexed column of MenuItem (category_id, featured, price, title).
+    true_values = ('1', 'true', 'yes')
+    false_values = ('0', 'false', 'no')
+
+    def filter_queryset(self, request, queryset, view):
+        params = request.query_params
+
+        category = params.get('category')
+        if category:
+            # Categories can be referenced either by id or by slug
+            if category.isdigit():
+                queryset = queryset.filter(category_id=int(category))
+            else:
+                queryset = queryset.filter(category__slug=category)
+
+        featured = params.get('featured')
+        if featured:
+            queryset = queryset.filter(featured=self.parse_bool('featured', featured))
+
+        price_min = params.get('price_min')
+        if price_min:
+            queryset = queryset.filter(price__gte=self.parse_decimal('price_min', price_min))
+
+        price_max = params.get('price_max')
+        if price_max:
+            queryset = queryset.filter(price__lte=self.parse_decimal('price_max', price_max))
+
+        search = params.get('search')
+        if search:
+            queryset = queryset.filter(title__icontains=search.strip())
+
+        return queryset
+
+    def parse_bool(self, name, value):
+        value = value.lower()
+        if value in self.true_values:
+            return True
+        if value in self.false_values:
+            return False
+        raise ValidationError({name: 'Must be true or false.'})
+
+    def parse_decimal(self, name, value):
+        try:
+            number = Decimal(value)
+        except InvalidOperation:
+            number = None
+        if number is None or not number.is_finite():
+            raise ValidationError({name: 'Must be a number.'})
+        return number
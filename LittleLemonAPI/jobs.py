@@ -0,0 +1,178 @@
+import logging
+import os
+import random
+import socket
+import threading
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+
+#------------------------------------------------------------
+# Task registry
+#------------------------------------------------------------
+# Functions run by the workers, by name. Tasks take the job's payload as
+# keyword arguments, so payloads must be JSON (ids, not model instances).
+TASKS = {}
+
+
+def task(name):
+    def register(func):
+        TASKS[name] = func
+        return func
+    return register
+
+
+#------------------------------------------------------------
+# Enqueueing
+#------------------------------------------------------------
+# Jobs are rows in the same database, so a job enqueued inside a transaction
+# only exists if that transaction commits: checkout's jobs never run for an
+# order that was rolled back, and are never lost for one that wasn't.
+
+def new_job(name, payload=None, delay=0, max_attempts=None):
+    if name not in TASKS:
+        raise ValueError(f"Unknown task: {name}")
+    return Job(
+        task=name,
+        payload=payload or {},
+        run_at=timezone.now() + timedelta(seconds=delay),
+        max_attempts=max_attempts or settings.JOBS_MAX_ATTEMPTS,
+    )
+
+
+def enqueue(name, payload=None, delay=0, max_attempts=None):
+    job = new_job(name, payload, delay, max_attempts)
+    job.save()
+    return job
+
+
+# Enqueues [(name, payload), ...] with one INSERT
+def enqueue_many(jobs):
+    return Job.objects.bulk_create([new_job(name, payload) for name, payload in jobs])
+
+
+#------------------------------------------------------------
+# Workers
+#------------------------------------------------------------
+class LeaseLost(Exception):
+    pass
+
+
+def due_jobs(now):
+    return Q(status=Job.QUEUED, run_at__lte=now) | Q(status=Job.RUNNING, locked_until__lt=now)
+
+
+# Leases up to `limit` due jobs to the worker for `lease` seconds: queued jobs
+# whose time has come, and running jobs whose worker let the lease run out.
+# The UPDATE repeats the due condition, so when two workers pick the same
+# ids only one gets each job; this works without SELECT ... SKIP LOCKED,
+# which SQLite lacks. One SELECT of ids, one UPDATE, one SELECT of the jobs,
+# and another round only when every picked job went to other workers.
+def claim_jobs(worker_id, limit, lease):
+    while True:
+        now = timezone.now()
+        ids = list(Job.objects.filter(due_jobs(now)).order_by('run_at', 'id').values_list('id', flat=True)[:limit])
+        if not ids:
+            return []
+        locked_until = now + timedelta(seconds=lease)
+        claimed = Job.objects.filter(due_jobs(now), id__in=ids).update(
+            status=Job.RUNNING, locked_by=worker_id, locked_until=locked_until,
+            attempts=F('attempts') + 1, updated_at=now,
+        )
+        if claimed:
+            return list(
+                Job.objects.filter(id__in=ids, locked_by=worker_id, locked_until=locked_until).order_by('run_at', 'id')
+            )
+
+
+# Seconds before the next attempt: JOBS_RETRY_DELAY doubled on every failed
+# attempt up to JOBS_RETRY_MAX_DELAY, minus up to a quarter so jobs that
+# failed together don't all come back at the same moment
+def retry_delay(attempts):
+    delay = min(settings.JOBS_RETRY_DELAY * 2 ** (attempts - 1), settings.JOBS_RETRY_MAX_DELAY)
+    return delay * random.uniform(0.75, 1)
+
+
+# Updates a job the worker still holds; raises LeaseLost if another worker
+# took it over meanwhile
+def held(job, worker_id):
+    return Job.objects.filter(id=job.id, locked_by=worker_id, locked_until=job.locked_until)
+
+
+def release(job, worker_id, **fields):
+    if not held(job, worker_id).update(locked_by=None, locked_until=None, updated_at=timezone.now(), **fields):
+        raise LeaseLost(job.id)
+
+
+# Runs a leased job; a job that succeeds is deleted. Delivery is at least
+# once: a worker dying after the task but before the delete means it runs
+# again, so tasks must be safe to repeat. Tasks aren't wrapped in a
+# transaction, which on SQLite (BEGIN IMMEDIATE) would hold the write lock
+# for as long as the task runs and serialize the workers; tasks that need
+# one open it themselves. A failed job is retried with backoff until it has
+# used max_attempts, then kept as failed with its traceback.
+# Returns 'done', 'retried', 'failed' or 'lost'.
+def run_job(job, worker_id):
+    func = TASKS.get(job.task)
+    try:
+        if func is None:
+            release(job, worker_id, status=Job.FAILED, last_error=f"Unknown task: {job.task}")
+            return 'failed'
+        if job.attempts > job.max_attempts:
+            # Its last attempt's worker died holding it
+            release(job, worker_id, status=Job.FAILED, last_error=job.last_error or "Lease expired")
+            return 'failed'
+        try:
+            func(**job.payload)
+        except Exception:
+            error = traceback.format_exc()
+            logger.warning("Job %s (%s) failed, attempt %s of %s", job.id, job.task, job.attempts, job.max_attempts, exc_info=True)
+            if job.attempts >= job.max_attempts:
+                release(job, worker_id, status=Job.FAILED, last_error=error)
+                return 'failed'
+            release(
+                job, worker_id, status=Job.QUEUED, last_error=error,
+                run_at=timezone.now() + timedelta(seconds=retry_delay(job.attempts)),
+            )
+            return 'retried'
+        if not held(job, worker_id).delete()[0]:
+            raise LeaseLost(job.id)
+        return 'done'
+    except LeaseLost:
+        logger.warning("Job %s (%s) outlived its lease and was taken over", job.id, job.task)
+        return 'lost'
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}'
+
+
+# Claims and runs jobs batch by batch. When nothing is due it waits
+# poll_interval seconds, or returns if burst is set. Stops once `stop` (a
+# threading.Event) is set. The lease must cover a whole batch. Returns the
+# number of jobs per outcome.
+def work(batch_size=None, lease=None, poll_interval=None, burst=False, stop=None):
+    batch_size = batch_size or settings.JOBS_BATCH_SIZE
+    lease = lease or settings.JOBS_LEASE
+    poll_interval = settings.JOBS_POLL_INTERVAL if poll_interval is None else poll_interval
+    stop = stop or threading.Event()
+    worker_id = worker_name()
+    counts = {'done': 0, 'retried': 0, 'failed': 0, 'lost': 0}
+    while not stop.is_set():
+        jobs = claim_jobs(worker_id, batch_size, lease)
+        if not jobs:
+            if burst:
+                break
+            stop.wait(poll_interval)
+            continue
+        for job in jobs:
+            counts[run_job(job, worker_id)] += 1
+    return counts
@@ -0,0 +1,170 @@
+import asyncio
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from wsgiref.util import setup_testing_defaults
+
+from django.contrib.auth.models import Group, Permission, User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from rest_framework.authtoken.models import Token
+
+from LittleLemonAPI.benchmarks import benchmark_database, summarize
+from LittleLemonAPI.models import Cart, Category, MenuItem, Order
+
+ENDPOINTS = {
+    'menu': ('menu-items/', 'manager'),
+    'cart': ('cart/menu-items', 'customer'),
+    'orders': ('orders', 'customer'),
+}
+
+
+# The WSGI application driven by a thread pool, as a threaded WSGI server
+# with `concurrency` workers would
+def run_wsgi(application, path, token, requests, concurrency):
+    def request():
+        environ = {
+            'REQUEST_METHOD': 'GET',
+            'PATH_INFO': path,
+            'QUERY_STRING': '',
+            'HTTP_HOST': 'localhost',
+            'HTTP_AUTHORIZATION': f'Token {token}',
+        }
+        setup_testing_defaults(environ)
+        statuses = []
+        start = time.perf_counter()
+        result = application(environ, lambda status, headers, exc_info=None: statuses.append(status))
+        try:
+            for _ in result:
+                pass
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+            connection.close()
+        return time.perf_counter() - start, statuses[0].startswith('200')
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return list(pool.map(lambda _: request(), range(requests)))
+
+
+# The ASGI application driven by an event loop with `concurrency` requests
+# in flight at a time
+def run_asgi(application, path, token, requests, concurrency):
+    async def request(semaphore):
+        async with semaphore:
+            scope = {
+                'type': 'http',
+                'asgi': {'version': '3.0'},
+                'http_version': '1.1',
+                'method': 'GET',
+                'scheme': 'http',
+                'path': path,
+                'raw_path': path.encode(),
+                'query_string': b'',
+                'root_path': '',
+                'headers': [(b'host', b'localhost'), (b'authorization', f'Token {token}'.encode())],
+                'client': ('127.0.0.1', 50000),
+                'server': ('localhost', 80),
+            }
+            disconnect = asyncio.Event()
+            messages = iter([{'type': 'http.request', 'body': b'', 'more_body': False}])
+            statuses = []
+
+            async def receive():
+                message = next(messages, None)
+                if message is None:
+                    await disconnect.wait()
+                    return {'type': 'http.disconnect'}
+                return message
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    statuses.append(message['status'])
+
+            start = time.perf_counter()
+            await application(scope, receive, send)
+            disconnect.set()
+            return time.perf_counter() - start, statuses[0] == 200
+
+    async def main():
+        semaphore = asyncio.Semaphore(concurrency)
+        return await asyncio.gather(*(request(semaphore) for _ in range(requests)))
+
+    return asyncio.run(main())
+
+
+class Command(BaseCommand):
+    help = "Load test the sync (WSGI) and async (ASGI) read endpoints at rising concurrency"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', default='1,4,16,64', help="Comma separated concurrency levels")
+        parser.add_argument('--requests', type=int, default=200, help="Requests per endpoint and concurrency level")
+        parser.add_argument('--endpoints', default=','.join(ENDPOINTS), help="Comma separated: " + ', '.join(ENDPOINTS))
+        parser.add_argument('--json', action='store_true', help="Print the results as JSON")
+
+    def handle(self, *args, **options):
+        from core.asgi import application as asgi_application
+        from core.wsgi import application as wsgi_application
+
+        levels = [int(level) for level in options['concurrency'].split(',')]
+        results = []
+        with tempfile.TemporaryDirectory() as directory:
+            with benchmark_database(test_name=os.path.join(directory, 'bench.sqlite3')):
+                tokens = self.seed()
+                for endpoint in options['endpoints'].split(','):
+                    path, role = ENDPOINTS[endpoint]
+                    for level in levels:
+                        for server, runner, application, prefix in (
+                            ('wsgi', run_wsgi, wsgi_application, '/api/'),
+                            ('asgi', run_asgi, asgi_application, '/api/async/'),
+                        ):
+                            start = time.perf_counter()
+                            samples = runner(application, prefix + path, tokens[role], options['requests'], level)
+                            elapsed = time.perf_counter() - start
+                            row = {
+                                'endpoint': endpoint,
+                                'server': server,
+                                'concurrency': level,
+                                'requests_per_second': round(len(samples) / elapsed, 1),
+                                'errors': sum(1 for _, ok in samples if not ok),
+                            }
+                            row.update(summarize([duration for duration, _ in samples]))
+                            results.append(row)
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        self.stdout.write(f"{'endpoint':>9} {'server':>7} {'concurrency':>12} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'errors':>7}")
+        for row in results:
+            self.stdout.write(
+                f"{row['endpoint']:>9} {row['server']:>7} {row['concurrency']:>12} {row['requests_per_second']:>9} "
+                f"{row['p50_ms']:>9} {row['p95_ms']:>9} {row['errors']:>7}"
+            )
+
+    def seed(self):
+        customer = User.objects.create_user('bench-customer')
+        manager = User.objects.create_user('bench-manager')
+        customer.groups.add(Group.objects.create(name='customer'))
+        manager.groups.add(Group.objects.create(name='Manager'))
+        manager.user_permissions.add(Permission.objects.get(codename='view_menuitem'))
+
+        category = Category.objects.create(slug='bench', title='Bench')
+        menu_items = MenuItem.objects.bulk_create([
+            MenuItem(title=f'Bench dish {i}', price=Decimal('9.99'), featured=i % 5 == 0, category=category)
+            for i in range(100)
+        ])
+        Cart.objects.bulk_create([
+            Cart(user=customer, menuitem=item, quantity=1, unit_price=item.price, price=item.price)
+            for item in menu_items[:10]
+        ])
+        Order.objects.bulk_create([
+            Order(user=customer, total=Decimal('19.98'), date='2023-03-01')
+            for _ in range(50)
+        ])
+        return {
+            'customer': Token.objects.create(user=customer).key,
+            'manager': Token.objects.create(user=manager).key,
+        }
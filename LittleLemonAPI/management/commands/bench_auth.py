@@ -0,0 +1,60 @@
+import json
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIRequestFactory
+
+from LittleLemonAPI.authentication import CachedTokenAuthentication
+from LittleLemonAPI.benchmarks import benchmark_database, summarize, timed
+from LittleLemonAPI.roles import get_user_roles
+
+
+class Command(BaseCommand):
+    help = "Benchmark per-request authentication overhead with and without the token cache"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help="Authenticated requests per run")
+        parser.add_argument('--json', action='store_true', help="Print the results as JSON")
+
+    def handle(self, *args, **options):
+        # With the local-memory cache the roles cache is off by default and
+        # the token cache short, see ROLES_CACHE_TIMEOUT in settings
+        with benchmark_database(), override_settings(ROLES_CACHE_TIMEOUT=300, TOKEN_CACHE_TIMEOUT=300):
+            results = self.run(options['requests'])
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        self.stdout.write(f"{'authentication':>16} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'queries/request':>16}")
+        for name, row in results.items():
+            self.stdout.write(
+                f"{name:>16} {row['mean_ms']:>9} {row['p50_ms']:>9} {row['p95_ms']:>9} {row['queries_per_request']:>16}"
+            )
+
+    def run(self, requests):
+        user = User.objects.create_user('bench-customer')
+        token = Token.objects.create(user=user)
+        request = APIRequestFactory().get('/api/orders', HTTP_AUTHORIZATION=f'Token {token.key}')
+        cache.clear()
+
+        results = {}
+        for name, backend in (('db', TokenAuthentication()), ('cached', CachedTokenAuthentication())):
+            # Authenticate and resolve roles, as every view does
+            def authenticate():
+                authenticated_user, _ = backend.authenticate(request)
+                return get_user_roles(authenticated_user)
+
+            authenticate()
+            samples = []
+            with CaptureQueriesContext(connection) as queries:
+                for _ in range(requests):
+                    elapsed, _ = timed(authenticate)
+                    samples.append(elapsed)
+            results[name] = summarize(samples)
+            results[name]['queries_per_request'] = round(len(queries.captured_queries) / requests, 3)
+        return results
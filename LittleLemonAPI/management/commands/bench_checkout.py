@@ -0,0 +1,83 @@
+import json
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from LittleLemonAPI.benchmarks import benchmark_database, summarize, timed
+from LittleLemonAPI.models import Cart, Category, MenuItem, Order, OrderItem
+from LittleLemonAPI.services import checkout
+
+
+# The pre-service checkout, for comparison: one INSERT per cart line
+def per_row_checkout(user):
+    cart_items = Cart.objects.filter(user=user)
+    order = Order.objects.create(user=user, total=0, date=timezone.localdate())
+    for item in cart_items:
+        OrderItem.objects.create(
+            order=order,
+            menuitem=item.menuitem,
+            quantity=item.quantity,
+            unit_price=item.unit_price,
+            price=item.price,
+        )
+    cart_items.delete()
+    return order
+
+
+class Command(BaseCommand):
+    help = "Benchmark checkout latency against cart size on a throwaway database"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1,5,10,25,50,100', help="Comma separated cart sizes")
+        parser.add_argument('--repeat', type=int, default=20, help="Checkouts per cart size")
+        parser.add_argument('--json', action='store_true', help="Print the results as JSON")
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',')]
+        with benchmark_database():
+            results = self.run(sizes, options['repeat'])
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        self.stdout.write(f"{'cart size':>10} {'bulk p50 ms':>12} {'bulk p95 ms':>12} {'per-row p50 ms':>15} {'per-row p95 ms':>15}")
+        for row in results:
+            self.stdout.write(
+                f"{row['cart_size']:>10} {row['bulk']['p50_ms']:>12} {row['bulk']['p95_ms']:>12} "
+                f"{row['per_row']['p50_ms']:>15} {row['per_row']['p95_ms']:>15}"
+            )
+
+    def run(self, sizes, repeat):
+        user = User.objects.create_user('bench-customer')
+        category = Category.objects.create(slug='bench', title='Bench')
+        menu_items = MenuItem.objects.bulk_create([
+            MenuItem(title=f'Bench dish {i}', price=Decimal('9.99'), featured=False, category=category)
+            for i in range(max(sizes))
+        ])
+
+        def fill_cart(size):
+            Cart.objects.bulk_create([
+                Cart(user=user, menuitem=item, quantity=2, unit_price=item.price, price=item.price * 2)
+                for item in menu_items[:size]
+            ])
+
+        results = []
+        for size in sizes:
+            samples = {'bulk': [], 'per_row': []}
+            for _ in range(repeat):
+                fill_cart(size)
+                elapsed, _ = timed(checkout, user)
+                samples['bulk'].append(elapsed)
+
+                fill_cart(size)
+                elapsed, _ = timed(transaction.atomic()(per_row_checkout), user)
+                samples['per_row'].append(elapsed)
+            results.append({
+                'cart_size': size,
+                'bulk': summarize(samples['bulk']),
+                'per_row': summarize(samples['per_row']),
+            })
+        return results
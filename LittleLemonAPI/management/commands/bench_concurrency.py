@@ -0,0 +1,117 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection
+from django.test.utils import override_settings
+
+from LittleLemonAPI.benchmarks import benchmark_database, summarize, timed
+from LittleLemonAPI.models import Cart, Category, MenuItem
+from LittleLemonAPI.services import checkout
+
+# Django's own SQLite defaults, for comparison with SQLITE_PRAGMAS
+BASELINE_PRAGMAS = {'journal_mode': 'delete', 'synchronous': 'full'}
+
+
+class Command(BaseCommand):
+    help = "Benchmark concurrent cart and checkout writes against a throwaway SQLite database"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=8, help="Concurrent customers adding to cart and checking out")
+        parser.add_argument('--readers', type=int, default=2, help="Concurrent menu readers")
+        parser.add_argument('--iterations', type=int, default=25, help="Checkouts per writer")
+        parser.add_argument('--cart-size', type=int, default=5, help="Cart lines per checkout")
+        parser.add_argument('--json', action='store_true', help="Print the results as JSON")
+
+    def handle(self, *args, **options):
+        if connection.vendor == 'sqlite':
+            modes = {
+                'baseline': dict(settings.SQLITE_PRAGMAS, **BASELINE_PRAGMAS),
+                'tuned': settings.SQLITE_PRAGMAS,
+            }
+        else:
+            modes = {connection.vendor: None}
+
+        results = {}
+        for mode, pragmas in modes.items():
+            with tempfile.TemporaryDirectory() as directory:
+                with override_settings(SQLITE_PRAGMAS=pragmas or {}):
+                    with benchmark_database(test_name=os.path.join(directory, 'bench.sqlite3')):
+                        results[mode] = self.run(options)
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        self.stdout.write(
+            f"{'mode':>10} {'checkouts/s':>12} {'cart p95 ms':>12} {'checkout p95 ms':>16} "
+            f"{'read p95 ms':>12} {'lock errors':>12}"
+        )
+        for mode, row in results.items():
+            self.stdout.write(
+                f"{mode:>10} {row['checkouts_per_second']:>12} {row['cart']['p95_ms']:>12} "
+                f"{row['checkout']['p95_ms']:>16} {row['read']['p95_ms']:>12} {row['lock_errors']:>12}"
+            )
+
+    def run(self, options):
+        category = Category.objects.create(slug='bench', title='Bench')
+        menu_items = MenuItem.objects.bulk_create([
+            MenuItem(title=f'Bench dish {i}', price=Decimal('9.99'), featured=False, category=category)
+            for i in range(options['cart_size'])
+        ])
+        users = [User.objects.create_user(f'bench-customer-{i}') for i in range(options['writers'])]
+
+        samples = {'cart': [], 'checkout': [], 'read': []}
+        lock_errors = []
+        writers_done = threading.Event()
+
+        def writer(user):
+            try:
+                for _ in range(options['iterations']):
+                    try:
+                        elapsed, _ = timed(Cart.objects.bulk_create, [
+                            Cart(user=user, menuitem=item, quantity=1, unit_price=item.price, price=item.price)
+                            for item in menu_items
+                        ])
+                        samples['cart'].append(elapsed)
+                        elapsed, _ = timed(checkout, user)
+                        samples['checkout'].append(elapsed)
+                    except OperationalError:
+                        lock_errors.append(1)
+                        Cart.objects.filter(user=user).delete()
+            finally:
+                connection.close()
+
+        def reader():
+            try:
+                while not writers_done.is_set():
+                    elapsed, _ = timed(lambda: list(MenuItem.objects.select_related('category')))
+                    samples['read'].append(elapsed)
+            finally:
+                connection.close()
+
+        writer_threads = [threading.Thread(target=writer, args=(user,)) for user in users]
+        reader_threads = [threading.Thread(target=reader) for _ in range(options['readers'])]
+        start = time.perf_counter()
+        for thread in writer_threads + reader_threads:
+            thread.start()
+        for thread in writer_threads:
+            thread.join()
+        duration = time.perf_counter() - start
+        writers_done.set()
+        for thread in reader_threads:
+            thread.join()
+
+        return {
+            'duration_s': round(duration, 3),
+            'checkouts_per_second': round(len(samples['checkout']) / duration, 1),
+            'lock_errors': len(lock_errors),
+            'cart': summarize(samples['cart']),
+            'checkout': summarize(samples['checkout']),
+            'read': summarize(samples['read']),
+        }
@@ -0,0 +1,127 @@
+import heapq
+import json
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import Group, User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Count, Q
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from LittleLemonAPI.benchmarks import benchmark_database, summarize, timed
+from LittleLemonAPI.dispatch import crew_loads, dispatch_all, pending_orders
+from LittleLemonAPI.models import Order
+from LittleLemonAPI.roles import CUSTOMER, DELIVERY_CREW
+
+
+# dispatch_batch writing its assignments with a single bulk_update instead of
+# one UPDATE per crew member
+def bulk_update_dispatch(batch_size):
+    while True:
+        loads = sorted((load, crew_id) for crew_id, load in crew_loads().items())
+        orders = list(pending_orders().order_by('date', 'id').only('id')[:batch_size])
+        now = timezone.now()
+        for order in orders:
+            load, crew_id = heapq.heappop(loads)
+            order.delivery_crew_id = crew_id
+            order.updated_at = now
+            heapq.heappush(loads, (load + 1, crew_id))
+        Order.objects.bulk_update(orders, ['delivery_crew', 'updated_at'])
+        if len(orders) < batch_size:
+            return
+
+
+# The hand-rolled way: look the loads up again and save each order on its own
+def per_order_dispatch(crew):
+    for order in pending_orders().order_by('date', 'id'):
+        loads = User.objects.filter(id__in=crew).annotate(
+            open_orders=Count('delivery_crew', filter=Q(delivery_crew__status=False))
+        ).order_by('open_orders', 'id')
+        order.delivery_crew = loads.first()
+        order.save(update_fields=['delivery_crew', 'updated_at'])
+
+
+class Command(BaseCommand):
+    help = "Benchmark assigning pending orders to the delivery crew on a throwaway database"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=10000, help="Pending orders to assign")
+        parser.add_argument('--crew', type=int, default=25, help="Delivery crew members")
+        parser.add_argument('--batch-sizes', default='500,1000,5000', help="Comma separated batch sizes")
+        parser.add_argument('--repeat', type=int, default=3, help="Runs per batch size")
+        parser.add_argument('--per-order', type=int, default=500, help="Orders for the per-order comparison, 0 to skip")
+        parser.add_argument('--json', action='store_true', help="Print the results as JSON")
+
+    def handle(self, *args, **options):
+        batch_sizes = [int(size) for size in options['batch_sizes'].split(',')]
+        with benchmark_database():
+            results = self.run(options, batch_sizes)
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        self.stdout.write(f"{options['orders']} pending orders, {options['crew']} crew members")
+        self.stdout.write(f"{'method':>22} {'queries':>8} {'p50 ms':>10} {'max ms':>10} {'orders/s':>10}")
+        for row in results:
+            self.stdout.write(
+                f"{row['method']:>22} {row['queries']:>8} {row['p50_ms']:>10} {row['max_ms']:>10} {row['orders_per_second']:>10}"
+            )
+
+    @transaction.atomic
+    def seed(self, orders, crew_size):
+        customer = User.objects.create_user('bench-customer')
+        customer.groups.add(Group.objects.create(name=CUSTOMER))
+        crew = User.objects.bulk_create([User(username=f'bench-crew-{i}') for i in range(crew_size)])
+        Group.objects.create(name=DELIVERY_CREW).user_set.add(*crew)
+        # Uneven starting loads, so balancing has work to do
+        Order.objects.bulk_create([
+            Order(user=customer, delivery_crew=member, total=Decimal('10.00'), date=date.today())
+            for i, member in enumerate(crew) for _ in range(i % 5 * 10)
+        ])
+        today = date.today()
+        Order.objects.bulk_create([
+            Order(user=customer, total=Decimal('10.00'), date=today - timedelta(days=i % 30))
+            for i in range(orders)
+        ], batch_size=2000)
+        return [member.id for member in crew], list(pending_orders().values_list('id', flat=True))
+
+    def measure(self, method, count, repeat, run, reset):
+        samples, queries = [], 0
+        for _ in range(repeat):
+            reset()
+            with CaptureQueriesContext(connection) as captured:
+                elapsed, _ = timed(run)
+            samples.append(elapsed)
+            queries = len(captured)
+        row = {'method': method, 'orders': count, 'queries': queries}
+        row.update(summarize(samples))
+        row['orders_per_second'] = round(count / (sum(samples) / len(samples)), 1)
+        return row
+
+    def run(self, options, batch_sizes):
+        crew, pending = self.seed(options['orders'], options['crew'])
+
+        def reset(ids=pending):
+            Order.objects.filter(id__in=ids).update(delivery_crew=None)
+
+        results = [
+            self.measure(f'batched ({size})', len(pending), options['repeat'], lambda size=size: dispatch_all(size), reset)
+            for size in batch_sizes
+        ]
+        results.append(self.measure(
+            f'bulk_update ({batch_sizes[-1]})', len(pending), 1,
+            transaction.atomic()(lambda: bulk_update_dispatch(batch_sizes[-1])), reset,
+        ))
+        if options['per_order']:
+            subset = pending[:options['per_order']]
+
+            def reset_subset():
+                reset()
+                Order.objects.filter(id__in=pending[options['per_order']:]).update(delivery_crew=crew[0])
+
+            results.append(self.measure(
+                'per order', len(subset), 1, transaction.atomic()(lambda: per_order_dispatch(crew)), reset_subset,
+            ))
+        return results
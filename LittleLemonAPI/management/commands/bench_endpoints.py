@@ -0,0 +1,380 @@
+import json
+import os
+import platform
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+import django
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import ThreadedWSGIServer
+from django.db import connection
+from django.test import Client
+from django.test.testcases import QuietWSGIRequestHandler
+from rest_framework.authtoken.models import Token
+
+from LittleLemonAPI.benchmarks import (
+    BENCHMARK_PASSWORD, DEFAULT_SCALE, benchmark_database, seed_benchmark_data, summarize,
+)
+from LittleLemonAPI.models import Cart, MenuItem, Order
+from LittleLemonAPI.roles import CUSTOMER, DELIVERY_CREW, MANAGER
+
+
+#------------------------------------------------------------
+# Routes
+#------------------------------------------------------------
+class Route:
+    # One benchmarked request. prepare(ctx, i) runs untimed before the
+    # requests are sent and returns (path, body, token) for request i, so
+    # destructive routes get their own row to work on every time.
+    def __init__(self, name, method, path, role, prepare=None):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.role = role
+        self._prepare = prepare
+
+    def prepare(self, ctx, i):
+        token = ctx['tokens'].get(self.role) if self.role else None
+        if self._prepare is None:
+            return self.path.format(**ctx['ids']), None, token
+        return self._prepare(ctx, i, token)
+
+
+def new_user(ctx, i, prefix, group=None):
+    user = User.objects.create(username=f'{prefix}-{i}-{time.perf_counter_ns()}', password=ctx['password'])
+    if group is not None:
+        group.user_set.add(user)
+    return user
+
+
+def prepare_menu_item_create(ctx, i, token):
+    body = {'title': f'New dish {i}', 'price': '7.50', 'featured': False, 'category': ctx['ids']['category']}
+    return '/api/menu-items/', body, token
+
+
+def prepare_menu_item_update(ctx, i, token):
+    body = {'title': f'Updated dish {i}', 'price': '8.25', 'featured': True, 'category': ctx['ids']['category']}
+    return f"/api/menu-items/{ctx['ids']['menu_item']}", body, token
+
+
+def prepare_menu_item_delete(ctx, i, token):
+    item = MenuItem.objects.create(title=f'Doomed dish {i}', price=Decimal('1.00'), featured=False, category_id=ctx['ids']['category'])
+    return f'/api/menu-items/{item.id}', None, token
+
+
+# A different query per request: the endpoint caches its responses, and the
+# index is what is measured. "di" matches every seeded dish, as type-ahead does.
+def prepare_menu_search(ctx, i, token):
+    return f'/api/menu-items/search?q=di+{i}', None, token
+
+
+def prepare_group_add(path):
+    def prepare(ctx, i, token):
+        return path, {'username': f'bench-new-{i}-{time.perf_counter_ns()}'}, token
+    return prepare
+
+
+def prepare_group_remove(group_name, path):
+    def prepare(ctx, i, token):
+        user = new_user(ctx, i, 'bench-remove', ctx['groups'][group_name])
+        return f'{path}/{user.id}', None, token
+    return prepare
+
+
+# A fresh customer per request, so adding never collides with an existing line
+def prepare_cart_add(ctx, i, token):
+    user = new_user(ctx, i, 'bench-cart', ctx['groups'][CUSTOMER])
+    item_id = ctx['menu_items'][i % len(ctx['menu_items'])]
+    body = {'menuitem': item_id, 'quantity': 2, 'unit_price': '5.00', 'price': '10.00'}
+    return '/api/cart/menu-items', body, Token.objects.create(user=user).key
+
+
+def prepare_cart_remove(ctx, i, token):
+    cart = Cart.objects.create(
+        user=new_user(ctx, i, 'bench-cart', ctx['groups'][CUSTOMER]), menuitem_id=ctx['menu_items'][0],
+        quantity=1, unit_price=Decimal('5.00'), price=Decimal('5.00'),
+    )
+    return f'/api/cart/menu-items/{cart.id}', None, Token.objects.create(user=cart.user).key
+
+
+def prepare_cart_bulk(filled):
+    def prepare(ctx, i, token):
+        user = new_user(ctx, i, 'bench-bulk', ctx['groups'][CUSTOMER])
+        item_ids = ctx['menu_items'][:ctx['scale']['cart_lines']]
+        if filled:
+            Cart.objects.bulk_create([
+                Cart(user=user, menuitem_id=id, quantity=1, unit_price=Decimal('5.00'), price=Decimal('5.00'))
+                for id in item_ids
+            ])
+        body = {'items': [{'menuitem': id, 'quantity': 2} for id in item_ids]}
+        return '/api/cart/menu-items/bulk', body, Token.objects.create(user=user).key
+    return prepare
+
+
+def prepare_cart_clear(ctx, i, token):
+    path, _, token = prepare_cart_bulk(filled=True)(ctx, i, token)
+    return path, None, token
+
+
+def prepare_checkout(ctx, i, token):
+    user = new_user(ctx, i, 'bench-checkout', ctx['groups'][CUSTOMER])
+    Cart.objects.bulk_create([
+        Cart(user=user, menuitem_id=item_id, quantity=1, unit_price=Decimal('5.00'), price=Decimal('5.00'))
+        for item_id in ctx['menu_items'][:ctx['scale']['cart_lines']]
+    ])
+    return '/api/orders', None, Token.objects.create(user=user).key
+
+
+def prepare_order_update(ctx, i, token):
+    return f"/api/orders/{ctx['ids']['order']}", {'status': True}, token
+
+
+def prepare_order_delete(ctx, i, token):
+    order = Order.objects.create(user=ctx['users']['customer'], total=Decimal('5.00'), date='2023-03-01')
+    return f'/api/orders/{order.id}', None, token
+
+
+# An open order of its own per request, assigned to the benchmarked crew member
+def prepare_deliver(ctx, i, token):
+    order = Order.objects.create(
+        user=ctx['users']['customer'], delivery_crew=ctx['users']['crew'], total=Decimal('5.00'), date='2023-03-01',
+    )
+    return '/api/orders/deliver', {'orders': [order.id]}, token
+
+
+def prepare_login(ctx, i, token):
+    return '/auth/token/login/', {'username': ctx['users']['customer'].username, 'password': BENCHMARK_PASSWORD}, None
+
+
+ROUTES = [
+    Route('menu-items list', 'GET', '/api/menu-items/', 'manager'),
+    Route('menu-items list by price', 'GET', '/api/menu-items/?ordering=price&category={category}', 'manager'),
+    Route('menu-items create', 'POST', '/api/menu-items/', 'manager', prepare_menu_item_create),
+    Route('menu-item detail', 'GET', '/api/menu-items/{menu_item}', 'manager'),
+    Route('menu-item update', 'PUT', '/api/menu-items/{menu_item}', 'manager', prepare_menu_item_update),
+    Route('menu-item delete', 'DELETE', '/api/menu-items/{menu_item}', 'manager', prepare_menu_item_delete),
+    Route('menu-items search', 'GET', None, 'manager', prepare_menu_search),
+    Route('managers list', 'GET', '/api/groups/manager/users', 'manager'),
+    Route('managers add', 'POST', None, 'manager', prepare_group_add('/api/groups/manager/users')),
+    Route('managers remove', 'DELETE', None, 'manager',
+          prepare_group_remove(MANAGER, '/api/groups/manager/users')),
+    Route('delivery crew list', 'GET', '/api/groups/delivery-crew/users', 'manager'),
+    Route('delivery crew add', 'POST', None, 'manager', prepare_group_add('/api/groups/delivery-crew/users')),
+    Route('delivery crew remove', 'DELETE', None, 'manager',
+          prepare_group_remove(DELIVERY_CREW, '/api/groups/delivery-crew/users')),
+    Route('cart list', 'GET', '/api/cart/menu-items', 'customer'),
+    Route('cart add', 'POST', '/api/cart/menu-items', 'customer', prepare_cart_add),
+    Route('cart remove', 'DELETE', None, 'customer', prepare_cart_remove),
+    Route('cart bulk add', 'POST', None, 'customer', prepare_cart_bulk(filled=False)),
+    Route('cart bulk update', 'PATCH', None, 'customer', prepare_cart_bulk(filled=True)),
+    Route('cart bulk clear', 'DELETE', None, 'customer', prepare_cart_clear),
+    Route('cart summary', 'GET', '/api/cart/summary', 'customer'),
+    Route('orders list (customer)', 'GET', '/api/orders', 'customer'),
+    Route('orders list (manager)', 'GET', '/api/orders', 'manager'),
+    Route('orders list (delivery crew)', 'GET', '/api/orders', 'crew'),
+    Route('checkout', 'POST', '/api/orders', 'customer', prepare_checkout),
+    Route('order detail', 'GET', '/api/orders/{order}', 'customer'),
+    Route('order update', 'PUT', '/api/orders/{order}', 'customer', prepare_order_update),
+    Route('order delete', 'DELETE', None, 'manager', prepare_order_delete),
+    Route('orders summary (customer)', 'GET', '/api/orders/summary?from=2000-01-01', 'customer'),
+    Route('orders summary (manager)', 'GET', '/api/orders/summary', 'manager'),
+    Route('orders dispatch', 'POST', None, 'manager',
+          lambda ctx, i, token: ('/api/orders/dispatch', {'limit': 50}, token)),
+    Route('orders worklist', 'GET', '/api/orders/worklist', 'crew'),
+    Route('orders deliver', 'POST', None, 'crew', prepare_deliver),
+    Route('analytics revenue', 'GET', '/api/analytics/revenue?from=2000-01-01', 'manager'),
+    Route('analytics top items', 'GET', '/api/analytics/top-items?from=2000-01-01', 'manager'),
+    Route('analytics delivery crew', 'GET', '/api/analytics/delivery-crew?from=2000-01-01', 'manager'),
+    Route('metrics', 'GET', '/api/metrics', 'manager'),
+    Route('async menu-items list', 'GET', '/api/async/menu-items/', 'manager'),
+    Route('async menu-item detail', 'GET', '/api/async/menu-items/{menu_item}', 'manager'),
+    Route('async cart list', 'GET', '/api/async/cart/menu-items', 'customer'),
+    Route('async orders list', 'GET', '/api/async/orders', 'customer'),
+    Route('token login', 'POST', None, None, prepare_login),
+]
+
+
+#------------------------------------------------------------
+# Clients
+#------------------------------------------------------------
+class TestClientDriver:
+    name = 'test_client'
+    concurrency = 1
+
+    def __init__(self):
+        self.client = Client(raise_request_exception=False)
+
+    def send(self, method, path, body, token):
+        headers = {'HTTP_AUTHORIZATION': f'Token {token}'} if token else {}
+        data = json.dumps(body) if body is not None else ''
+        start = time.perf_counter()
+        response = self.client.generic(method, path, data, content_type='application/json', **headers)
+        if response.streaming:
+            b''.join(response.streaming_content)
+        return time.perf_counter() - start, response.status_code
+
+
+class ServerDriver:
+    # A real threaded WSGI server on a free local port, hit over HTTP
+    name = 'server'
+
+    def __init__(self, concurrency):
+        self.concurrency = concurrency
+        self.server = ThreadedWSGIServer(('127.0.0.1', 0), QuietWSGIRequestHandler, allow_reuse_address=False)
+        self.server.set_app(WSGIHandler())
+        self.base_url = f'http://localhost:{self.server.server_port}'
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def send(self, method, path, body, token):
+        headers = {'Content-Type': 'application/json'}
+        if token:
+            headers['Authorization'] = f'Token {token}'
+        data = json.dumps(body).encode() if body is not None else None
+        request = urllib.request.Request(self.base_url + path, data=data, method=method, headers=headers)
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request) as response:
+                response.read()
+                status = response.status
+        except urllib.error.HTTPError as error:
+            error.read()
+            status = error.code
+        return time.perf_counter() - start, status
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def run_route(driver, route, ctx, requests):
+    prepared = [route.prepare(ctx, i) for i in range(requests)]
+    # Each route starts from a cold menu/roles/token cache, so no route
+    # profits from the one before it. Only its first requests miss: the rest
+    # hit what they cached, as steady traffic would. (The server driver runs
+    # in this process, so it shares the cache being cleared.)
+    cache.clear()
+    start = time.perf_counter()
+    if driver.concurrency == 1:
+        samples = [driver.send(route.method, *args) for args in prepared]
+    else:
+        with ThreadPoolExecutor(max_workers=driver.concurrency) as pool:
+            samples = list(pool.map(lambda args: driver.send(route.method, *args), prepared))
+    elapsed = time.perf_counter() - start
+
+    statuses = {}
+    for _, code in samples:
+        statuses[str(code)] = statuses.get(str(code), 0) + 1
+    result = summarize([duration for duration, _ in samples])
+    result['requests_per_second'] = round(len(samples) / elapsed, 1)
+    result['errors'] = sum(1 for _, code in samples if code >= 500)
+    result['statuses'] = statuses
+    return result
+
+
+#------------------------------------------------------------
+# Baseline comparison
+#------------------------------------------------------------
+# Routes whose p95 grew by more than `threshold` (a fraction) over the
+# baseline, ignoring differences under min_ms which are noise
+def find_regressions(baseline, current, threshold, min_ms):
+    regressions = []
+    for mode, routes in current['results'].items():
+        for name, result in routes.items():
+            before = baseline.get('results', {}).get(mode, {}).get(name)
+            if before is None:
+                continue
+            limit = before['p95_ms'] * (1 + threshold)
+            if result['p95_ms'] > limit and result['p95_ms'] - before['p95_ms'] > min_ms:
+                regressions.append({
+                    'mode': mode,
+                    'route': name,
+                    'baseline_p95_ms': before['p95_ms'],
+                    'p95_ms': result['p95_ms'],
+                    'change': round(result['p95_ms'] / before['p95_ms'] - 1, 3) if before['p95_ms'] else None,
+                })
+    return regressions
+
+
+class Command(BaseCommand):
+    help = "Seed synthetic data and benchmark every API route plus token login, reporting latency percentiles as JSON"
+
+    def add_arguments(self, parser):
+        for name, default in DEFAULT_SCALE.items():
+            parser.add_argument(f"--{name.replace('_', '-')}", type=int, default=default, help=f"Seed scale (default {default})")
+        parser.add_argument('--requests', type=int, default=50, help="Requests per route")
+        parser.add_argument('--mode', choices=['test_client', 'server', 'both'], default='both')
+        parser.add_argument('--concurrency', type=int, default=4, help="Concurrent requests in server mode")
+        parser.add_argument('--routes', help="Comma separated substrings; only matching routes run")
+        parser.add_argument('--output', help="Write the JSON report to this file")
+        parser.add_argument('--baseline', help="Compare against a saved JSON report and fail on p95 regressions")
+        parser.add_argument('--threshold', type=float, default=0.2, help="Allowed p95 growth over the baseline (0.2 = 20%%)")
+        parser.add_argument('--min-ms', type=float, default=1.0, help="Ignore p95 differences smaller than this")
+
+    def handle(self, *args, **options):
+        scale = {name: options[name] for name in DEFAULT_SCALE}
+        routes = ROUTES
+        if options['routes']:
+            wanted = options['routes'].split(',')
+            routes = [route for route in ROUTES if any(w in route.name for w in wanted)]
+        modes = ['test_client', 'server'] if options['mode'] == 'both' else [options['mode']]
+
+        report = {
+            'environment': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+            },
+            'scale': scale,
+            'requests': options['requests'],
+            'concurrency': options['concurrency'],
+            'results': {},
+        }
+        with tempfile.TemporaryDirectory() as directory:
+            # On disk, so the server's request threads share the data
+            with benchmark_database(test_name=os.path.join(directory, 'bench.sqlite3')):
+                seeded = seed_benchmark_data(**scale)
+                customer_order = Order.objects.filter(user=seeded['users']['customer']).values_list('id', flat=True).first()
+                ctx = dict(seeded, ids={
+                    'category': seeded['categories'][0],
+                    'menu_item': seeded['menu_items'][0],
+                    'order': customer_order or seeded['orders'][0],
+                })
+                for mode in modes:
+                    driver = TestClientDriver() if mode == 'test_client' else ServerDriver(options['concurrency'])
+                    try:
+                        report['results'][mode] = {
+                            route.name: run_route(driver, route, ctx, options['requests']) for route in routes
+                        }
+                    finally:
+                        if mode == 'server':
+                            driver.close()
+                    connection.close()
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)
+            regressions = find_regressions(baseline, report, options['threshold'], options['min_ms'])
+            for regression in regressions:
+                self.stderr.write(
+                    f"REGRESSION {regression['mode']} / {regression['route']}: "
+                    f"p95 {regression['baseline_p95_ms']} ms -> {regression['p95_ms']} ms"
+                )
+            if regressions:
+                raise CommandError(f"{len(regressions)} route(s) regressed by more than {options['threshold']:.0%} at p95")
+            self.stderr.write(self.style.SUCCESS("No p95 regressions against the baseline"))
@@ -0,0 +1,82 @@
+import io
+import json
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from LittleLemonAPI.benchmarks import benchmark_database
+from LittleLemonAPI.menu_io import MENU_ITEM_FIELDS, import_categories, import_menu_items, read_rows, write_rows
+from LittleLemonAPI.models import Category, MenuItem
+from LittleLemonAPI.serializers import MenuItemSerializer
+
+
+def menu_file(file_format, items, categories, seed=0):
+    rng = random.Random(seed)
+    rows = (
+        {
+            'id': None, 'title': f'Seasonal Dish {i}', 'price': f'{rng.randint(300, 3000) / 100:.2f}',
+            'featured': rng.random() < 0.1, 'category': f'category-{rng.randrange(categories)}',
+        }
+        for i in range(items)
+    )
+    stream = io.StringIO()
+    write_rows(stream, file_format, MENU_ITEM_FIELDS, rows)
+    return stream.getvalue()
+
+
+class Command(BaseCommand):
+    help = "Benchmark import_menu per format and batch size against posting items one at a time"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, default=100000, help="Menu item rows per import")
+        parser.add_argument('--categories', type=int, default=20)
+        parser.add_argument('--formats', default='csv,json,ndjson', help="Comma separated file formats")
+        parser.add_argument('--batch-sizes', default='100,1000,5000', help="Comma separated batch sizes")
+        parser.add_argument('--serializer-rows', type=int, default=500,
+                            help="Rows saved one at a time through MenuItemSerializer, the way MenuItemView.post does")
+        parser.add_argument('--json', action='store_true', help="Print the results as JSON")
+
+    def handle(self, *args, **options):
+        results = []
+        with benchmark_database():
+            rows = ({'slug': f'category-{i}', 'title': f'Category {i}'} for i in range(options['categories']))
+            import_categories(rows)
+            for file_format in options['formats'].split(','):
+                content = menu_file(file_format, options['items'], options['categories'])
+                for batch_size in [int(value) for value in options['batch_sizes'].split(',')]:
+                    for mode in ('insert', 'update'):
+                        result = import_menu_items(read_rows(io.StringIO(content), file_format), batch_size=batch_size)
+                        results.append(self.row(file_format, batch_size, mode, result))
+                    MenuItem.objects.all().delete()
+            results.append(self.bench_serializer(options))
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        self.stdout.write(f"{'format':>10} {'batch':>6} {'mode':>7} {'rows':>8} {'seconds':>8} {'rows/s':>8}")
+        for row in results:
+            self.stdout.write(
+                f"{row['format']:>10} {row['batch_size']:>6} {row['mode']:>7} {row['rows']:>8} "
+                f"{row['seconds']:>8} {row['rows_per_second']:>8}"
+            )
+
+    def row(self, file_format, batch_size, mode, result):
+        return {
+            'format': file_format, 'batch_size': batch_size, 'mode': mode,
+            'rows': result['created'] + result['updated'], 'seconds': result['seconds'],
+            'rows_per_second': result['rows_per_second'],
+        }
+
+    def bench_serializer(self, options):
+        category = Category.objects.first()
+        start = time.perf_counter()
+        for i in range(options['serializer_rows']):
+            serializer = MenuItemSerializer(data={'title': f'Posted Dish {i}', 'price': '5.00', 'featured': False, 'category': category.id})
+            serializer.is_valid(raise_exception=True)
+            serializer.save()
+        seconds = time.perf_counter() - start
+        return {
+            'format': 'serializer', 'batch_size': 1, 'mode': 'insert', 'rows': options['serializer_rows'],
+            'seconds': round(seconds, 3), 'rows_per_second': round(options['serializer_rows'] / seconds),
+        }
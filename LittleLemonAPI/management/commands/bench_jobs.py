@@ -0,0 +1,100 @@
+import json
+import os
+import tempfile
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection
+
+from LittleLemonAPI.benchmarks import benchmark_database, timed
+from LittleLemonAPI.jobs import enqueue, enqueue_many, task, work
+from LittleLemonAPI.models import Job
+
+
+# Stands in for a real task; `ms` simulates its work (an SMTP call, say)
+@task('bench_sleep')
+def bench_sleep(ms=0):
+    if ms:
+        time.sleep(ms / 1000)
+
+
+class Command(BaseCommand):
+    help = "Benchmark enqueueing and draining the job queue on a throwaway SQLite database"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--jobs', type=int, default=2000, help="Jobs drained per run")
+        parser.add_argument('--work-ms', type=float, default=0, help="Simulated work per job in milliseconds")
+        parser.add_argument('--concurrency', default='1,2,4', help="Comma separated worker thread counts")
+        parser.add_argument('--batch-sizes', default='1,10,50', help="Comma separated claim batch sizes")
+        parser.add_argument('--json', action='store_true', help="Print the results as JSON")
+
+    def handle(self, *args, **options):
+        concurrency = [int(value) for value in options['concurrency'].split(',')]
+        batch_sizes = [int(value) for value in options['batch_sizes'].split(',')]
+        with tempfile.TemporaryDirectory() as directory:
+            # Several workers need an on-disk database
+            with benchmark_database(test_name=os.path.join(directory, 'bench.sqlite3')):
+                results = {'enqueue': self.bench_enqueue(options['jobs']), 'drain': []}
+                for workers in concurrency:
+                    for batch_size in batch_sizes:
+                        results['drain'].append(self.bench_drain(options, workers, batch_size))
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        for name, row in results['enqueue'].items():
+            self.stdout.write(f"enqueue {name:>6}: {row['jobs_per_second']:>10} jobs/s")
+        self.stdout.write(f"{'workers':>8} {'batch':>6} {'jobs/s':>10} {'done':>6} {'lost':>5} {'lock errors':>12}")
+        for row in results['drain']:
+            self.stdout.write(
+                f"{row['workers']:>8} {row['batch_size']:>6} {row['jobs_per_second']:>10} "
+                f"{row['done']:>6} {row['lost']:>5} {row['lock_errors']:>12}"
+            )
+
+    def bench_enqueue(self, count):
+        results = {}
+        elapsed, _ = timed(lambda: [enqueue('bench_sleep') for _ in range(count)])
+        results['single'] = {'seconds': round(elapsed, 3), 'jobs_per_second': round(count / elapsed)}
+        Job.objects.all().delete()
+        elapsed, _ = timed(lambda: [enqueue_many([('bench_sleep', {})] * 500) for _ in range(0, count, 500)])
+        results['bulk'] = {'seconds': round(elapsed, 3), 'jobs_per_second': round(count / elapsed)}
+        Job.objects.all().delete()
+        return results
+
+    def bench_drain(self, options, workers, batch_size):
+        payload = {'ms': options['work_ms']}
+        for start in range(0, options['jobs'], 500):
+            enqueue_many([('bench_sleep', payload)] * min(500, options['jobs'] - start))
+
+        totals = {'done': 0, 'retried': 0, 'failed': 0, 'lost': 0}
+        lock_errors = []
+        lock = threading.Lock()
+
+        def worker():
+            try:
+                while True:
+                    try:
+                        counts = work(batch_size=batch_size, burst=True)
+                        break
+                    except OperationalError:
+                        lock_errors.append(1)
+                with lock:
+                    for outcome, count in counts.items():
+                        totals[outcome] += count
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(workers)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        duration = time.perf_counter() - start
+        left = Job.objects.count()
+        Job.objects.all().delete()
+        return dict(
+            totals, workers=workers, batch_size=batch_size, left=left, lock_errors=len(lock_errors),
+            seconds=round(duration, 3), jobs_per_second=round(totals['done'] / duration),
+        )
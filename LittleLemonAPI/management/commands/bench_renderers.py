@@ -0,0 +1,92 @@
+import json
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from LittleLemonAPI.benchmarks import DEFAULT_SCALE, benchmark_database, seed_benchmark_data, summarize
+from LittleLemonAPI.renderers import COMPRESSORS, FastJSONRenderer, MessagePackRenderer
+
+# The payloads, fetched once as the manager: the menu (largest page), and
+# the manager order list flat and with menu items and categories nested on
+# every line
+PAYLOADS = {
+    'menu': '/api/menu-items/?page_size=200',
+    'orders (manager)': '/api/orders',
+    'orders (nested)': '/api/orders?expand=menuitem.category',
+}
+
+RENDERERS = {
+    'drf json': JSONRenderer,
+    'fast json': FastJSONRenderer,
+    'msgpack': MessagePackRenderer,
+}
+
+
+class Command(BaseCommand):
+    help = "Benchmark bytes on the wire and render CPU per renderer and content encoding on a throwaway database"
+
+    def add_arguments(self, parser):
+        for name, default in DEFAULT_SCALE.items():
+            parser.add_argument(f"--{name.replace('_', '-')}", type=int, default=default)
+        parser.add_argument('--repeat', type=int, default=20, help="Renders per payload, renderer and encoding")
+        parser.add_argument('--json', action='store_true', help="Print the results as JSON")
+
+    def handle(self, *args, **options):
+        scale = {name: options[name] for name in DEFAULT_SCALE}
+        with benchmark_database():
+            seed_benchmark_data(**scale)
+            client = APIClient()
+            client.force_authenticate(User.objects.get(username='bench-manager-0'))
+            payloads = {}
+            for name, path in PAYLOADS.items():
+                response = client.get(path)
+                assert response.status_code == 200, (path, response.status_code)
+                payloads[name] = response.data
+        results = {name: self.run(data, options['repeat']) for name, data in payloads.items()}
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        self.stdout.write(
+            f"{'payload':>17} {'renderer':>10} {'encoding':>9} {'bytes':>9} {'vs drf':>7} "
+            f"{'render p50 ms':>14} {'compress p50 ms':>16} {'cpu p50 ms':>11}"
+        )
+        for name, rows in results.items():
+            baseline = rows[0]['bytes']
+            for row in rows:
+                self.stdout.write(
+                    f"{name:>17} {row['renderer']:>10} {row['encoding']:>9} {row['bytes']:>9} "
+                    f"{row['bytes'] / baseline:>7.1%} {row['render']['p50_ms']:>14} "
+                    f"{row['compress']['p50_ms']:>16} {row['cpu']['p50_ms']:>11}"
+                )
+
+    # CPU time (process_time) to render, and to compress the rendered body,
+    # per renderer and encoding. Rendering without a response in the
+    # context skips the renderers' own compression, so the two are timed
+    # apart with the same compressors and levels.
+    def run(self, data, repeat):
+        rows = []
+        for renderer_name, renderer_class in RENDERERS.items():
+            renderer = renderer_class()
+            render = []
+            for _ in range(repeat):
+                start = time.process_time()
+                body = renderer.render(data)
+                render.append(time.process_time() - start)
+            for encoding in ['identity'] + [name for name in settings.RESPONSE_COMPRESSION_ENCODINGS if name in COMPRESSORS]:
+                compress, sent = [], body
+                if encoding != 'identity':
+                    for _ in range(repeat):
+                        start = time.process_time()
+                        sent = COMPRESSORS[encoding](body, settings.RESPONSE_COMPRESSION_LEVELS[encoding])
+                        compress.append(time.process_time() - start)
+                cpu = [r + c for r, c in zip(render, compress)] if compress else render
+                rows.append({
+                    'renderer': renderer_name, 'encoding': encoding, 'bytes': len(sent),
+                    'render': summarize(render), 'compress': summarize(compress or [0.0]), 'cpu': summarize(cpu),
+                })
+        return rows
@@ -0,0 +1,89 @@
+import json
+import random
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from LittleLemonAPI.benchmarks import benchmark_database, summarize, timed
+from LittleLemonAPI.models import Category, MenuItem
+from LittleLemonAPI.search import FTS5Index, MemoryIndex, fts5_available
+
+STYLES = ['Grilled', 'Roasted', 'Spicy', 'Crispy', 'Smoked', 'Braised', 'Fried', 'Baked', 'Steamed', 'Charred', 'Creamy', 'Sweet']
+INGREDIENTS = [
+    'Chicken', 'Lamb', 'Beef', 'Pork', 'Salmon', 'Tuna', 'Shrimp', 'Octopus', 'Halloumi', 'Feta', 'Aubergine',
+    'Chickpea', 'Lentil', 'Mushroom', 'Spinach', 'Tomato', 'Pepper', 'Olive', 'Lemon', 'Garlic', 'Saffron', 'Fig',
+]
+DISHES = [
+    'Souvlaki', 'Gyro', 'Moussaka', 'Risotto', 'Pasta', 'Salad', 'Soup', 'Stew', 'Flatbread', 'Skewers', 'Tagine',
+    'Pie', 'Burger', 'Wrap', 'Bruschetta', 'Falafel', 'Paella', 'Kebab', 'Tart', 'Baklava', 'Chips', 'Chimichanga',
+]
+CATEGORIES = ['Starters', 'Mains', 'Desserts', 'Drinks', 'Sides', 'Specials', 'Vegetarian', 'Seafood', 'Kids', 'Brunch']
+
+# What a client sends while someone types, and a few whole queries
+QUERIES = ['ch', 'chi', 'chic', 'chick', 'chicken', 'chicken s', 'chicken sou', 'sp', 'spi', 'spicy la',
+           'risotto', 'lemon tart', 'sea', 'desserts fig', 'octopus gr']
+
+
+def build_menu(size, seed=0):
+    rng = random.Random(seed)
+    categories = Category.objects.bulk_create([
+        Category(slug=title.lower(), title=title) for title in CATEGORIES
+    ])
+    for start in range(0, size, 10000):
+        MenuItem.objects.bulk_create([
+            MenuItem(
+                title=f'{rng.choice(STYLES)} {rng.choice(INGREDIENTS)} {rng.choice(DISHES)} No. {i}',
+                price=Decimal(rng.randint(300, 3000)) / 100,
+                featured=False,
+                category=rng.choice(categories),
+            )
+            for i in range(start, min(start + 10000, size))
+        ])
+
+
+class Command(BaseCommand):
+    help = "Benchmark menu search per index on a generated catalogue, against a title__icontains scan"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, default=100000, help="Menu items in the catalogue")
+        parser.add_argument('--repeat', type=int, default=20, help="Runs per query")
+        parser.add_argument('--limit', type=int, default=10, help="Results per query")
+        parser.add_argument('--json', action='store_true', help="Print the results as JSON")
+
+    def handle(self, *args, **options):
+        results = {}
+        with benchmark_database():
+            build_menu(options['items'])
+            indexes = {'memory': MemoryIndex()}
+            if fts5_available():
+                indexes['fts5'] = FTS5Index()
+            for name, index in indexes.items():
+                elapsed, _ = timed(index.rebuild)
+                results[name] = {'build_seconds': round(elapsed, 3), 'queries': self.run(index.search, options)}
+            results['icontains'] = {'build_seconds': 0, 'queries': self.run(self.scan, options)}
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        names = list(results)
+        self.stdout.write(f"{'query':>14} " + ' '.join(f"{name + ' p50/p99 ms':>24}" for name in names))
+        for query in QUERIES:
+            cells = [f"{results[name]['queries'][query]['p50_ms']}/{results[name]['queries'][query]['p99_ms']}" for name in names]
+            self.stdout.write(f"{query:>14} " + ' '.join(f"{cell:>24}" for cell in cells))
+        self.stdout.write('build seconds: ' + ', '.join(f"{name} {results[name]['build_seconds']}" for name in names))
+
+    # What ?search= on the menu list does today
+    def scan(self, query, limit):
+        return list(MenuItem.objects.filter(title__icontains=query).values_list('pk', flat=True)[:limit])
+
+    def run(self, search, options):
+        results = {}
+        for query in QUERIES:
+            samples = []
+            for _ in range(options['repeat']):
+                start = time.perf_counter()
+                search(query, options['limit'])
+                samples.append(time.perf_counter() - start)
+            results[query] = summarize(samples)
+        return results
@@ -0,0 +1,75 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from LittleLemonAPI.benchmarks import DEFAULT_SCALE, benchmark_database, seed_benchmark_data, summarize
+from LittleLemonAPI.models import Cart, MenuItem, OrderItem
+from LittleLemonAPI.serializers import CartSerializer, MenuItemSerializer, OrderItemSerializer
+
+# The list endpoints, with the ?expand= that gives back the nested shape they
+# had before the flat default
+LISTS = {
+    'menu-items': (MenuItemSerializer, MenuItem.objects.order_by('id'), 'category'),
+    'cart (all lines)': (CartSerializer, Cart.objects.order_by('id'), 'user,menuitem.category'),
+    'orders (manager)': (OrderItemSerializer, OrderItem.objects.order_by('id'), 'menuitem.category'),
+}
+
+
+def make_request(**params):
+    return Request(APIRequestFactory().get('/', params))
+
+
+# Fetches and serializes the list the way the views do: nested (the old
+# default), flat through the serializer, and flat from .values()
+def modes(serializer_class, queryset, expand):
+    nested = make_request(expand=expand)
+    flat = make_request()
+    return {
+        'nested': lambda: serializer_class.read_data(serializer_class.read_queryset(queryset, nested), nested),
+        'flat': lambda: serializer_class(serializer_class.setup_eager_loading(queryset, flat), many=True).data,
+        'values': lambda: serializer_class.read_data(serializer_class.read_queryset(queryset, flat), flat),
+    }
+
+
+class Command(BaseCommand):
+    help = "Benchmark nested, flat and .values() serialization of the list endpoints on a throwaway database"
+
+    def add_arguments(self, parser):
+        for name, default in DEFAULT_SCALE.items():
+            parser.add_argument(f"--{name.replace('_', '-')}", type=int, default=default)
+        parser.add_argument('--repeat', type=int, default=10, help="Runs per list and mode")
+        parser.add_argument('--json', action='store_true', help="Print the results as JSON")
+
+    def handle(self, *args, **options):
+        scale = {name: options[name] for name in DEFAULT_SCALE}
+        with benchmark_database():
+            seed_benchmark_data(**scale)
+            results = {name: self.run(*spec, options['repeat']) for name, spec in LISTS.items()}
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        self.stdout.write(f"{'list':>18} {'mode':>7} {'rows':>6} {'bytes':>9} {'cpu p50 ms':>11} {'wall p50 ms':>12}")
+        for name, by_mode in results.items():
+            for mode, row in by_mode.items():
+                self.stdout.write(
+                    f"{name:>18} {mode:>7} {row['rows']:>6} {row['bytes']:>9} "
+                    f"{row['cpu']['p50_ms']:>11} {row['wall']['p50_ms']:>12}"
+                )
+
+    def run(self, serializer_class, queryset, expand, repeat):
+        results = {}
+        for mode, build in modes(serializer_class, queryset, expand).items():
+            cpu, wall = [], []
+            for _ in range(repeat):
+                cpu_start, wall_start = time.process_time(), time.perf_counter()
+                data = build()
+                body = JSONRenderer().render(data)
+                cpu.append(time.process_time() - cpu_start)
+                wall.append(time.perf_counter() - wall_start)
+            results[mode] = {'rows': len(data), 'bytes': len(body), 'cpu': summarize(cpu), 'wall': summarize(wall)}
+        return results
@@ -0,0 +1,65 @@
+import json
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+
+from LittleLemonAPI.benchmarks import summarize
+from LittleLemonAPI.throttling import CacheStore, LocalMemoryStore, hit
+
+STORES = {
+    'local': LocalMemoryStore,
+    'cache': CacheStore,
+}
+
+
+class Command(BaseCommand):
+    help = "Benchmark the cost of a throttle check per counter store, with many users and threads"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--checks', type=int, default=50000, help="Checks per thread")
+        parser.add_argument('--users', type=int, default=500, help="Distinct users checked (two counters each)")
+        parser.add_argument('--threads', type=int, default=4, help="Concurrent threads")
+        parser.add_argument('--json', action='store_true', help="Print the results as JSON")
+
+    def handle(self, *args, **options):
+        results = {name: self.run(store_class(), options) for name, store_class in STORES.items()}
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        self.stdout.write(f"{'store':>6} {'checks/s':>10} {'mean us':>8} {'p99 us':>8} {'denied':>8}")
+        for name, row in results.items():
+            self.stdout.write(
+                f"{name:>6} {row['checks_per_second']:>10} {row['mean_us']:>8} {row['p99_us']:>8} {row['denied']:>8}"
+            )
+
+    def run(self, store, options):
+        # Tight enough that some users hit it
+        limit = (options['checks'] * options['threads'] // options['users'] // 2 or 1, 60)
+        samples, denied = [], []
+
+        def worker(offset):
+            local_samples, local_denied = [], 0
+            for i in range(options['checks']):
+                key = f"all:user:{(i + offset) % options['users']}"
+                start = time.perf_counter()
+                allowed, _ = hit(store, key, limit)
+                local_samples.append(time.perf_counter() - start)
+                local_denied += not allowed
+            samples.extend(local_samples)
+            denied.append(local_denied)
+
+        threads = [threading.Thread(target=worker, args=(n * 7919,)) for n in range(options['threads'])]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        duration = time.perf_counter() - start
+        summary = summarize(samples)
+        return {
+            'checks_per_second': round(len(samples) / duration),
+            'mean_us': round(summary['mean_ms'] * 1000, 1),
+            'p99_us': round(summary['p99_ms'] * 1000, 1),
+            'denied': sum(denied),
+        }
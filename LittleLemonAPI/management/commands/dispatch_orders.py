@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from LittleLemonAPI.dispatch import dispatch_all, pending_orders
+
+
+class Command(BaseCommand):
+    help = "Assign pending orders to the least loaded delivery crew members; safe to run on a schedule"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.DISPATCH_BATCH_SIZE, help="Orders assigned per transaction")
+        parser.add_argument('--max-open', type=int, default=settings.DISPATCH_MAX_OPEN_ORDERS,
+                            help="Most open orders per crew member, 0 for no limit")
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be at least 1")
+        if options['max_open'] < 0:
+            raise CommandError("--max-open must be 0 or more")
+        assigned = dispatch_all(options['batch_size'], options['max_open'])
+        if options['verbosity'] > 1:
+            for crew_id, count in sorted(assigned.items()):
+                self.stdout.write(f"  crew member {crew_id}: {count}")
+        self.stdout.write(f"Assigned {sum(assigned.values())} orders, {pending_orders().count()} still pending")
@@ -0,0 +1,85 @@
+import re
+from datetime import date
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Q
+
+from LittleLemonAPI.dispatch import open_orders, pending_orders
+from LittleLemonAPI.models import Cart, MenuItem, Order, OrderItem
+from LittleLemonAPI.services import cart_summary_queryset, order_summary_queryset
+from LittleLemonAPI.serializers import CartSerializer, MenuItemSerializer, OrderItemSerializer, OrderSerializer
+
+# A plan line reading "SCAN <table>" without an index reads the whole table
+FULL_SCAN = re.compile(r'\bSCAN (\w+)(?! USING (?:COVERING )?INDEX)(?:\s|$)')
+
+
+# The queryset each endpoint runs, built the same way as in views.py. A user
+# instance is enough to build the filters, it doesn't need to exist. Menu
+# pages are planned with a keyset cursor applied, as every page but the first
+# is (the first is a LIMITed scan in index order). Summaries are planned over
+# a month, as the view always applies a date range.
+def endpoint_querysets():
+    user = User(pk=1)
+    summary_range = (date(2023, 3, 1), date(2023, 3, 31))
+    menu_items = MenuItemSerializer.read_queryset(MenuItem.objects.all())
+    return {
+        'GET menu-items/?cursor=': menu_items.filter(id__gt=1).order_by('id')[:51],
+        'GET menu-items/?ordering=price&cursor=': menu_items.filter(
+            Q(price__gt=1) | Q(price=1, id__gt=1)
+        ).order_by('price', 'id')[:51],
+        'GET menu-items/?category=1': menu_items.filter(category_id=1).order_by('id')[:51],
+        'GET menu-items/<id>': MenuItemSerializer.setup_eager_loading(MenuItem.objects.filter(id=1)),
+        'GET cart/menu-items': CartSerializer.read_queryset(Cart.objects.filter(user=user)),
+        'GET orders (customer)': OrderSerializer.read_queryset(Order.objects.filter(user=user).order_by('date')),
+        'GET orders (delivery crew)': OrderSerializer.read_queryset(Order.objects.filter(delivery_crew=user)),
+        'GET orders (delivery crew, open)': OrderSerializer.read_queryset(
+            Order.objects.filter(delivery_crew=user, status=False).order_by('date')
+        ),
+        'GET orders/<id>': OrderSerializer.setup_eager_loading(Order.objects.filter(id=1)),
+        'GET orders/<id> items': OrderItem.objects.filter(order_id=1),
+        'POST orders/dispatch (pending)': pending_orders().order_by('date', 'id').values_list('id', 'user_id')[:1000],
+        # The two queries of crew_worklist, and the rows mark_delivered locks
+        'GET orders/worklist': open_orders(user).order_by('date', 'id').values('id', 'user__username'),
+        'GET orders/worklist items': OrderItem.objects.filter(order__in=open_orders(user)).order_by('id').values('order_id', 'menuitem__title'),
+        'POST orders/deliver': Order.objects.filter(id__in=[1, 2], delivery_crew=user).values('id', 'status'),
+        'GET cart/summary': cart_summary_queryset(user),
+        'GET orders/summary (customer)': order_summary_queryset(Order.objects.filter(user=user), *summary_range),
+        'GET orders/summary (manager)': order_summary_queryset(Order.objects.all(), *summary_range),
+    }
+
+# Endpoints that list a whole table on purpose
+EXPECTED_SCANS = {
+    'GET orders (manager)': OrderItemSerializer.read_queryset(OrderItem.objects.all()),
+}
+
+
+class Command(BaseCommand):
+    help = "Run EXPLAIN QUERY PLAN for every endpoint's queryset and flag full table scans"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fail-on-scan', action='store_true', help="Exit with an error if any full table scan is found")
+        parser.add_argument('--verbose-plans', action='store_true', help="Print every plan, not only the flagged ones")
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError("explain_queries reads SQLite query plans; run it against the SQLite database")
+
+        flagged = []
+        checks = [(name, queryset, False) for name, queryset in endpoint_querysets().items()]
+        checks += [(name, queryset, True) for name, queryset in EXPECTED_SCANS.items()]
+        for name, queryset, scan_expected in checks:
+            plan = queryset.explain()
+            scans = FULL_SCAN.findall(plan)
+            if scans and not scan_expected:
+                flagged.append(name)
+                self.stdout.write(self.style.WARNING(f"FULL SCAN  {name}: {', '.join(scans)}"))
+            else:
+                self.stdout.write(self.style.SUCCESS(f"ok         {name}") + (" (full listing)" if scan_expected else ""))
+            if options['verbose_plans'] or (scans and not scan_expected):
+                for line in plan.splitlines():
+                    self.stdout.write(f"             {line}")
+
+        if flagged and options['fail_on_scan']:
+            raise CommandError(f"{len(flagged)} endpoint queryset(s) do full table scans: {', '.join(flagged)}")
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from LittleLemonAPI.menu_io import CATEGORY_FIELDS, FORMATS, MENU_ITEM_FIELDS, category_rows, detect_format, menu_item_rows, write_rows
+
+EXPORTERS = {
+    'categories': (category_rows, CATEGORY_FIELDS),
+    'menu-items': (menu_item_rows, MENU_ITEM_FIELDS),
+}
+
+
+class Command(BaseCommand):
+    help = "Export categories or menu items as CSV, JSON or NDJSON, in the shape import_menu reads"
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=EXPORTERS)
+        parser.add_argument('path', nargs='?', default='-', help="File to write, - (the default) for standard output")
+        parser.add_argument('--format', choices=FORMATS, help="File format, by default from the extension (csv otherwise)")
+
+    def handle(self, *args, **options):
+        rows, fields = EXPORTERS[options['kind']]
+        file_format = options['format'] or detect_format(options['path'])
+        if options['path'] == '-':
+            # Rows carry their own line endings, as with dumpdata
+            self.stdout.ending = None
+            write_rows(self.stdout, file_format, fields, rows())
+            return
+        with open(options['path'], 'w', newline='', encoding='utf-8') as stream:
+            count = write_rows(stream, file_format, fields, rows())
+        self.stderr.write(f"Exported {count} {options['kind']} to {options['path']}")
@@ -0,0 +1,51 @@
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from LittleLemonAPI.menu_io import FORMATS, detect_format, import_categories, import_menu_items, read_rows
+
+IMPORTERS = {
+    'categories': import_categories,
+    'menu-items': import_menu_items,
+}
+
+
+class Command(BaseCommand):
+    help = "Import categories or menu items from a CSV, JSON or NDJSON file, in batched bulk writes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=IMPORTERS, help="What the file holds; import categories first")
+        parser.add_argument('path', help="File to read, - for standard input")
+        parser.add_argument('--format', choices=FORMATS, help="File format, by default from the extension (csv otherwise)")
+        parser.add_argument('--batch-size', type=int, default=settings.IMPORT_BATCH_SIZE, help="Rows validated and written per transaction")
+        parser.add_argument('--key', choices=['title', 'id'], default='title',
+                            help="How menu items are matched to existing ones (id for files from export_menu)")
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be at least 1")
+        file_format = options['format'] or detect_format(options['path'])
+        kwargs = {'batch_size': options['batch_size']}
+        if options['kind'] == 'menu-items':
+            kwargs['key'] = options['key']
+
+        stream = sys.stdin if options['path'] == '-' else open(options['path'], newline='', encoding='utf-8')
+        try:
+            result = IMPORTERS[options['kind']](read_rows(stream, file_format), **kwargs)
+        except (ValueError, UnicodeDecodeError) as error:
+            raise CommandError(f"Could not read {options['path']}: {error}")
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        for number, errors in result['errors']:
+            details = '; '.join(f"{field}: {' '.join(messages)}" for field, messages in errors.items())
+            self.stderr.write(f"Row {number}: {details}")
+        if result['invalid'] > len(result['errors']):
+            self.stderr.write(f"... and {result['invalid'] - len(result['errors'])} more invalid rows")
+        style = self.style.SUCCESS if not result['invalid'] else self.style.WARNING
+        self.stdout.write(style(
+            f"{result['created']} created, {result['updated']} updated, {result['invalid']} invalid "
+            f"in {result['seconds']}s ({result['rows_per_second']} rows/s)"
+        ))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from LittleLemonAPI.analytics import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "Rebuild the sales rollup tables (daily revenue, item sales, crew deliveries) from the orders"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help="Orders aggregated per query")
+
+    def handle(self, *args, **options):
+        verbosity = options['verbosity']
+
+        def progress(last_id, count):
+            if verbosity > 1:
+                self.stdout.write(f"  {count} orders up to id {last_id}")
+
+        rows = rebuild_rollups(batch_size=options['batch_size'], progress=progress)
+        for table, count in rows.items():
+            self.stdout.write(f"{table}: {count} rows")
+        self.stdout.write(self.style.SUCCESS("Rollups rebuilt"))
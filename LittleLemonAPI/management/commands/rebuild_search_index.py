@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from LittleLemonAPI.search import get_search_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the menu search index from the menu items, after bulk writes or loading fixtures"
+
+    def handle(self, *args, **options):
+        index = get_search_index()
+        count = index.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {count} menu items ({type(index).__name__})"))
@@ -0,0 +1,61 @@
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from LittleLemonAPI.jobs import work
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs (order receipts, kitchen tickets) until interrupted"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=1, help="Worker threads")
+        parser.add_argument('--batch-size', type=int, default=settings.JOBS_BATCH_SIZE, help="Jobs leased per claim")
+        parser.add_argument('--lease', type=int, default=settings.JOBS_LEASE,
+                            help="Seconds a claimed batch is held before other workers may take it over")
+        parser.add_argument('--poll-interval', type=float, default=settings.JOBS_POLL_INTERVAL,
+                            help="Seconds between polls when nothing is due")
+        parser.add_argument('--burst', action='store_true', help="Exit once no job is due")
+
+    def handle(self, *args, **options):
+        stop = threading.Event()
+        totals = {}
+        lock = threading.Lock()
+
+        def worker():
+            try:
+                counts = work(options['batch_size'], options['lease'], options['poll_interval'], options['burst'], stop)
+                with lock:
+                    for outcome, count in counts.items():
+                        totals[outcome] = totals.get(outcome, 0) + count
+            finally:
+                connection.close()
+
+        if options['concurrency'] == 1:
+            try:
+                totals = work(options['batch_size'], options['lease'], options['poll_interval'], options['burst'], stop)
+            except KeyboardInterrupt:
+                # The job being run is retried once its lease runs out
+                pass
+            self.report(totals)
+            return
+
+        threads = [threading.Thread(target=worker) for _ in range(options['concurrency'])]
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                # join() with a timeout so Ctrl-C is seen
+                while thread.is_alive():
+                    thread.join(0.5)
+        except KeyboardInterrupt:
+            # Jobs already running finish, nothing new is claimed
+            stop.set()
+            for thread in threads:
+                thread.join()
+        self.report(totals)
+
+    def report(self, totals):
+        self.stdout.write(", ".join(f"{count} {outcome}" for outcome, count in sorted(totals.items()) if count) or "No jobs run")
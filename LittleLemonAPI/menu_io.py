@@ -0,0 +1,293 @@
+import csv
+import json
+import time
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import F
+
+from .cache import bump_menu_version
+from .models import Category, MenuItem
+from .search import get_search_index
+
+FORMATS = ('csv', 'json', 'ndjson')
+
+CATEGORY_FIELDS = ['slug', 'title']
+MENU_ITEM_FIELDS = ['id', 'title', 'price', 'featured', 'category']
+
+# Errors kept for the report; the rest are only counted
+MAX_REPORTED_ERRORS = 50
+
+
+#------------------------------------------------------------
+# Reading and writing rows
+#------------------------------------------------------------
+def detect_format(path, default='csv'):
+    extension = path.rsplit('.', 1)[-1].lower() if '.' in path else ''
+    return extension if extension in FORMATS else default
+
+
+# Parses a JSON array one element at a time, reading the stream in blocks,
+# so a large file never has to be in memory at once
+def iter_json_array(stream, block_size=65536):
+    decoder = json.JSONDecoder()
+    buffer, position = '', 0
+
+    def fill():
+        nonlocal buffer, position
+        block = stream.read(block_size)
+        buffer, position = buffer[position:] + block, 0
+        return bool(block)
+
+    # The next character that isn't whitespace or a separator, '' at the end
+    def peek(separators=''):
+        nonlocal position
+        while True:
+            while position < len(buffer) and (buffer[position].isspace() or buffer[position] in separators):
+                position += 1
+            if position < len(buffer):
+                return buffer[position]
+            if not fill():
+                return ''
+
+    if peek() != '[':
+        raise ValueError("Expected a JSON array")
+    position += 1
+    while True:
+        char = peek(',')
+        if char == ']':
+            return
+        if not char:
+            raise ValueError("Unterminated JSON array")
+        while True:
+            try:
+                value, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                # An element cut off at the end of the block
+                if fill():
+                    continue
+                raise
+            # A number may go on in the next block
+            if end == len(buffer) and fill():
+                continue
+            break
+        position = end
+        yield value
+
+
+# Yields one dict per row of a csv, json (array of objects) or ndjson stream
+def read_rows(stream, file_format):
+    if file_format == 'csv':
+        yield from csv.DictReader(stream)
+    elif file_format == 'ndjson':
+        for line in stream:
+            if line.strip():
+                yield json.loads(line)
+    else:
+        yield from iter_json_array(stream)
+
+
+def write_rows(stream, file_format, fields, rows):
+    count = 0
+    if file_format == 'csv':
+        writer = csv.DictWriter(stream, fieldnames=fields, lineterminator='\n')
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+        return count
+    if file_format == 'json':
+        stream.write('[')
+    for row in rows:
+        if file_format == 'json':
+            stream.write(('\n' if not count else ',\n') + json.dumps(row, ensure_ascii=False))
+        else:
+            stream.write(json.dumps(row, ensure_ascii=False) + '\n')
+        count += 1
+    if file_format == 'json':
+        stream.write('\n]\n' if count else ']\n')
+    return count
+
+
+#------------------------------------------------------------
+# Export
+#------------------------------------------------------------
+# Rows read chunk_size at a time, in the shape the import takes back:
+# categories by slug, prices as strings so they stay exact
+def category_rows(chunk_size=2000):
+    return Category.objects.order_by('id').values(*CATEGORY_FIELDS).iterator(chunk_size=chunk_size)
+
+
+def menu_item_rows(chunk_size=2000):
+    rows = MenuItem.objects.order_by('id').values('id', 'title', 'price', 'featured', category_slug=F('category__slug'))
+    for row in rows.iterator(chunk_size=chunk_size):
+        yield {
+            'id': row['id'], 'title': row['title'], 'price': str(row['price']),
+            'featured': row['featured'], 'category': row['category_slug'],
+        }
+
+
+#------------------------------------------------------------
+# Import
+#------------------------------------------------------------
+# Rows are read lazily and handled batch_size at a time: each batch is
+# validated with the model fields' own checks (not a serializer per row),
+# its categories and existing rows are looked up with one query each, and
+# it is written with bulk_create: new rows in one INSERT, existing ones in
+# one INSERT ... ON CONFLICT DO UPDATE (bulk_update's CASE per row and field
+# is two orders of magnitude slower). Each batch has a transaction of its
+# own, so other writers get the database between batches. Invalid rows are
+# skipped and reported by row number. Bulk writes skip the signals, so each
+# batch updates the search index and moves the menu version itself.
+
+def new_result():
+    return {'created': 0, 'updated': 0, 'invalid': 0, 'errors': [], 'seconds': 0, 'rows_per_second': 0}
+
+
+def batches(rows, batch_size):
+    rows = enumerate(rows, start=1)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+# Spellings of booleans found in spreadsheets, besides JSON's own
+BOOLEANS = {
+    '': False, '0': False, 'f': False, 'false': False, 'n': False, 'no': False,
+    '1': True, 't': True, 'true': True, 'y': True, 'yes': True,
+}
+
+
+def clean_field(model, name, value, errors):
+    field = model._meta.get_field(name)
+    if isinstance(value, str):
+        value = value.strip()
+    try:
+        return field.clean(value, None)
+    except ValidationError as error:
+        errors[name] = error.messages
+
+
+def reject(result, number, errors):
+    result['invalid'] += 1
+    if len(result['errors']) < MAX_REPORTED_ERRORS:
+        result['errors'].append((number, errors))
+
+
+def finish(result, start):
+    result['errors'].sort(key=lambda error: error[0])
+    result['seconds'] = round(time.perf_counter() - start, 3)
+    rows = result['created'] + result['updated'] + result['invalid']
+    result['rows_per_second'] = round(rows / result['seconds']) if result['seconds'] else rows
+    return result
+
+
+# Categories are matched by slug: new ones are created, existing ones get
+# the new title
+def import_categories(rows, batch_size=1000):
+    result, start = new_result(), time.perf_counter()
+    for batch in batches(rows, batch_size):
+        valid = {}
+        for number, row in batch:
+            errors = {}
+            if not isinstance(row, dict):
+                reject(result, number, {'row': ["Must be an object."]})
+                continue
+            values = {name: clean_field(Category, name, row.get(name), errors) for name in CATEGORY_FIELDS}
+            if errors:
+                reject(result, number, errors)
+            else:
+                # A slug repeated in the batch: the last row wins
+                valid[values['slug']] = values
+        existing = dict(Category.objects.filter(slug__in=valid).values_list('slug', 'id'))
+        with transaction.atomic():
+            Category.objects.bulk_create(
+                [Category(**values) for values in valid.values()],
+                update_conflicts=True, unique_fields=['slug'], update_fields=['title'],
+            )
+            if existing:
+                get_search_index().index_items(MenuItem.objects.filter(category__in=existing.values()).values_list('pk', flat=True))
+        bump_menu_version()
+        result['created'] += len(valid) - len(existing)
+        result['updated'] += len(existing)
+    return finish(result, start)
+
+
+def clean_menu_item(row, key, errors):
+    values = {name: clean_field(MenuItem, name, row.get(name), errors) for name in ('title', 'price')}
+    featured = row.get('featured')
+    if isinstance(featured, str):
+        featured = BOOLEANS.get(featured.strip().lower(), featured)
+    values['featured'] = False if featured is None else clean_field(MenuItem, 'featured', featured, errors)
+    slug = row.get('category')
+    values['category'] = slug.strip() if isinstance(slug, str) else slug
+    if not values['category']:
+        errors['category'] = ["This field is required."]
+    if key == 'id' and row.get('id') not in (None, ''):
+        values['id'] = clean_field(MenuItem, 'id', row['id'], errors)
+    return values
+
+
+# Menu items are matched to existing ones by `key`: 'title' (the default,
+# for menus kept in a spreadsheet; with duplicate titles the newest item is
+# updated) or 'id' (for files from export_menu). Rows that match nothing are
+# created. Their category must exist, given by slug.
+def import_menu_items(rows, batch_size=1000, key='title'):
+    result, start = new_result(), time.perf_counter()
+    for batch in batches(rows, batch_size):
+        valid = []
+        for number, row in batch:
+            errors = {}
+            if not isinstance(row, dict):
+                reject(result, number, {'row': ["Must be an object."]})
+                continue
+            values = clean_menu_item(row, key, errors)
+            if errors:
+                reject(result, number, errors)
+            else:
+                valid.append((number, values))
+
+        categories = dict(Category.objects.filter(slug__in={values['category'] for _, values in valid}).values_list('slug', 'id'))
+        if key == 'id':
+            existing = set(MenuItem.objects.filter(pk__in=[values['id'] for _, values in valid if values.get('id')]).values_list('pk', flat=True))
+        else:
+            existing = dict(
+                MenuItem.objects.filter(title__in={values['title'] for _, values in valid}).order_by('id').values_list('title', 'pk')
+            )
+
+        created, updated = {}, {}
+        for number, values in valid:
+            if values['category'] not in categories:
+                reject(result, number, {'category': [f"No category with slug '{values['category']}'."]})
+                continue
+            values['category_id'] = categories[values.pop('category')]
+            if key == 'id':
+                pk = values.pop('id', None)
+                found = pk in existing
+            else:
+                pk = existing.get(values['title'])
+                found = pk is not None
+            # Rows repeated in the batch: the last one wins
+            if found:
+                updated[pk] = MenuItem(id=pk, **values)
+            else:
+                new_key = values['title'] if key == 'title' else pk or f'row {number}'
+                created[new_key] = MenuItem(id=pk, **values)
+
+        with transaction.atomic():
+            # Separately: with a conflict clause the new ids aren't returned
+            created = MenuItem.objects.bulk_create(created.values())
+            MenuItem.objects.bulk_create(
+                updated.values(),
+                update_conflicts=True,
+                unique_fields=['id'],
+                update_fields=['title', 'price', 'featured', 'category', 'updated_at'],
+            )
+            get_search_index().index_items([item.pk for item in created] + list(updated))
+        bump_menu_version()
+        result['created'] += len(created)
+        result['updated'] += len(updated)
+    return finish(result, start)
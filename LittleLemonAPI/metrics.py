@@ -0,0 +1,152 @@
+import bisect
+import contextvars
+import threading
+import time
+
+#------------------------------------------------------------
+# Per-request measurements
+#------------------------------------------------------------
+# The request being measured, if it was sampled. A context variable, so DB
+# queries run through sync_to_async in async views are attributed too.
+current_request_metrics = contextvars.ContextVar('current_request_metrics', default=None)
+
+
+class RequestMetrics:
+    __slots__ = ('start', 'db_queries', 'db_time', 'view_done', 'db_time_in_view')
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.view_done = None
+        self.db_time_in_view = None
+
+    # Called once the view has returned, before the response is rendered
+    def mark_view_done(self):
+        self.view_done = time.perf_counter()
+        self.db_time_in_view = self.db_time
+
+
+# Installed on every DB connection (see signals.py); costs one context
+# variable lookup per query when the request isn't sampled
+def record_query(execute, sql, params, many, context):
+    metrics = current_request_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.db_queries += 1
+        metrics.db_time += time.perf_counter() - start
+
+
+#------------------------------------------------------------
+# Histograms
+#------------------------------------------------------------
+def exponential_buckets(start, factor, count):
+    return tuple(start * factor ** i for i in range(count))
+
+
+SECONDS_BUCKETS = exponential_buckets(0.0005, 2, 16)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144)
+BYTES_BUCKETS = exponential_buckets(128, 4, 10)
+
+
+class Histogram:
+    # Cumulative counts per upper bound; quantiles are estimated by linear
+    # interpolation inside the bucket, as Prometheus' histogram_quantile does
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            yield bound, total
+
+    def quantile(self, q):
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        lower, previous = 0.0, 0
+        for bound, total in self.cumulative():
+            if total >= rank:
+                if bound == float('inf'):
+                    return lower
+                in_bucket = total - previous
+                return lower + (bound - lower) * ((rank - previous) / in_bucket if in_bucket else 0)
+            lower, previous = bound, total
+        return lower
+
+
+# name -> (help text, buckets)
+METRICS = {
+    'request_seconds': ("Wall time of the request", SECONDS_BUCKETS),
+    'db_seconds': ("Time spent in database queries", SECONDS_BUCKETS),
+    'db_queries': ("Database queries per request", COUNT_BUCKETS),
+    'view_seconds': ("Time in the view outside the database, including building serializer data", SECONDS_BUCKETS),
+    'render_seconds': ("Time rendering the response body", SECONDS_BUCKETS),
+    'response_bytes': ("Size of the response body", BYTES_BUCKETS),
+}
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+
+    def observe(self, view, values):
+        with self.lock:
+            histograms = self.histograms.get(view)
+            if histograms is None:
+                histograms = self.histograms[view] = {name: Histogram(buckets) for name, (_, buckets) in METRICS.items()}
+            for name, value in values.items():
+                histograms[name].observe(value)
+
+    def clear(self):
+        with self.lock:
+            self.histograms = {}
+
+    # Prometheus text exposition format 0.0.4
+    def render(self, prefix='littlelemon_'):
+        lines = []
+        with self.lock:
+            views = sorted(self.histograms.items())
+            for name, (help_text, _) in METRICS.items():
+                metric = prefix + name
+                lines.append(f'# HELP {metric} {help_text}')
+                lines.append(f'# TYPE {metric} histogram')
+                for view, histograms in views:
+                    histogram = histograms[name]
+                    label = f'view="{escape_label(view)}"'
+                    for bound, total in histogram.cumulative():
+                        le = '+Inf' if bound == float('inf') else repr(float(bound))
+                        lines.append(f'{metric}_bucket{{{label},le="{le}"}} {total}')
+                    lines.append(f'{metric}_sum{{{label}}} {histogram.sum!r}')
+                    lines.append(f'{metric}_count{{{label}}} {histogram.count}')
+
+                lines.append(f'# HELP {metric}_quantile {help_text}, estimated quantiles')
+                lines.append(f'# TYPE {metric}_quantile gauge')
+                for view, histograms in views:
+                    for q in QUANTILES:
+                        value = histograms[name].quantile(q)
+                        lines.append(f'{metric}_quantile{{view="{escape_label(view)}",quantile="{q}"}} {value!r}')
+        return '\n'.join(lines) + '\n'
+
+
+def escape_label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+registry = MetricsRegistry()
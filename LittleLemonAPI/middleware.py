@@ -0,0 +1,90 @@
+import asyncio
+import random
+import time
+
+from django.conf import settings
+
+from .metrics import RequestMetrics, current_request_metrics, registry
+
+
+#------------------------------------------------------------
+# Performance instrumentation
+#------------------------------------------------------------
+class PerformanceMiddleware:
+    # Measures a sample of requests (METRICS_SAMPLE_RATE, 0 to 1): wall time,
+    # DB queries and DB time, time in the view, rendering time and response
+    # size. They are aggregated per route for the metrics endpoint and sent
+    # back in a Server-Timing header. Unsampled requests only pay for one
+    # random() call. Put it first in MIDDLEWARE so it times the whole stack.
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(self.get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        if not self.sampled():
+            return self.get_response(request)
+        metrics = RequestMetrics()
+        token = current_request_metrics.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_request_metrics.reset(token)
+        return self.record(request, response, metrics)
+
+    async def __acall__(self, request):
+        if not self.sampled():
+            return await self.get_response(request)
+        metrics = RequestMetrics()
+        token = current_request_metrics.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_request_metrics.reset(token)
+        return self.record(request, response, metrics)
+
+    def sampled(self):
+        rate = settings.METRICS_SAMPLE_RATE
+        return rate >= 1 or (rate > 0 and random.random() < rate)
+
+    # DRF responses are rendered after the view returns; this hook runs in
+    # between, which is how view and render time are told apart
+    def process_template_response(self, request, response):
+        metrics = current_request_metrics.get()
+        if metrics is not None:
+            metrics.mark_view_done()
+        return response
+
+    def record(self, request, response, metrics):
+        end = time.perf_counter()
+        wall = end - metrics.start
+        if metrics.view_done is None:
+            view = wall - metrics.db_time
+            render = 0.0
+        else:
+            view = metrics.view_done - metrics.start - metrics.db_time_in_view
+            render = end - metrics.view_done - (metrics.db_time - metrics.db_time_in_view)
+        size = 0 if response.streaming else len(response.content)
+
+        match = getattr(request, 'resolver_match', None)
+        registry.observe(match.route if match else 'unmatched', {
+            'request_seconds': wall,
+            'db_seconds': metrics.db_time,
+            'db_queries': metrics.db_queries,
+            'view_seconds': max(view, 0.0),
+            'render_seconds': max(render, 0.0),
+            'response_bytes': size,
+        })
+
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={metrics.db_time * 1000:.2f};desc="{metrics.db_queries} queries"',
+            f'view;dur={max(view, 0.0) * 1000:.2f}',
+            f'render;dur={max(render, 0.0) * 1000:.2f}',
+            f'total;dur={wall * 1000:.2f}',
+        ])
+        return response
@@ -0,0 +1,67 @@
+from django.db import migrations, models
+import django.db.models.deletion
+from django.utils import timezone
+
+
+# OrderItem.order used to point at the customer. Group each customer's
+# existing order items under a new Order so no history is lost.
+def attach_items_to_orders(apps, schema_editor):
+    Order = apps.get_model('LittleLemonAPI', 'Order')
+    OrderItem = apps.get_model('LittleLemonAPI', 'OrderItem')
+    items_by_user = {}
+    for item in OrderItem.objects.all():
+        items_by_user.setdefault(item.order_id, []).append(item)
+    for user_id, items in items_by_user.items():
+        order = Order.objects.create(
+            user_id=user_id,
+            total=sum(item.price for item in items),
+            date=timezone.localdate(),
+        )
+        OrderItem.objects.filter(id__in=[item.id for item in items]).update(new_order=order)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('LittleLemonAPI', '0003_order'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='idempotency_key',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='order',
+            constraint=models.UniqueConstraint(fields=('user', 'idempotency_key'), name='unique_order_idempotency_key'),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='new_order',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='LittleLemonAPI.order'),
+        ),
+        migrations.RunPython(attach_items_to_orders, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='orderitem',
+            unique_together=set(),
+        ),
+        migrations.RemoveField(
+            model_name='orderitem',
+            name='order',
+        ),
+        migrations.RenameField(
+            model_name='orderitem',
+            old_name='new_order',
+            new_name='order',
+        ),
+        migrations.AlterField(
+            model_name='orderitem',
+            name='order',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='LittleLemonAPI.order'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='orderitem',
+            unique_together={('order', 'menuitem')},
+        ),
+    ]
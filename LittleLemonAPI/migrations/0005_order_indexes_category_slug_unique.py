@@ -0,0 +1,44 @@
+# Generated by Django 4.1.7 on 2026-10-18 05:40
+
+from django.db import migrations, models
+
+
+# Category.slug becomes unique; suffix any existing duplicates first, with
+# a suffix no other category has or is given (mains-3 may exist already)
+def deduplicate_category_slugs(apps, schema_editor):
+    Category = apps.get_model('LittleLemonAPI', 'Category')
+    taken = set(Category.objects.values_list('slug', flat=True))
+    seen = set()
+    for category in Category.objects.order_by('id'):
+        if category.slug in seen:
+            number = category.id
+            while f'{category.slug}-{number}' in taken:
+                number += 1
+            category.slug = f'{category.slug}-{number}'
+            category.save(update_fields=['slug'])
+            taken.add(category.slug)
+        seen.add(category.slug)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('LittleLemonAPI', '0004_orderitem_order_fk_order_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.RunPython(deduplicate_category_slugs, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='category',
+            name='slug',
+            field=models.SlugField(unique=True),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', 'date'], name='order_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('status', False)), fields=['delivery_crew', 'date'], name='order_crew_open_date_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.1.7 on 2026-10-18 05:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('LittleLemonAPI', '0005_order_indexes_category_slug_unique'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='order',
+            name='order_user_date_idx',
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', 'date', 'status', 'total'], name='order_user_date_summary_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+from django.db import migrations
+from django.db.utils import OperationalError
+
+
+# The FTS5 table behind the menu search, see search.py. Only SQLite builds
+# with FTS5 get it; elsewhere the search falls back to the in-memory index.
+def create_search_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    try:
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE LittleLemonAPI_menuitem_search USING fts5("
+            "title, category, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+        )
+    except OperationalError:
+        # no such module: fts5
+        return
+    schema_editor.execute(
+        "INSERT INTO LittleLemonAPI_menuitem_search (rowid, title, category) "
+        "SELECT item.id, item.title, category.title FROM LittleLemonAPI_menuitem item "
+        "JOIN LittleLemonAPI_category category ON category.id = item.category_id"
+    )
+
+
+def drop_search_table(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS LittleLemonAPI_menuitem_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('LittleLemonAPI', '0009_jobs'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_table, drop_search_table),
+    ]
@@ -3,7 +3,7 @@ from django.contrib.auth.models import User
 
 # Create your models here.
 class Category(models.Model):
-    slug = models.SlugField()
+    slug = models.SlugField(unique=True)
     title = models.CharField(max_length=255, db_index=True)
 
     def __str__(self):
@@ -15,6 +15,7 @@ class MenuItem(models.Model):
     price = models.DecimalField(max_digits=6, decimal_places=2, db_index=True)
     featured = models.BooleanField(db_index=True)
     category = models.ForeignKey(Category, on_delete=models.PROTECT)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
             return self.title
@@ -26,6 +27,7 @@ class Cart(models.Model):
     quantity = models.SmallIntegerField()
     unit_price = models.DecimalField(max_digits=6, decimal_places=2)
     price = models.DecimalField(max_digits=6, decimal_places=2)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         unique_together =('menuitem', 'user')
@@ -40,13 +42,30 @@ class Order(models.Model):
     status = models.BooleanField(default=0, db_index=True)
     total = models.DecimalField(max_digits=6, decimal_places=2)
     date = models.DateField(db_index=True)
+    idempotency_key = models.CharField(max_length=64, null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'idempotency_key'], name='unique_order_idempotency_key'),
+        ]
+        indexes = [
+            # A customer's order history, newest first. status and total
+            # make it covering for the daily order summary.
+            models.Index(fields=['user', 'date', 'status', 'total'], name='order_user_date_summary_idx'),
+            # A delivery crew member's open orders by day, and with
+            # delivery_crew IS NULL the orders waiting for dispatch. Partial,
+            # because status=False is rendered as NOT status, which can't use
+            # a status column in a composite index
+            models.Index(fields=['delivery_crew', 'date'], condition=models.Q(status=False), name='order_crew_open_date_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} -> {self.delivery_crew.username}"
     
 
 class OrderItem(models.Model):
-    order = models.ForeignKey(User, on_delete=models.CASCADE)
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
     menuitem = models.ForeignKey(MenuItem, on_delete=models.CASCADE)
     quantity = models.SmallIntegerField()
     unit_price = models.DecimalField(max_digits=6, decimal_places=2)
@@ -56,5 +75,74 @@ class OrderItem(models.Model):
         unique_together = ('order', 'menuitem')
     
     def __str__(self):
-        return f"{self.order.username} -> {self.menuitem}"
-    
\ No newline at end of file
+        return f"{self.order.user.username} -> {self.menuitem}"
+    
+
+# Sales rollups, kept up to date by analytics.py as orders change and
+# rebuilt from scratch by the rebuild_analytics command
+class DailyRevenue(models.Model):
+    date = models.DateField(unique=True)
+    orders = models.IntegerField(default=0)
+    delivered_orders = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f"{self.date}: {self.revenue}"
+
+
+class DailyItemSales(models.Model):
+    date = models.DateField()
+    menuitem = models.ForeignKey(MenuItem, on_delete=models.CASCADE)
+    quantity = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ('date', 'menuitem')
+
+    def __str__(self):
+        return f"{self.date}: {self.menuitem} x {self.quantity}"
+
+
+class DailyCrewDeliveries(models.Model):
+    date = models.DateField()
+    delivery_crew = models.ForeignKey(User, on_delete=models.CASCADE)
+    delivered = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ('date', 'delivery_crew')
+
+    def __str__(self):
+        return f"{self.date}: {self.delivery_crew.username} -> {self.delivered}"
+
+
+# Background jobs, see jobs.py. A job is queued until a worker leases it;
+# a lease that runs out (the worker died) makes the job claimable again.
+class Job(models.Model):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(QUEUED, 'Queued'), (RUNNING, 'Running'), (DONE, 'Done'), (FAILED, 'Failed')]
+
+    task = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.SmallIntegerField(default=0)
+    max_attempts = models.SmallIntegerField(default=5)
+    run_at = models.DateTimeField()
+    locked_by = models.CharField(max_length=100, null=True, blank=True)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Workers look for due queued jobs and for expired leases
+            models.Index(fields=['status', 'run_at'], name='job_status_run_at_idx'),
+            models.Index(fields=['status', 'locked_until'], name='job_status_lease_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.task} #{self.pk} ({self.status})"
@@ -0,0 +1,165 @@
+import base64
+import json
+from collections import OrderedDict
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+# Largest id a cursor may carry, a signed 64-bit integer
+MAX_ID = 2 ** 63 - 1
+
+
+#------------------------------------------------------------
+# Keyset (cursor) pagination
+#------------------------------------------------------------
+class KeysetPagination(BasePagination):
+    # Paginates on (ordering field, id) so every page is a single indexed
+    # range scan, no matter how deep into the result set the client is.
+    page_size = 50
+    max_page_size = 200
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    ordering_query_param = 'ordering'
+    ordering_fields = ('id',)
+    default_ordering = 'id'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.build_page(list(self.get_page_queryset(queryset, request)))
+
+    # Async views fetch the page queryset themselves (e.g. with aiterator)
+    # and hand the rows to build_page.
+    def get_page_queryset(self, queryset, request):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.field, self.descending = self.get_ordering(request)
+        self.cursor = self.decode_cursor(request, queryset.model)
+
+        # Walking backwards flips the direction of both the ordering and the
+        # range condition; build_page flips the page back.
+        self.reverse = self.cursor is not None and self.cursor['r']
+        descending = self.descending != self.reverse
+        queryset = queryset.order_by(*self.order_by(descending))
+        if self.cursor is not None:
+            queryset = queryset.filter(self.range_filter(descending))
+        return queryset[:self.page_size + 1]
+
+    def build_page(self, results):
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if self.reverse:
+            results.reverse()
+            self.has_next = True
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = self.cursor is not None
+        self.page = results
+        return results
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True},
+                'previous': {'type': 'string', 'nullable': True},
+                'results': schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        value = request.query_params.get(self.page_size_query_param)
+        if value is None:
+            return self.page_size
+        try:
+            size = int(value)
+        except ValueError:
+            raise ValidationError({self.page_size_query_param: 'Must be an integer.'})
+        if size < 1:
+            raise ValidationError({self.page_size_query_param: 'Must be a positive integer.'})
+        return min(size, self.max_page_size)
+
+    def get_ordering(self, request):
+        ordering = request.query_params.get(self.ordering_query_param, self.default_ordering)
+        field = ordering.lstrip('-')
+        if field not in self.ordering_fields:
+            raise ValidationError({
+                self.ordering_query_param: f"Must be one of: {', '.join(self.ordering_fields)} (prefix '-' for descending)."
+            })
+        return field, ordering.startswith('-')
+
+    def order_by(self, descending):
+        prefix = '-' if descending else ''
+        if self.field == 'id':
+            return [f'{prefix}id']
+        return [f'{prefix}{self.field}', f'{prefix}id']
+
+    def range_filter(self, descending):
+        lookup = 'lt' if descending else 'gt'
+        value, pk = self.cursor['v'], self.cursor['i']
+        if self.field == 'id':
+            return Q(**{f'id__{lookup}': pk})
+        return Q(**{f'{self.field}__{lookup}': value}) | Q(**{self.field: value, f'id__{lookup}': pk})
+
+    # Cursor encoding. Cursors come from the client, so the position is
+    # checked before it reaches a query: the value must pass the ordering
+    # field's own checks and the id must fit a database integer.
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+            if cursor['f'] != self.field or cursor['d'] != self.descending:
+                raise ValueError
+            cursor['i'] = int(cursor['i'])
+            if not 0 <= cursor['i'] <= MAX_ID:
+                raise ValueError
+            cursor['r'] = bool(cursor['r'])
+            value = cursor['v']
+            if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+                raise ValueError
+            cursor['v'] = model._meta.get_field(self.field).clean(value, None)
+        except (TypeError, ValueError, KeyError, UnicodeEncodeError, OverflowError, DjangoValidationError):
+            raise NotFound('Invalid cursor')
+        return cursor
+
+    # Pages hold model instances or, from .values() querysets, dicts
+    def encode_cursor(self, item, reverse):
+        if isinstance(item, dict):
+            value, pk = item[self.field], item['id']
+        else:
+            value, pk = getattr(item, self.field), item.pk
+        if isinstance(value, Decimal):
+            value = str(value)
+        cursor = {'f': self.field, 'd': self.descending, 'v': value, 'i': pk, 'r': reverse}
+        encoded = base64.urlsafe_b64encode(json.dumps(cursor, separators=(',', ':')).encode('ascii'))
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded.decode('ascii'))
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+
+class MenuItemPagination(KeysetPagination):
+    ordering_fields = ('id', 'price', 'title')
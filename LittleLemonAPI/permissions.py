@@ -0,0 +1,28 @@
+from rest_framework.permissions import BasePermission
+
+from .roles import CUSTOMER, DELIVERY_CREW, MANAGER, has_role
+
+
+#------------------------------------------------------------
+# Role based permissions
+#------------------------------------------------------------
+class HasRole(BasePermission):
+    role = None
+
+    def has_permission(self, request, view):
+        return has_role(request.user, self.role)
+
+
+class IsManager(HasRole):
+    role = MANAGER
+    message = "Only managers can perform this action."
+
+
+class IsCustomer(HasRole):
+    role = CUSTOMER
+    message = "Only customers can perform this action."
+
+
+class IsDeliveryCrew(HasRole):
+    role = DELIVERY_CREW
+    message = "Only the delivery crew can perform this action."
@@ -0,0 +1,343 @@
+import gzip
+import struct
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from rest_framework import renderers
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+from rest_framework.utils.encoders import JSONEncoder
+
+# Optional: orjson makes FastJSONRenderer several times faster and brotli
+# adds br to the response encodings. Without them JSON is rendered with the
+# standard library and responses are only gzipped.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# Types JSON and MessagePack have no notation for (Decimal, datetimes, UUIDs,
+# lazy strings, querysets...) become what DRF's JSON renderer makes of them
+def default(value):
+    return JSONEncoder().default(value)
+
+
+#------------------------------------------------------------
+# Response compression
+#------------------------------------------------------------
+def gzip_compress(content, level):
+    return gzip.compress(content, compresslevel=level, mtime=0)
+
+
+def brotli_compress(content, level):
+    return brotli.compress(content, quality=level)
+
+
+COMPRESSORS = {'gzip': gzip_compress}
+if brotli is not None:
+    COMPRESSORS['br'] = brotli_compress
+
+
+# The first of RESPONSE_COMPRESSION_ENCODINGS (that this install can
+# produce) the Accept-Encoding header allows, None if there's none
+def choose_encoding(accept_encoding):
+    accepted = {}
+    for part in accept_encoding.split(','):
+        name, _, params = part.partition(';')
+        name, quality = name.strip().lower(), 1.0
+        for param in params.split(';'):
+            key, _, value = param.partition('=')
+            if key.strip() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if name:
+            accepted[name] = quality
+    for encoding in settings.RESPONSE_COMPRESSION_ENCODINGS:
+        if encoding in COMPRESSORS and accepted.get(encoding, accepted.get('*', 0)) > 0:
+            return encoding
+    return None
+
+
+# Compresses a rendered body of at least RESPONSE_COMPRESSION_MIN_BYTES for a
+# client that accepts it, setting Content-Encoding and Vary on the response.
+# The ETag becomes weak, as with Django's GZipMiddleware: the bytes differ
+# per encoding, the content doesn't.
+def compress_response(content, renderer, renderer_context):
+    renderer_context = renderer_context or {}
+    request, response = renderer_context.get('request'), renderer_context.get('response')
+    # Rendering on behalf of another renderer (the browsable API's
+    # embedded content) or a response encoded already
+    if response is None or getattr(response, 'accepted_renderer', None) is not renderer or response.has_header('Content-Encoding'):
+        return content
+    if request is None or len(content) < settings.RESPONSE_COMPRESSION_MIN_BYTES:
+        return content
+    patch_vary_headers(response, ('Accept-Encoding',))
+    encoding = choose_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+    if encoding is None:
+        return content
+    compressed = COMPRESSORS[encoding](content, settings.RESPONSE_COMPRESSION_LEVELS[encoding])
+    if len(compressed) >= len(content):
+        return content
+    response['Content-Encoding'] = encoding
+    etag = response.get('ETag')
+    if etag and etag.startswith('"'):
+        response['ETag'] = 'W/' + etag
+    return compressed
+
+
+#------------------------------------------------------------
+# JSON
+#------------------------------------------------------------
+class FastJSONRenderer(renderers.JSONRenderer):
+    # Same output as DRF's JSONRenderer (compact, UTF-8, dates and decimals
+    # as DRF writes them), rendered by orjson when it is installed, then
+    # compressed. Indented output ('indent=' in Accept, the browsable API)
+    # is left to DRF.
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            content = super().render(data, accepted_media_type, renderer_context)
+        else:
+            content = orjson.dumps(data, default=default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME)
+            # Escaped like DRF does, so the output stays a JavaScript subset
+            if b'\xe2\x80\xa8' in content or b'\xe2\x80\xa9' in content:
+                content = content.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return compress_response(content, self, renderer_context)
+
+
+#------------------------------------------------------------
+# MessagePack
+#------------------------------------------------------------
+# The subset of https://msgpack.org/ a JSON payload needs: nil, booleans,
+# integers, float 64, str, bin, arrays and maps, each in its smallest form.
+# No extension types: everything else is written as in JSON (see default).
+
+def str_header(size):
+    if size < 32:
+        return bytes((0xa0 | size,))
+    if size < 0x100:
+        return bytes((0xd9, size))
+    if size < 0x10000:
+        return struct.pack('>BH', 0xda, size)
+    return struct.pack('>BI', 0xdb, size)
+
+
+def int_bytes(value):
+    if 0 <= value < 0x80:
+        return bytes((value,))
+    if -32 <= value < 0:
+        return bytes((value & 0xff,))
+    if value >= 0:
+        if value < 0x100:
+            return bytes((0xcc, value))
+        if value < 0x10000:
+            return struct.pack('>BH', 0xcd, value)
+        if value < 0x100000000:
+            return struct.pack('>BI', 0xce, value)
+        return struct.pack('>BQ', 0xcf, value)
+    if value >= -0x80:
+        return struct.pack('>Bb', 0xd0, value)
+    if value >= -0x8000:
+        return struct.pack('>Bh', 0xd1, value)
+    if value >= -0x80000000:
+        return struct.pack('>Bi', 0xd2, value)
+    return struct.pack('>Bq', 0xd3, value)
+
+
+def container_header(size, fix, short, long):
+    if size < 16:
+        return bytes((fix | size,))
+    if size < 0x10000:
+        return struct.pack('>BH', short, size)
+    return struct.pack('>BI', long, size)
+
+
+# Payloads repeat the same keys and many of the same values (ids, dates,
+# prices, titles) on every row: each string and int is encoded once per
+# pack() and the bytes reused, written inline by the container loops to
+# save a call per value.
+def pack(value):
+    out = bytearray()
+    append, extend = out.append, out.extend
+    strings, ints = {}, {}
+
+    def encode_str(text):
+        data = text.encode()
+        encoded = strings[text] = str_header(len(data)) + data
+        return encoded
+
+    def encode_int(number):
+        encoded = ints[number] = int_bytes(number)
+        return encoded
+
+    def write(value):
+        kind = type(value)
+        if kind is str:
+            extend(strings.get(value) or encode_str(value))
+        elif value is None:
+            append(0xc0)
+        elif value is True:
+            append(0xc3)
+        elif value is False:
+            append(0xc2)
+        elif kind is int:
+            extend(ints.get(value) or encode_int(value))
+        elif isinstance(value, dict):
+            extend(container_header(len(value), 0x80, 0xde, 0xdf))
+            for key, item in value.items():
+                if type(key) is str:
+                    extend(strings.get(key) or encode_str(key))
+                else:
+                    write(key)
+                kind = type(item)
+                if kind is str:
+                    extend(strings.get(item) or encode_str(item))
+                elif kind is int:
+                    extend(ints.get(item) or encode_int(item))
+                else:
+                    write(item)
+        elif isinstance(value, (list, tuple)):
+            extend(container_header(len(value), 0x90, 0xdc, 0xdd))
+            for item in value:
+                kind = type(item)
+                if kind is str:
+                    extend(strings.get(item) or encode_str(item))
+                elif kind is int:
+                    extend(ints.get(item) or encode_int(item))
+                else:
+                    write(item)
+        elif kind is float:
+            extend(struct.pack('>Bd', 0xcb, value))
+        elif isinstance(value, (bytes, bytearray, memoryview)):
+            data = bytes(value)
+            size = len(data)
+            if size < 0x100:
+                extend(bytes((0xc4, size)))
+            elif size < 0x10000:
+                extend(struct.pack('>BH', 0xc5, size))
+            else:
+                extend(struct.pack('>BI', 0xc6, size))
+            extend(data)
+        # Subclasses: SafeString, IntEnum, ...
+        elif isinstance(value, str):
+            write(str(value))
+        elif isinstance(value, int):
+            write(int(value))
+        elif isinstance(value, float):
+            write(float(value))
+        else:
+            write(default(value))
+
+    write(value)
+    return bytes(out)
+
+
+# Fixed size formats: first byte -> (struct format, size)
+FIXED = {
+    0xca: ('>f', 4), 0xcb: ('>d', 8),
+    0xcc: ('>B', 1), 0xcd: ('>H', 2), 0xce: ('>I', 4), 0xcf: ('>Q', 8),
+    0xd0: ('>b', 1), 0xd1: ('>h', 2), 0xd2: ('>i', 4), 0xd3: ('>q', 8),
+}
+# Variable size formats: first byte -> (kind, struct format of the length)
+SIZED = {
+    0xc4: ('bin', '>B'), 0xc5: ('bin', '>H'), 0xc6: ('bin', '>I'),
+    0xd9: ('str', '>B'), 0xda: ('str', '>H'), 0xdb: ('str', '>I'),
+    0xdc: ('array', '>H'), 0xdd: ('array', '>I'),
+    0xde: ('map', '>H'), 0xdf: ('map', '>I'),
+}
+
+
+# Reverses pack. Raises ValueError on malformed input or extension types.
+def unpack(data):
+    data = memoryview(data)
+
+    def read(position, size):
+        end = position + size
+        if end > len(data):
+            raise ValueError("Truncated MessagePack data")
+        return data[position:end], end
+
+    def value_at(position):
+        (first,), position = read(position, 1)
+        if first < 0x80:
+            return first, position
+        if first >= 0xe0:
+            return first - 0x100, position
+        if 0xa0 <= first < 0xc0:
+            kind, size = 'str', first & 0x1f
+        elif first < 0x90:
+            kind, size = 'map', first & 0x0f
+        elif first < 0xa0:
+            kind, size = 'array', first & 0x0f
+        elif first == 0xc0:
+            return None, position
+        elif first in (0xc2, 0xc3):
+            return first == 0xc3, position
+        elif first in FIXED:
+            fmt, size = FIXED[first]
+            raw, position = read(position, size)
+            return struct.unpack(fmt, raw)[0], position
+        elif first in SIZED:
+            kind, fmt = SIZED[first]
+            raw, position = read(position, struct.calcsize(fmt))
+            size = struct.unpack(fmt, raw)[0]
+        else:
+            raise ValueError(f"Unsupported MessagePack type 0x{first:02x}")
+
+        if kind == 'str':
+            raw, position = read(position, size)
+            return str(raw, 'utf-8'), position
+        if kind == 'bin':
+            raw, position = read(position, size)
+            return bytes(raw), position
+        if kind == 'array':
+            items = []
+            for _ in range(size):
+                item, position = value_at(position)
+                items.append(item)
+            return items, position
+        items = {}
+        for _ in range(size):
+            key, position = value_at(position)
+            items[key], position = value_at(position)
+        return items, position
+
+    try:
+        value, position = value_at(0)
+    except (TypeError, UnicodeDecodeError, RecursionError) as exc:
+        raise ValueError(str(exc) or exc.__class__.__name__) from exc
+    if position != len(data):
+        raise ValueError("Extra data after the MessagePack value")
+    return value
+
+
+class MessagePackRenderer(renderers.BaseRenderer):
+    # Accept: application/msgpack (or ?format=msgpack). The JSON payloads
+    # without the quoting and delimiters, then compressed like the JSON.
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return compress_response(pack(data), self, renderer_context)
+
+
+class MessagePackParser(BaseParser):
+    # Request bodies in MessagePack, for clients that send what they receive
+    media_type = 'application/msgpack'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return unpack(stream.read())
+        except ValueError as exc:
+            raise ParseError(f"MessagePack parse error - {exc}")
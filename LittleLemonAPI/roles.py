@@ -0,0 +1,61 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+MANAGER = 'Manager'
+CUSTOMER = 'customer'
+DELIVERY_CREW = 'Delivery crew'
+
+ROLES_GENERATION_KEY = 'littlelemon:roles:generation'
+
+
+#------------------------------------------------------------
+# Role resolution
+#------------------------------------------------------------
+# A user's group names are loaded at most once per request (memoised on the
+# user object) and cached across requests per user (when ROLES_CACHE_TIMEOUT
+# isn't 0, see settings). Changing a user's groups
+# drops that user's entry; renaming, deleting or clearing a whole group bumps
+# a generation that is part of every key, invalidating all users at once. The
+# generation starts from a timestamp so an evicted one never comes back.
+def get_user_roles(user):
+    if not user or not user.is_authenticated:
+        return frozenset()
+    roles = getattr(user, '_littlelemon_roles', None)
+    if roles is None:
+        if not settings.ROLES_CACHE_TIMEOUT:
+            roles = frozenset(user.groups.values_list('name', flat=True))
+        else:
+            key = roles_cache_key(user.pk)
+            roles = cache.get(key)
+            if roles is None:
+                roles = frozenset(user.groups.values_list('name', flat=True))
+                cache.set(key, roles, timeout=settings.ROLES_CACHE_TIMEOUT)
+        user._littlelemon_roles = roles
+    return roles
+
+
+# True if the user belongs to any of the given groups
+def has_role(user, *roles):
+    return not get_user_roles(user).isdisjoint(roles)
+
+
+def roles_cache_key(user_pk):
+    generation = cache.get(ROLES_GENERATION_KEY)
+    if generation is None:
+        generation = time.time_ns()
+        if not cache.add(ROLES_GENERATION_KEY, generation, timeout=None):
+            generation = cache.get(ROLES_GENERATION_KEY, generation)
+    return f'littlelemon:roles:{generation}:{user_pk}'
+
+
+def invalidate_user_roles(user_pk):
+    cache.delete(roles_cache_key(user_pk))
+
+
+def invalidate_all_roles():
+    try:
+        cache.incr(ROLES_GENERATION_KEY)
+    except ValueError:
+        cache.set(ROLES_GENERATION_KEY, time.time_ns(), timeout=None)
@@ -0,0 +1,330 @@
+import bisect
+import heapq
+import logging
+import re
+import threading
+import unicodedata
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+from django.utils.module_loading import import_string
+
+from .cache import get_menu_version
+from .models import Category, MenuItem
+
+SEARCH_TABLE = 'LittleLemonAPI_menuitem_search'
+
+# Title matches outrank category matches
+TITLE_WEIGHT = 10.0
+CATEGORY_WEIGHT = 2.0
+
+TOKEN_RE = re.compile(r'[^\W_]+')
+
+logger = logging.getLogger(__name__)
+
+
+#------------------------------------------------------------
+# Queries
+#------------------------------------------------------------
+# Same rules as FTS5's unicode61 tokenizer with remove_diacritics 2: runs of
+# letters and digits, lowercased, without accents
+def tokenize(text):
+    text = unicodedata.normalize('NFKD', text.lower())
+    return TOKEN_RE.findall(''.join(char for char in text if not unicodedata.combining(char)))
+
+
+# [(term, prefix), ...]: every word must match, as a prefix when it has at
+# least SEARCH_MIN_PREFIX characters (shorter ones would match most of the
+# menu) and as a whole word otherwise
+def parse_query(query):
+    terms = []
+    for term in tokenize(query):
+        if term not in [existing for existing, _ in terms]:
+            terms.append((term, len(term) >= settings.SEARCH_MIN_PREFIX))
+    return terms
+
+
+# (id, title, category title) of the given menu items
+def menu_rows(ids=None):
+    rows = MenuItem.objects.values_list('pk', 'title', 'category__title')
+    if ids is None:
+        return rows.iterator(chunk_size=5000)
+    return rows.filter(pk__in=ids)
+
+
+def chunked(ids, size=500):
+    ids = list(ids)
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+
+#------------------------------------------------------------
+# Indexes
+#------------------------------------------------------------
+# An index maps a query to menu item ids, best match first:
+# search(query, limit), index_items(ids) after items were added or changed,
+# remove_items(ids) after they were deleted, and rebuild() after bulk writes,
+# which skip the signals that keep it current.
+
+class FTS5Index:
+    # The FTS5 table from migration 0010, ranked by bm25 over every match.
+    # It lives in the menu's database, so its updates commit or roll back
+    # with the change they follow. bm25 is most of a query's cost: one or two
+    # letter type-ahead on a large menu ranks tens of thousands of rows (20
+    # to 40 ms at 100k items, see bench_search), paid once per query and
+    # menu version as the search endpoint caches its responses. Setting
+    # SEARCH_CANDIDATES bounds it instead, ranking only the newest matches:
+    # faster, but an older better match can be missed.
+    def __init__(self, using=DEFAULT_DB_ALIAS):
+        self.using = using
+
+    def search(self, query, limit):
+        terms = parse_query(query)
+        if not terms:
+            return []
+        match = ' '.join('"%s"%s' % (term, '*' if prefix else '') for term, prefix in terms)
+        ranked = f'SELECT rowid, bm25({SEARCH_TABLE}, %s, %s) AS score FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s'
+        params = [TITLE_WEIGHT, CATEGORY_WEIGHT, match]
+        if settings.SEARCH_CANDIDATES:
+            ranked += ' ORDER BY rowid DESC LIMIT %s'
+            params.append(settings.SEARCH_CANDIDATES)
+        with connections[self.using].cursor() as cursor:
+            cursor.execute(f'SELECT rowid FROM ({ranked}) ORDER BY score, rowid DESC LIMIT %s', params + [limit])
+            return [row[0] for row in cursor.fetchall()]
+
+    def index_items(self, ids):
+        for chunk in chunked(ids):
+            self.remove_items(chunk)
+            rows = list(menu_rows(chunk).using(self.using))
+            with connections[self.using].cursor() as cursor:
+                cursor.executemany(f'INSERT INTO {SEARCH_TABLE} (rowid, title, category) VALUES (%s, %s, %s)', rows)
+
+    def remove_items(self, ids):
+        for chunk in chunked(ids):
+            with connections[self.using].cursor() as cursor:
+                placeholders = ', '.join(['%s'] * len(chunk))
+                cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE rowid IN ({placeholders})', chunk)
+
+    def rebuild(self):
+        with transaction.atomic(using=self.using), connections[self.using].cursor() as cursor:
+            cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+            cursor.execute(
+                f'INSERT INTO {SEARCH_TABLE} (rowid, title, category) '
+                f'SELECT item.id, item.title, category.title FROM {MenuItem._meta.db_table} item '
+                f'JOIN {Category._meta.db_table} category ON category.id = item.category_id'
+            )
+            count = cursor.rowcount
+            # Merges the index segments written so far into one
+            cursor.execute(f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}) VALUES ('optimize')")
+        return count
+
+
+class MemoryIndex:
+    # Inverted index in this process, for databases without FTS5. Scores are
+    # the weight of the field a word is in times the share of the word typed,
+    # so 'chi' ranks 'chips' before 'chimichanga'; ties go to the shorter
+    # title. Each token's postings are kept sorted by that order, so a one
+    # word query merges the postings of the tokens it is a prefix of and
+    # stops after `limit` items, however many match. Longer queries only
+    # score the items every word matches.
+    #
+    # Loaded from the database on first use and updated by the signals once
+    # the change commits. Changes made by other workers reach it through the
+    # menu version (shared when the cache is): when the version moves on
+    # without this process, the index is loaded again in a background
+    # thread, and searches keep using the current one until it is swapped.
+    def __init__(self):
+        self.lock = threading.RLock()
+        # token -> [(-weight, title length, item id), ...], best first. The
+        # rank is part of each entry so plain bisect keeps them sorted.
+        self.postings = {}
+        # sorted tokens, for prefix lookups
+        self.vocabulary = []
+        # item id -> ({token: weight}, title length)
+        self.documents = {}
+        self.version = None
+        # One rebuild at a time; the changes committed while it loads, to
+        # apply again to what it loaded
+        self.rebuild_lock = threading.Lock()
+        self.pending = None
+        self.refreshing = False
+
+    def search(self, query, limit):
+        terms = parse_query(query)
+        if not terms:
+            return []
+        # Only the first load makes a search wait
+        if self.version is None:
+            self.rebuild()
+        with self.lock:
+            self.sync()
+            expansions = [self.expand(term, prefix) for term, prefix in terms]
+            if not all(expansions):
+                return []
+            if len(terms) == 1:
+                return self.top(terms[0][0], expansions[0], limit)
+            candidates = None
+            for tokens in sorted(expansions, key=lambda tokens: sum(len(self.postings[token]) for token in tokens)):
+                matches = {entry[2] for token in tokens for entry in self.postings[token]}
+                candidates = matches if candidates is None else candidates & matches
+                if not candidates:
+                    return []
+            scored = []
+            for item_id in candidates:
+                weights, length = self.documents[item_id]
+                total = 0
+                for term, prefix in terms:
+                    score = max(
+                        (weight * len(term) / len(token) for token, weight in weights.items()
+                         if token == term or (prefix and token.startswith(term))),
+                        default=0,
+                    )
+                    if not score:
+                        break
+                    total += score
+                else:
+                    scored.append((-total, length, item_id))
+            return [item_id for _, _, item_id in heapq.nsmallest(limit, scored)]
+
+    def top(self, term, tokens, limit):
+        def ranked(token):
+            closeness = len(term) / len(token)
+            for weight, length, item_id in self.postings[token]:
+                yield weight * closeness, length, item_id
+
+        results, seen = [], set()
+        for _, _, item_id in heapq.merge(*[ranked(token) for token in tokens]):
+            if item_id not in seen:
+                seen.add(item_id)
+                results.append(item_id)
+                if len(results) == limit:
+                    break
+        return results
+
+    def expand(self, term, prefix):
+        if not prefix:
+            return [term] if term in self.postings else []
+        start = bisect.bisect_left(self.vocabulary, term)
+        end = bisect.bisect_left(self.vocabulary, term + '\U0010ffff', start)
+        return self.vocabulary[start:end]
+
+    def index_items(self, ids):
+        ids = list(ids)
+        transaction.on_commit(lambda: self.apply(ids, menu_rows(ids)))
+
+    def remove_items(self, ids):
+        ids = list(ids)
+        transaction.on_commit(lambda: self.apply(ids, []))
+
+    def apply(self, ids, rows):
+        rows = list(rows)
+        with self.lock:
+            if self.pending is not None:
+                self.pending.append((ids, rows))
+            elif self.version is None:
+                return
+            self.update(ids, rows)
+            self.version = get_menu_version()
+
+    def update(self, ids, rows):
+        for item_id in ids:
+            self.discard(item_id)
+        for row in rows:
+            self.add(*row)
+
+    # Loads the menu into a new index, without holding the lock searches
+    # take, then swaps it in
+    def rebuild(self):
+        with self.rebuild_lock:
+            with self.lock:
+                version = get_menu_version()
+                self.pending = []
+            loaded = MemoryIndex()
+            try:
+                for row in menu_rows():
+                    loaded.add(*row, sort=False)
+                for postings in loaded.postings.values():
+                    postings.sort()
+                loaded.vocabulary = sorted(loaded.postings)
+            except BaseException:
+                with self.lock:
+                    self.pending = None
+                raise
+            with self.lock:
+                self.postings, self.vocabulary, self.documents = loaded.postings, loaded.vocabulary, loaded.documents
+                # Changes that committed while loading may not have been read
+                for ids, rows in self.pending:
+                    self.update(ids, rows)
+                self.pending = None
+                self.version = version
+            return len(loaded.documents)
+
+    # Runs in its own thread, see sync
+    def refresh(self):
+        try:
+            self.rebuild()
+        except Exception:
+            logger.exception("Reloading the menu search index failed")
+        finally:
+            self.refreshing = False
+            connection.close()
+
+    def sync(self):
+        if not self.refreshing and self.version != get_menu_version():
+            self.refreshing = True
+            threading.Thread(target=self.refresh, daemon=True).start()
+
+    def add(self, item_id, title, category, sort=True):
+        weights = dict.fromkeys(tokenize(title), TITLE_WEIGHT)
+        for token in tokenize(category):
+            weights[token] = weights.get(token, 0) + CATEGORY_WEIGHT
+        self.documents[item_id] = (weights, len(title))
+        for token, weight in weights.items():
+            postings = self.postings.get(token)
+            if postings is None:
+                postings = self.postings[token] = []
+                if sort:
+                    bisect.insort(self.vocabulary, token)
+            entry = (-weight, len(title), item_id)
+            if sort:
+                bisect.insort(postings, entry)
+            else:
+                postings.append(entry)
+
+    def discard(self, item_id):
+        if item_id not in self.documents:
+            return
+        weights, length = self.documents[item_id]
+        for token, weight in weights.items():
+            postings = self.postings[token]
+            del postings[bisect.bisect_left(postings, (-weight, length, item_id))]
+            if not postings:
+                del self.postings[token]
+                del self.vocabulary[bisect.bisect_left(self.vocabulary, token)]
+        del self.documents[item_id]
+
+
+def fts5_available(using=DEFAULT_DB_ALIAS):
+    connection = connections[using]
+    return connection.vendor == 'sqlite' and SEARCH_TABLE in connection.introspection.table_names()
+
+
+# FTS5 when migration 0010 could create its table, the in-memory index
+# otherwise
+def auto_index():
+    return FTS5Index() if fts5_available() else MemoryIndex()
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+# The index configured in settings.SEARCH_BACKEND, created on first use
+def get_search_index():
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                backend = import_string(settings.SEARCH_BACKEND)
+                _index = backend(**settings.SEARCH_OPTIONS)
+    return _index
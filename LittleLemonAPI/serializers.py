@@ -1,42 +1,299 @@
 from rest_framework import serializers
-from .models import MenuItem, Cart, Order, OrderItem
+from .models import Category, MenuItem, Cart, Order, OrderItem, DailyRevenue
 from django.contrib.auth.models import User
+from django.conf import settings
+
+
+def split_param(value):
+    return [part.strip() for part in value.split(',') if part.strip()] if value else []
+
+
+# ['menuitem', 'menuitem.category', 'user'] -> {'menuitem': ['category'], 'user': []}
+def expansion_tree(paths):
+    tree = {}
+    for path in paths:
+        name, _, rest = path.partition('.')
+        nested = tree.setdefault(name, [])
+        if rest:
+            nested.append(rest)
+    return tree
+
+
+class EagerLoadingMixin:
+    # Query plan declared by each serializer so list endpoints fetch every
+    # nested relation up front instead of issuing one query per row.
+    # only_fields are the serializer's own columns; relations expanded with
+    # ?expand= are joined in along with their own serializer's columns.
+    select_related_fields = ()
+    prefetch_related_fields = ()
+    only_fields = ()
+    # Relations that ?expand= can replace with the nested object, by field
+    expandable_fields = {}
+
+    @classmethod
+    def get_expansions(cls, paths):
+        tree = expansion_tree(paths)
+        unknown = set(tree) - set(cls.expandable_fields)
+        if unknown:
+            raise serializers.ValidationError({'expand': [
+                f"Unknown relation: {', '.join(sorted(unknown))}. "
+                f"Expandable: {', '.join(cls.expandable_fields) or 'none'}."
+            ]})
+        return tree
+
+    @classmethod
+    def requested_expansions(cls, request):
+        if request is None:
+            return {}
+        return cls.get_expansions(split_param(request.query_params.get('expand')))
+
+    @classmethod
+    def query_plan(cls, expansions, prefix=''):
+        select = [prefix + field for field in cls.select_related_fields]
+        only = [prefix + field for field in cls.only_fields]
+        for name, nested in expansions.items():
+            serializer_class = cls.expandable_fields[name]
+            nested_select, nested_only = serializer_class.query_plan(serializer_class.get_expansions(nested), f'{prefix}{name}__')
+            select += [prefix + name] + nested_select
+            only += nested_only
+        return select, only
+
+    @classmethod
+    def setup_eager_loading(cls, queryset, request=None):
+        select, only = cls.query_plan(cls.requested_expansions(request))
+        if select:
+            queryset = queryset.select_related(*select)
+        if cls.prefetch_related_fields:
+            queryset = queryset.prefetch_related(*cls.prefetch_related_fields)
+        if only:
+            queryset = queryset.only(*only)
+        return queryset
+
+
+class FieldSelectionMixin(EagerLoadingMixin):
+    # Related objects are represented by their id. ?fields=id,title keeps only
+    # the listed fields and ?expand=menuitem,menuitem.category replaces ids
+    # with the nested objects. Both are read from the request in the context,
+    # or passed as fields= and expand= (nested serializers get theirs so).
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is not None:
+            if fields is None:
+                fields = split_param(request.query_params.get('fields'))
+            if expand is None:
+                expand = split_param(request.query_params.get('expand'))
+        for name, nested in self.get_expansions(expand or ()).items():
+            self.fields[name] = self.expandable_fields[name](read_only=True, expand=nested)
+        if fields:
+            unknown = set(fields) - set(self.fields)
+            if unknown:
+                raise serializers.ValidationError({'fields': [
+                    f"Unknown field: {', '.join(sorted(unknown))}. Available: {', '.join(self.fields)}."
+                ]})
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    #--------------------------------------------------------
+    # Fast read path
+    #--------------------------------------------------------
+    # For lists without ?expand=: rows are read with .values() and turned
+    # into dicts directly, without model instances or a serializer call per
+    # row. Only the fields whose output differs from the database value
+    # (decimals, dates) go through their serializer field, so the payload is
+    # the same as the serializer's.
+    PASSTHROUGH_FIELDS = (
+        serializers.BooleanField, serializers.CharField, serializers.IntegerField,
+        serializers.PrimaryKeyRelatedField,
+    )
+
+    # A queryset of dicts, or of model instances when ?expand= needs them;
+    # either can be paginated or filtered further and passed to read_data
+    @classmethod
+    def read_queryset(cls, queryset, request=None):
+        if cls.requested_expansions(request):
+            return cls.setup_eager_loading(queryset, request)
+        return queryset.values(*[field.source for field in cls().fields.values()])
+
+    # Turns one .values() row into the representation
+    @classmethod
+    def row_renderer(cls, request=None):
+        plan = [
+            (name, field.source, None if isinstance(field, cls.PASSTHROUGH_FIELDS) else field.to_representation)
+            for name, field in cls(context={'request': request}).fields.items()
+        ]
+
+        def render(row):
+            data = {}
+            for name, source, convert in plan:
+                value = row[source]
+                data[name] = value if convert is None or value is None else convert(value)
+            return data
+        return render
+
+    @classmethod
+    def read_data(cls, rows, request=None):
+        rows = list(rows)
+        if rows and not isinstance(rows[0], dict):
+            return cls(rows, many=True, context={'request': request}).data
+        render = cls.row_renderer(request)
+        return [render(row) for row in rows]
+
+
+class CategorySerializer(FieldSelectionMixin, serializers.ModelSerializer):
+    only_fields = ('id', 'slug', 'title')
 
-class MenuItemSerializer(serializers.ModelSerializer):
     class Meta:
-        model = MenuItem
-        fields = "__all__"
-        depth = 1
+        model = Category
+        fields = ['id', 'slug', 'title']
+
 
+class UserSerializer(FieldSelectionMixin, serializers.ModelSerializer):
+    only_fields = ('id', 'username')
 
-class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
-        fields = ['username']
+        fields = ['id', 'username']
 
 
-class CartSerializer(serializers.ModelSerializer):
-    user = UserSerializer(read_only=True)
-    menuitem = MenuItemSerializer(read_only=True)
+class MenuItemSerializer(FieldSelectionMixin, serializers.ModelSerializer):
+    only_fields = ('id', 'title', 'price', 'featured', 'category', 'updated_at')
+    expandable_fields = {'category': CategorySerializer}
+
+    class Meta:
+        model = MenuItem
+        fields = ['id', 'title', 'price', 'featured', 'category', 'updated_at']
+
+
+class CartSerializer(FieldSelectionMixin, serializers.ModelSerializer):
+    only_fields = ('id', 'user', 'menuitem', 'quantity', 'unit_price', 'price', 'updated_at')
+    expandable_fields = {'user': UserSerializer, 'menuitem': MenuItemSerializer}
+
     class Meta:
         model = Cart
-        fields = "__all__"
+        fields = ['id', 'user', 'menuitem', 'quantity', 'unit_price', 'price', 'updated_at']
+        read_only_fields = ['user', 'menuitem']
 
 
-class OrderSerializer(serializers.ModelSerializer):
-    user = UserSerializer(read_only=True)    
-    delivery_crew = UserSerializer(read_only=True) 
-    
+class OrderSerializer(FieldSelectionMixin, serializers.ModelSerializer):
+    only_fields = ('id', 'user', 'delivery_crew', 'status', 'total', 'date', 'updated_at')
+    expandable_fields = {'user': UserSerializer, 'delivery_crew': UserSerializer}
+
     class Meta:
         model = Order
-        fields = "__all__"
-    
-# data = OrderSerializer(User, many=True).data
+        fields = ['id', 'user', 'delivery_crew', 'status', 'total', 'date', 'updated_at']
+        read_only_fields = ['user', 'delivery_crew']
+
 
+class OrderItemSerializer(FieldSelectionMixin, serializers.ModelSerializer):
+    only_fields = ('id', 'order', 'menuitem', 'quantity', 'unit_price', 'price')
+    expandable_fields = {'order': OrderSerializer, 'menuitem': MenuItemSerializer}
 
-class OrderItemSerializer(serializers.ModelSerializer):
-    order = UserSerializer(read_only=True)    
-    menuitem = MenuItemSerializer(read_only=True) 
     class Meta:
         model = OrderItem
-        fields = "__all__"
\ No newline at end of file
+        fields = ['id', 'order', 'menuitem', 'quantity', 'unit_price', 'price']
+        read_only_fields = ['order', 'menuitem']
+
+
+# Payload of the bulk cart endpoints: {"items": [{"menuitem": 1, "quantity": 2}, ...]}
+class CartItemQuantitySerializer(serializers.Serializer):
+    menuitem = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=0, max_value=32767)
+
+
+class BulkCartSerializer(serializers.Serializer):
+    items = CartItemQuantitySerializer(many=True, allow_empty=False)
+
+    def validate_items(self, items):
+        quantities = {item['menuitem']: item['quantity'] for item in items}
+        if len(quantities) != len(items):
+            raise serializers.ValidationError("Each menu item can only appear once.")
+        # A quantity of 0 removes a line, which only updates allow
+        if not self.context.get('allow_zero') and 0 in quantities.values():
+            raise serializers.ValidationError("Quantities must be at least 1.")
+        return items
+
+    # {menuitem_id: quantity}
+    def get_quantities(self):
+        return {item['menuitem']: item['quantity'] for item in self.validated_data['items']}
+
+
+# Payload of the batch delivery endpoint: {"orders": [1, 2, ...]}
+class DeliverOrdersSerializer(serializers.Serializer):
+    orders = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False)
+
+    def validate_orders(self, orders):
+        if len(orders) > settings.DELIVERY_BATCH_SIZE:
+            raise serializers.ValidationError(f"At most {settings.DELIVERY_BATCH_SIZE} orders per request.")
+        return list(dict.fromkeys(orders))
+
+
+# Output of dispatch.crew_worklist
+class WorklistItemSerializer(serializers.Serializer):
+    menu_item = serializers.IntegerField()
+    title = serializers.CharField()
+    quantity = serializers.IntegerField()
+
+
+class WorklistOrderSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    user = serializers.IntegerField()
+    username = serializers.CharField()
+    total = serializers.DecimalField(max_digits=6, decimal_places=2)
+    date = serializers.DateField()
+    updated_at = serializers.DateTimeField()
+    items = WorklistItemSerializer(many=True)
+
+
+# Output of services.cart_summary and services.order_summary
+class CartCategorySummarySerializer(serializers.Serializer):
+    category = serializers.IntegerField()
+    slug = serializers.SlugField()
+    title = serializers.CharField()
+    lines = serializers.IntegerField()
+    items = serializers.IntegerField()
+    subtotal = serializers.DecimalField(max_digits=12, decimal_places=2)
+
+
+class CartSummarySerializer(serializers.Serializer):
+    lines = serializers.IntegerField()
+    items = serializers.IntegerField()
+    subtotal = serializers.DecimalField(max_digits=12, decimal_places=2)
+    categories = CartCategorySummarySerializer(many=True)
+
+
+class OrderTotalsSerializer(serializers.Serializer):
+    orders = serializers.IntegerField()
+    total = serializers.DecimalField(max_digits=12, decimal_places=2)
+
+
+class OrderDaySummarySerializer(OrderTotalsSerializer):
+    date = serializers.DateField()
+    by_status = serializers.DictField(child=OrderTotalsSerializer())
+
+
+class OrderSummarySerializer(OrderTotalsSerializer):
+    date_from = serializers.DateField()
+    date_to = serializers.DateField()
+    days = OrderDaySummarySerializer(many=True)
+
+
+# Sales analytics, read from the rollup tables
+class DailyRevenueSerializer(FieldSelectionMixin, serializers.ModelSerializer):
+    class Meta:
+        model = DailyRevenue
+        fields = ['date', 'orders', 'delivered_orders', 'revenue']
+
+
+class TopMenuItemSerializer(FieldSelectionMixin, serializers.Serializer):
+    menuitem = serializers.IntegerField(source='menuitem_id')
+    title = serializers.CharField(source='menuitem__title')
+    quantity = serializers.IntegerField(source='quantity_sold')
+    revenue = serializers.DecimalField(max_digits=12, decimal_places=2, source='revenue_total')
+
+
+class CrewThroughputSerializer(FieldSelectionMixin, serializers.Serializer):
+    delivery_crew = serializers.IntegerField(source='delivery_crew_id')
+    username = serializers.CharField(source='delivery_crew__username')
+    delivered = serializers.IntegerField(source='delivered_total')
+    revenue = serializers.DecimalField(max_digits=12, decimal_places=2, source='revenue_total')
@@ -0,0 +1,231 @@
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from .analytics import MONEY, record_order_items
+from .jobs import enqueue_many
+from .models import Cart, MenuItem, Order, OrderItem
+
+
+# Jobs enqueued for every new order, see tasks.py
+ORDER_PLACED_TASKS = ('send_order_receipt', 'print_kitchen_ticket')
+
+
+class EmptyCartError(Exception):
+    pass
+
+
+class CheckoutError(Exception):
+    pass
+
+
+class CartItemsError(Exception):
+    def __init__(self, message, ids):
+        super().__init__(f"{message}: {', '.join(str(id) for id in sorted(ids))}")
+        self.ids = ids
+
+
+# Largest amount a DecimalField of the model can hold, 9999.99 for
+# max_digits=6, decimal_places=2
+def max_amount(model, field_name):
+    field = model._meta.get_field(field_name)
+    return Decimal(10) ** (field.max_digits - field.decimal_places) - Decimal(10) ** -field.decimal_places
+
+
+# Lines whose price (unit price times quantity) the price column can't hold
+def check_line_prices(line_prices):
+    limit = max_amount(Cart, 'price')
+    too_large = {id for id, price in line_prices.items() if price > limit}
+    if too_large:
+        raise CartItemsError(f"Line totals above {limit}", too_large)
+
+
+#------------------------------------------------------------
+# Checkout
+#------------------------------------------------------------
+# Turns the user's cart into an Order in one transaction: one INSERT for the
+# order, one bulk INSERT for its items and one DELETE for the cart, whatever
+# the cart size. Passing the same idempotency key again returns the order
+# created the first time instead of placing a second one. The receipt and
+# kitchen ticket are left to the job queue (ORDER_PLACED_TASKS), enqueued in
+# the same transaction. Returns (order, created).
+def checkout(user, idempotency_key=None):
+    if idempotency_key:
+        existing = Order.objects.filter(user=user, idempotency_key=idempotency_key).first()
+        if existing is not None:
+            return existing, False
+
+    try:
+        with transaction.atomic():
+            cart_items = list(Cart.objects.select_for_update().filter(user=user))
+            if not cart_items:
+                raise EmptyCartError()
+
+            total = sum(item.price for item in cart_items)
+            limit = max_amount(Order, 'total')
+            if total > limit:
+                raise CheckoutError(f"Order total {total} is above {limit}, split the order.")
+            order = Order.objects.create(
+                user=user,
+                total=total,
+                date=timezone.localdate(),
+                idempotency_key=idempotency_key or None,
+            )
+            order_items = OrderItem.objects.bulk_create([
+                OrderItem(
+                    order=order,
+                    menuitem_id=item.menuitem_id,
+                    quantity=item.quantity,
+                    unit_price=item.unit_price,
+                    price=item.price,
+                )
+                for item in cart_items
+            ])
+            # bulk_create sends no signals, see analytics.py
+            record_order_items(order, order_items)
+            Cart.objects.filter(id__in=[item.id for item in cart_items]).delete()
+            enqueue_many([(name, {'order_id': order.id}) for name in ORDER_PLACED_TASKS])
+    except IntegrityError:
+        # A concurrent submit with the same key won the race
+        if idempotency_key:
+            existing = Order.objects.filter(user=user, idempotency_key=idempotency_key).first()
+            if existing is not None:
+                return existing, False
+        raise
+    return order, True
+
+
+#------------------------------------------------------------
+# Bulk cart changes
+#------------------------------------------------------------
+# Prices come from MenuItem.price, looked up for every line at once; what
+# the client sends as a price is never used
+def get_menu_prices(menuitem_ids):
+    prices = {id: item.price for id, item in MenuItem.objects.only('id', 'price').in_bulk(menuitem_ids).items()}
+    missing = set(menuitem_ids) - set(prices)
+    if missing:
+        raise CartItemsError("Unknown menu items", missing)
+    return prices
+
+
+# Adds the menu items in `quantities` ({menuitem_id: quantity}) to the cart,
+# or sets the quantity of the lines already there, in one INSERT ... ON
+# CONFLICT DO UPDATE on the (menuitem, user) unique constraint
+def upsert_cart_items(user, quantities):
+    with transaction.atomic():
+        prices = get_menu_prices(quantities)
+        check_line_prices({id: prices[id] * quantity for id, quantity in quantities.items()})
+        Cart.objects.bulk_create(
+            [
+                Cart(user=user, menuitem_id=id, quantity=quantity, unit_price=prices[id], price=prices[id] * quantity)
+                for id, quantity in quantities.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['menuitem', 'user'],
+            update_fields=['quantity', 'unit_price', 'price', 'updated_at'],
+        )
+
+
+# Changes the quantity of lines already in the cart; a quantity of 0 removes
+# the line. Unit prices are refreshed from the menu at the same time.
+def update_cart_quantities(user, quantities):
+    with transaction.atomic():
+        lines = list(
+            Cart.objects.select_for_update()
+            .filter(user=user, menuitem_id__in=quantities)
+            .only('id', 'menuitem_id', 'quantity', 'unit_price', 'price')
+        )
+        missing = set(quantities) - {line.menuitem_id for line in lines}
+        if missing:
+            raise CartItemsError("Not in the cart", missing)
+
+        removed = [line.id for line in lines if quantities[line.menuitem_id] == 0]
+        changed = [line for line in lines if quantities[line.menuitem_id] != 0]
+        if changed:
+            prices = get_menu_prices([line.menuitem_id for line in changed])
+            check_line_prices({line.menuitem_id: prices[line.menuitem_id] * quantities[line.menuitem_id] for line in changed})
+            # bulk_update doesn't touch auto_now fields
+            now = timezone.now()
+            for line in changed:
+                line.quantity = quantities[line.menuitem_id]
+                line.unit_price = prices[line.menuitem_id]
+                line.price = line.unit_price * line.quantity
+                line.updated_at = now
+            Cart.objects.bulk_update(changed, ['quantity', 'unit_price', 'price', 'updated_at'])
+        if removed:
+            Cart.objects.filter(id__in=removed).delete()
+
+
+# Empties the cart with a single DELETE; returns the number of lines removed
+def clear_cart(user):
+    return Cart.objects.filter(user=user).delete()[0]
+
+
+#------------------------------------------------------------
+# Summaries
+#------------------------------------------------------------
+# Line count, item count and subtotal of the user's cart, with the same
+# figures per category, from one GROUP BY query over the cart lines. Only the
+# aggregates leave the database, never the rows.
+def cart_summary_queryset(user):
+    return (
+        Cart.objects.filter(user=user)
+        .values('menuitem__category_id', 'menuitem__category__slug', 'menuitem__category__title')
+        .annotate(lines=Count('id'), items=Sum('quantity'), subtotal=Sum('price', output_field=MONEY))
+        .order_by('menuitem__category__title')
+    )
+
+
+def cart_summary(user):
+    categories = [
+        {
+            'category': row['menuitem__category_id'],
+            'slug': row['menuitem__category__slug'],
+            'title': row['menuitem__category__title'],
+            'lines': row['lines'],
+            'items': row['items'],
+            'subtotal': row['subtotal'],
+        }
+        for row in cart_summary_queryset(user)
+    ]
+    return {
+        'lines': sum(row['lines'] for row in categories),
+        'items': sum(row['items'] for row in categories),
+        'subtotal': sum((row['subtotal'] for row in categories), Decimal('0.00')),
+        'categories': categories,
+    }
+
+
+# Order count and total per day and status for the orders in `queryset`
+# between date_from and date_to (inclusive), newest day first. The date range
+# is applied before grouping so only that window's rows are read.
+def order_summary_queryset(queryset, date_from=None, date_to=None):
+    if date_from is not None:
+        queryset = queryset.filter(date__gte=date_from)
+    if date_to is not None:
+        queryset = queryset.filter(date__lte=date_to)
+    return (
+        queryset.values('date', 'status')
+        .annotate(orders=Count('id'), total=Sum('total', output_field=MONEY))
+        .order_by('-date', 'status')
+    )
+
+
+def order_summary(queryset, date_from, date_to):
+    days = []
+    for row in order_summary_queryset(queryset, date_from, date_to):
+        if not days or days[-1]['date'] != row['date']:
+            days.append({'date': row['date'], 'orders': 0, 'total': Decimal('0.00'), 'by_status': {}})
+        day = days[-1]
+        day['orders'] += row['orders']
+        day['total'] += row['total']
+        day['by_status']['delivered' if row['status'] else 'pending'] = {'orders': row['orders'], 'total': row['total']}
+    return {
+        'date_from': date_from,
+        'date_to': date_to,
+        'orders': sum(day['orders'] for day in days),
+        'total': sum((day['total'] for day in days), Decimal('0.00')),
+        'days': days,
+    }
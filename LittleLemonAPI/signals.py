@@ -0,0 +1,127 @@
+from django.contrib.auth.models import Group, User
+from django.db.backends.signals import connection_created
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .analytics import ORDER_STATE_FIELDS, order_state, record_order_change, record_order_deleted
+from .authentication import invalidate_token, invalidate_user
+from .cache import bump_menu_version
+from .events import publish_order_change
+from .metrics import record_query
+from .models import Category, MenuItem, Order
+from .roles import invalidate_all_roles, invalidate_user_roles
+from .search import get_search_index
+
+
+# Any change to the menu invalidates the cached menu payloads
+@receiver(post_save, sender=MenuItem)
+@receiver(post_delete, sender=MenuItem)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_menu_cache(sender, **kwargs):
+    bump_menu_version()
+
+
+# Keeps the menu search index current, see search.py. Bulk writes and
+# fixtures skip these, run rebuild_search_index after them.
+@receiver(post_save, sender=MenuItem)
+def index_menu_item(sender, instance, raw=False, **kwargs):
+    if not raw:
+        get_search_index().index_items([instance.pk])
+
+
+@receiver(post_delete, sender=MenuItem)
+def unindex_menu_item(sender, instance, **kwargs):
+    get_search_index().remove_items([instance.pk])
+
+
+# Items are found by their category's title too
+@receiver(post_save, sender=Category)
+def reindex_category_items(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        get_search_index().index_items(MenuItem.objects.filter(category=instance).values_list('pk', flat=True))
+
+
+# Group membership changes invalidate the cached roles of the affected users
+@receiver(m2m_changed, sender=User.groups.through)
+def invalidate_roles_on_membership_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if isinstance(instance, User):
+        instance.__dict__.pop('_littlelemon_roles', None)
+        invalidate_user_roles(instance.pk)
+    elif pk_set:
+        for user_pk in pk_set:
+            invalidate_user_roles(user_pk)
+    else:
+        # group.user_set.clear() doesn't say which users were affected
+        invalidate_all_roles()
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_roles_on_group_change(sender, **kwargs):
+    invalidate_all_roles()
+
+
+# Logging out through djoser deletes the token, which must stop working at once
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    invalidate_token(instance.key)
+
+
+# Token authentication caches a snapshot of the user, see authentication.py
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    invalidate_user(instance.pk)
+
+
+# An order's stored state, read before a save. Both post_save receivers
+# below compare it with the saved order: the sales rollups take the old
+# state back out, the order events only fire when the status or delivery
+# crew changed. One receiver reads it for both, so neither depends on the
+# other being registered or running first.
+@receiver(pre_save, sender=Order)
+def remember_order_state(sender, instance, raw=False, **kwargs):
+    if raw or instance._state.adding or instance.pk is None:
+        instance._stored_state = None
+        return
+    instance._stored_state = Order.objects.filter(pk=instance.pk).values(*ORDER_STATE_FIELDS).first()
+
+
+# Sales rollups follow every order save and delete, see analytics.py
+@receiver(post_save, sender=Order)
+def update_rollups_on_order_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    record_order_change(getattr(instance, '_stored_state', None), order_state(instance), order_id=instance.pk)
+
+
+# Status and delivery crew changes are pushed to the order's customer and
+# crew over the event stream, see events.py and sse.py
+@receiver(post_save, sender=Order)
+def publish_order_status(sender, instance, raw=False, **kwargs):
+    before = getattr(instance, '_stored_state', None)
+    if raw or before is None:
+        return
+    if before['status'] == instance.status and before['delivery_crew_id'] == instance.delivery_crew_id:
+        return
+    previous_crew_id = before['delivery_crew_id']
+    publish_order_change(
+        instance.pk, instance.user_id, instance.status, instance.delivery_crew_id,
+        previous_crew_id if previous_crew_id != instance.delivery_crew_id else None,
+    )
+
+
+@receiver(pre_delete, sender=Order)
+def update_rollups_on_order_delete(sender, instance, **kwargs):
+    record_order_deleted(instance)
+
+
+# Per-request DB metrics, see PerformanceMiddleware
+@receiver(connection_created)
+def instrument_connection(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
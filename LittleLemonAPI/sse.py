@@ -0,0 +1,129 @@
+import asyncio
+import json
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from rest_framework import exceptions
+
+from .authentication import CachedTokenAuthentication
+from .events import get_broker, user_channel
+
+
+# Order status push over Server-Sent Events, mounted by core.asgi at
+# ORDER_EVENTS_PATH. Each client keeps one connection open and receives the
+# changes to its own orders (customers) or to the orders assigned to it
+# (delivery crew) instead of polling the order endpoints. Django 4.1 can't
+# stream from an async iterator, so this is a plain ASGI app.
+
+ORDER_EVENTS_PATH = '/api/async/orders/events'
+
+
+#------------------------------------------------------------
+# Authentication
+#------------------------------------------------------------
+# The usual "Authorization: Token <key>" header, or ?token=<key> for browsers'
+# EventSource, which can't set headers. Returns the user or None.
+def get_token(scope):
+    for name, value in scope.get('headers', []):
+        if name == b'authorization':
+            parts = value.decode('latin-1').split()
+            if len(parts) == 2 and parts[0].lower() == 'token':
+                return parts[1]
+            return None
+    tokens = parse_qs(scope.get('query_string', b'').decode('latin-1')).get('token')
+    return tokens[0] if tokens else None
+
+
+async def authenticate(scope):
+    key = get_token(scope)
+    if not key:
+        return None
+    try:
+        user, _ = await sync_to_async(CachedTokenAuthentication().authenticate_credentials)(key)
+    except exceptions.AuthenticationFailed:
+        return None
+    return user
+
+
+#------------------------------------------------------------
+# Event stream
+#------------------------------------------------------------
+def format_event(event):
+    return f"event: {event['type']}\nid: {event['id']}\ndata: {json.dumps(event)}\n\n".encode()
+
+
+async def send_error(send, status, detail):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json')],
+    })
+    await send({'type': 'http.response.body', 'body': json.dumps({'detail': detail}).encode()})
+
+
+async def order_events(scope, receive, send):
+    if scope['method'] not in ('GET', 'HEAD'):
+        return await send_error(send, 405, f"Method \"{scope['method']}\" not allowed.")
+    user = await authenticate(scope)
+    if user is None:
+        return await send_error(send, 401, 'Authentication credentials were not provided.')
+
+    subscription = await get_broker().subscribe(user_channel(user.pk))
+    try:
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream'),
+                (b'cache-control', b'no-store'),
+                # Stops nginx from buffering the stream
+                (b'x-accel-buffering', b'no'),
+            ],
+        })
+        if scope['method'] == 'HEAD':
+            return await send({'type': 'http.response.body', 'body': b''})
+        await send({
+            'type': 'http.response.body',
+            'body': f'retry: {settings.SSE_RETRY}\n\n'.encode() + b'event: ready\ndata: {}\n\n',
+            'more_body': True,
+        })
+
+        disconnected = asyncio.ensure_future(wait_for_disconnect(receive))
+        try:
+            while True:
+                next_event = asyncio.ensure_future(subscription.get())
+                done, _ = await asyncio.wait(
+                    {next_event, disconnected}, timeout=settings.SSE_HEARTBEAT,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                if disconnected in done:
+                    next_event.cancel()
+                    break
+                if next_event in done:
+                    body = format_event(next_event.result())
+                else:
+                    next_event.cancel()
+                    body = b': keep-alive\n\n'
+                await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+        finally:
+            disconnected.cancel()
+    finally:
+        await subscription.close()
+
+
+async def wait_for_disconnect(receive):
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return
+
+
+# Routes ORDER_EVENTS_PATH to the event stream and everything else to the
+# Django application
+def with_order_events(application):
+    async def app(scope, receive, send):
+        if scope['type'] == 'http' and scope['path'] == ORDER_EVENTS_PATH:
+            return await order_events(scope, receive, send)
+        return await application(scope, receive, send)
+    return app
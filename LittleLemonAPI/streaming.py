@@ -0,0 +1,67 @@
+from django.db.models.query import ValuesIterable
+from django.http import StreamingHttpResponse
+from rest_framework.exceptions import ValidationError
+from rest_framework.utils.encoders import JSONEncoder
+
+STREAM_FORMATS = {
+    'json': 'application/json',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+#------------------------------------------------------------
+# Streaming exports
+#------------------------------------------------------------
+# ?stream=1 (or json) streams a JSON array, ?stream=ndjson one object per
+# line. Returns None when the request didn't ask for a stream.
+def get_stream_format(request):
+    value = request.query_params.get('stream')
+    if not value or value.lower() in ('0', 'false'):
+        return None
+    if value.lower() in ('1', 'true'):
+        return 'json'
+    if value not in STREAM_FORMATS:
+        raise ValidationError({'stream': f"Must be one of: 1, {', '.join(STREAM_FORMATS)}."})
+    return value
+
+
+# Serializes the queryset row by row while it's being sent, reading it from
+# the database chunk_size rows at a time, so memory use stays flat however
+# many rows there are. Takes model instances or, from the serializer's
+# read_queryset, .values() dicts.
+def stream_queryset(queryset, serializer_class, stream_format='json', request=None, chunk_size=2000, rows_per_write=200):
+    encoder = JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+    if issubclass(queryset._iterable_class, ValuesIterable):
+        render = serializer_class.row_renderer(request)
+    else:
+        render = serializer_class(context={'request': request}).to_representation
+
+    def rows():
+        for obj in queryset.iterator(chunk_size=chunk_size):
+            yield encoder.encode(render(obj))
+
+    def json_array():
+        yield '['
+        buffer = []
+        separator = ''
+        for row in rows():
+            buffer.append(separator + row)
+            separator = ','
+            if len(buffer) >= rows_per_write:
+                yield ''.join(buffer)
+                buffer = []
+        buffer.append(']')
+        yield ''.join(buffer)
+
+    def ndjson():
+        buffer = []
+        for row in rows():
+            buffer.append(row + '\n')
+            if len(buffer) >= rows_per_write:
+                yield ''.join(buffer)
+                buffer = []
+        if buffer:
+            yield ''.join(buffer)
+
+    content = json_array() if stream_format == 'json' else ndjson()
+    return StreamingHttpResponse(content, content_type=STREAM_FORMATS[stream_format])
@@ -0,0 +1,40 @@
+import logging
+
+from django.conf import settings
+from django.core.mail import send_mail
+
+from .jobs import task
+from .models import Order
+
+kitchen_logger = logging.getLogger('LittleLemonAPI.kitchen')
+
+
+#------------------------------------------------------------
+# Order placement
+#------------------------------------------------------------
+# Enqueued by checkout in the order's transaction, run by the run_jobs
+# workers once it commits. An order deleted meanwhile is skipped.
+
+def order_lines(order):
+    return [f"{item.quantity} x {item.menuitem.title}" for item in order.items.select_related('menuitem').order_by('id')]
+
+
+@task('send_order_receipt')
+def send_order_receipt(order_id):
+    order = Order.objects.select_related('user').filter(id=order_id).first()
+    if order is None or not order.user.email:
+        return
+    send_mail(
+        f"Your Little Lemon order #{order.id}",
+        "\n".join(order_lines(order) + [f"Total: {order.total}"]),
+        settings.DEFAULT_FROM_EMAIL,
+        [order.user.email],
+    )
+
+
+@task('print_kitchen_ticket')
+def print_kitchen_ticket(order_id):
+    order = Order.objects.filter(id=order_id).first()
+    if order is None:
+        return
+    kitchen_logger.info("Order #%s\n%s", order.id, "\n".join(order_lines(order)))
@@ -1,3 +1,1770 @@
-from django.test import TestCase
+import asyncio
+import base64
+import gzip
+import io
+import json
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import Group, Permission, User
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models.signals import post_save
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from .dispatch import crew_worklist, dispatch_all, dispatch_batch, mark_delivered, pending_orders
+from .authentication import CachedTokenAuthentication, token_cache_key, user_cache_key
+from .benchmarks import BENCHMARK_PASSWORD, seed_benchmark_data
+from .cache import get_menu_version
+from .events import get_broker, user_channel
+from .jobs import claim_jobs, enqueue, task, work
+from .management.commands.bench_endpoints import find_regressions
+from .menu_io import import_categories, import_menu_items, iter_json_array, read_rows
+from .models import Cart, Category, DailyCrewDeliveries, DailyItemSales, DailyRevenue, Job, MenuItem, Order, OrderItem
+from .metrics import Histogram, registry
+from .permissions import IsCustomer, IsDeliveryCrew, IsManager
+from .renderers import COMPRESSORS, FastJSONRenderer, choose_encoding, pack, unpack
+from .roles import has_role
+from .search import FTS5Index, MemoryIndex, fts5_available, get_search_index, menu_rows
+from .serializers import CartSerializer, MenuItemSerializer, OrderItemSerializer, OrderSerializer, UserSerializer
+from .signals import update_rollups_on_order_save
+from .sse import ORDER_EVENTS_PATH, with_order_events
+from .throttling import LocalMemoryStore, get_store, hit
+
+
+class MenuItemListTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('viewer', password='network123')
+        cls.user.user_permissions.add(Permission.objects.get(codename='view_menuitem'))
+        cls.mains = Category.objects.create(slug='mains', title='Mains')
+        cls.desserts = Category.objects.create(slug='desserts', title='Desserts')
+        for i in range(12):
+            MenuItem.objects.create(
+                title=f'Dish {i:02d}',
+                price=Decimal(5 + i % 4),
+                featured=i % 3 == 0,
+                category=cls.mains if i % 2 else cls.desserts,
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def collect(self, url):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids.extend(item['id'] for item in response.data['results'])
+            url = response.data['next']
+        return ids
+
+    def test_requires_view_permission(self):
+        other = User.objects.create_user('other', password='network123')
+        self.client.force_authenticate(other)
+        response = self.client.get('/api/menu-items/')
+        self.assertEqual(response.status_code, 401)
+
+    def test_cursor_pages_cover_all_items_in_order(self):
+        ids = self.collect('/api/menu-items/?ordering=price&page_size=5')
+        expected = list(MenuItem.objects.order_by('price', 'id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_descending_title_ordering(self):
+        ids = self.collect('/api/menu-items/?ordering=-title&page_size=4')
+        expected = list(MenuItem.objects.order_by('-title', '-id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_previous_link_returns_prior_page(self):
+        first = self.client.get('/api/menu-items/?ordering=price&page_size=5').data
+        second = self.client.get(first['next']).data
+        back = self.client.get(second['previous']).data
+        self.assertEqual([i['id'] for i in back['results']], [i['id'] for i in first['results']])
+
+    def test_filters(self):
+        response = self.client.get('/api/menu-items/?category=mains&featured=true&price_min=6&price_max=8')
+        expected = set(MenuItem.objects.filter(
+            category=self.mains, featured=True, price__gte=6, price__lte=8,
+        ).values_list('id', flat=True))
+        self.assertEqual({i['id'] for i in response.data['results']}, expected)
+
+    def test_search_by_title(self):
+        response = self.client.get('/api/menu-items/?search=dish 1')
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.client.get('/api/menu-items/?ordering=category').status_code, 400)
+        self.assertEqual(self.client.get('/api/menu-items/?price_min=abc').status_code, 400)
+        self.assertEqual(self.client.get('/api/menu-items/?cursor=garbage').status_code, 404)
+
+    def test_forged_cursors_are_not_found(self):
+        def cursor(**fields):
+            fields = dict({'f': 'price', 'd': False, 'v': '5.00', 'i': 1, 'r': False}, **fields)
+            return base64.urlsafe_b64encode(json.dumps(fields).encode()).decode()
+
+        self.assertEqual(self.client.get(f'/api/menu-items/?ordering=price&cursor={cursor()}').status_code, 200)
+        for fields in ({'v': 'abc'}, {'v': None}, {'v': [1]}, {'v': '1e999'}, {'i': 10 ** 30}, {'i': -1}, {'i': 'x'}):
+            response = self.client.get(f'/api/menu-items/?ordering=price&cursor={cursor(**fields)}')
+            self.assertEqual(response.status_code, 404, fields)
+
+
+class MenuCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('viewer', password='network123')
+        cls.user.user_permissions.add(Permission.objects.get(codename='view_menuitem'))
+        cls.category = Category.objects.create(slug='mains', title='Mains')
+        cls.item = MenuItem.objects.create(title='Soup', price=Decimal('4.00'), featured=False, category=cls.category)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.get(pk=self.user.pk))
+
+    @override_settings(ROLES_CACHE_TIMEOUT=300)
+    def test_cached_list_is_served_without_queries(self):
+        self.client.get('/api/menu-items/')
+        # Only the permission lookup is left once the payload is cached
+        self.client.force_authenticate(User.objects.get(pk=self.user.pk))
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/menu-items/')
+        self.assertEqual(response.data['results'][0]['title'], 'Soup')
+
+    def test_save_invalidates_list_and_detail(self):
+        self.client.get('/api/menu-items/')
+        self.client.get(f'/api/menu-items/{self.item.id}')
+        self.item.title = 'Stew'
+        self.item.save()
+        self.assertEqual(self.client.get('/api/menu-items/').data['results'][0]['title'], 'Stew')
+        self.assertEqual(self.client.get(f'/api/menu-items/{self.item.id}').data['title'], 'Stew')
+
+    def test_category_change_invalidates(self):
+        self.client.get(f'/api/menu-items/{self.item.id}?expand=category')
+        self.category.title = 'Starters'
+        self.category.save()
+        response = self.client.get(f'/api/menu-items/{self.item.id}?expand=category')
+        self.assertEqual(response.data['category']['title'], 'Starters')
+
+    def test_conditional_requests(self):
+        response = self.client.get(f'/api/menu-items/{self.item.id}')
+        etag, last_modified = response['ETag'], response['Last-Modified']
+        response = self.client.get(f'/api/menu-items/{self.item.id}', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(f'/api/menu-items/{self.item.id}', HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+        MenuItem.objects.create(title='Salad', price=Decimal('3.00'), featured=True, category=self.category)
+        response = self.client.get(f'/api/menu-items/{self.item.id}', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+
+class QueryCountTests(TestCase):
+    # Every list endpoint must run the same number of queries whatever the
+    # number of rows it returns.
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = User.objects.create_user('manager', password='network123')
+        cls.customer = User.objects.create_user('customer', password='network123')
+        cls.crew = User.objects.create_user('crew', password='network123')
+        cls.manager.groups.add(Group.objects.create(name='Manager'))
+        cls.customer.groups.add(Group.objects.create(name='customer'))
+        cls.crew.groups.add(Group.objects.create(name='Delivery crew'))
+        cls.manager.user_permissions.add(Permission.objects.get(codename='view_menuitem'))
+        cls.category = Category.objects.create(slug='mains', title='Mains')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def add_rows(self, count):
+        start = MenuItem.objects.count()
+        for i in range(start, start + count):
+            category = Category.objects.create(slug=f'cat-{i}', title=f'Category {i}')
+            item = MenuItem.objects.create(title=f'Dish {i}', price=Decimal('9.50'), featured=False, category=category)
+            Cart.objects.create(user=self.customer, menuitem=item, quantity=1, unit_price=item.price, price=item.price)
+            customer = User.objects.create_user(f'customer-{i}')
+            order = Order.objects.create(user=customer, delivery_crew=self.crew, total=item.price, date='2023-03-01')
+            Order.objects.create(user=self.customer, delivery_crew=self.crew, total=item.price, date='2023-03-01')
+            OrderItem.objects.create(order=order, menuitem=item, quantity=1, unit_price=item.price, price=item.price)
+
+    def count_queries(self, user, url, expected_rows):
+        # Cold caches and a fresh user instance so nothing carries over
+        cache.clear()
+        self.client.force_authenticate(User.objects.get(pk=user.pk))
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        data = response.data['results'] if isinstance(response.data, dict) else response.data
+        self.assertEqual(len(data), expected_rows)
+        return len(context.captured_queries)
+
+    def assertConstantQueries(self, user, url):
+        self.add_rows(2)
+        small = self.count_queries(user, url, 2)
+        self.add_rows(8)
+        large = self.count_queries(user, url, 10)
+        self.assertEqual(small, large)
+
+    def test_menu_items(self):
+        self.assertConstantQueries(self.manager, '/api/menu-items/')
+
+    def test_cart(self):
+        self.assertConstantQueries(self.customer, '/api/cart/menu-items')
+
+    def test_expanded_cart(self):
+        self.assertConstantQueries(self.customer, '/api/cart/menu-items?expand=menuitem.category,user')
+
+    def test_customer_orders(self):
+        self.assertConstantQueries(self.customer, '/api/orders')
+
+    def test_manager_order_items(self):
+        self.assertConstantQueries(self.manager, '/api/orders')
+
+    def test_delivery_crew_orders(self):
+        self.add_rows(2)
+        small = self.count_queries(self.crew, '/api/orders', 4)
+        self.add_rows(8)
+        large = self.count_queries(self.crew, '/api/orders', 20)
+        self.assertEqual(small, large)
+
+
+@override_settings(ROLES_CACHE_TIMEOUT=300)
+class RoleResolutionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager_group = Group.objects.create(name='Manager')
+        cls.crew_group = Group.objects.create(name='Delivery crew')
+        cls.user = User.objects.create_user('someone', password='network123')
+
+    def setUp(self):
+        cache.clear()
+
+    def fresh_user(self):
+        return User.objects.get(pk=self.user.pk)
+
+    def test_roles_are_loaded_once_and_cached(self):
+        self.user.groups.add(self.manager_group)
+        user = self.fresh_user()
+        with self.assertNumQueries(1):
+            self.assertTrue(has_role(user, 'Manager'))
+            self.assertFalse(has_role(user, 'customer'))
+        user = self.fresh_user()
+        with self.assertNumQueries(0):
+            self.assertTrue(has_role(user, 'Manager'))
+
+    def test_membership_changes_invalidate(self):
+        self.assertFalse(has_role(self.fresh_user(), 'Delivery crew'))
+        self.crew_group.user_set.add(self.user)
+        self.assertTrue(has_role(self.fresh_user(), 'Delivery crew'))
+        self.user.groups.remove(self.crew_group)
+        self.assertFalse(has_role(self.fresh_user(), 'Delivery crew'))
+        self.user.groups.add(self.crew_group)
+        self.assertTrue(has_role(self.fresh_user(), 'Delivery crew'))
+        self.crew_group.user_set.clear()
+        self.assertFalse(has_role(self.fresh_user(), 'Delivery crew'))
+
+    @override_settings(ROLES_CACHE_TIMEOUT=0)
+    def test_cache_can_be_turned_off(self):
+        self.user.groups.add(self.manager_group)
+        user = self.fresh_user()
+        with self.assertNumQueries(1):
+            self.assertTrue(has_role(user, 'Manager'))
+        # A change other workers' caches wouldn't hear of shows at once
+        self.user.groups.through.objects.filter(user=self.user).delete()
+        self.assertFalse(has_role(self.fresh_user(), 'Manager'))
+
+    def test_permission_classes(self):
+        self.user.groups.add(self.manager_group)
+        request = mock.Mock(user=self.fresh_user())
+        self.assertTrue(IsManager().has_permission(request, None))
+        self.assertFalse(IsCustomer().has_permission(request, None))
+        self.assertFalse(IsDeliveryCrew().has_permission(request, None))
+
+    def test_managers_cannot_put_orders(self):
+        # As before roles were resolved through has_role: PUT is for customers
+        order = Order.objects.create(user=self.user, total=Decimal('4.00'), date='2023-03-01')
+        self.user.groups.add(self.manager_group)
+        client = APIClient()
+        client.force_authenticate(self.fresh_user())
+        self.assertEqual(client.put(f'/api/orders/{order.id}', {'status': True}, format='json').status_code, 401)
+        self.assertFalse(Order.objects.get(pk=order.pk).status)
+
+
+class FieldSelectionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create_user('customer')
+        cls.customer.groups.add(Group.objects.create(name='customer'))
+        cls.manager = User.objects.create_user('manager')
+        cls.manager.groups.add(Group.objects.create(name='Manager'))
+        cls.category = Category.objects.create(slug='mains', title='Mains')
+        cls.item = MenuItem.objects.create(title='Pasta', price=Decimal('12.50'), featured=True, category=cls.category)
+        Cart.objects.create(user=cls.customer, menuitem=cls.item, quantity=2, unit_price=cls.item.price, price=Decimal('25.00'))
+        order = Order.objects.create(user=cls.customer, total=Decimal('25.00'), date='2023-03-01')
+        OrderItem.objects.create(order=order, menuitem=cls.item, quantity=2, unit_price=cls.item.price, price=Decimal('25.00'))
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+
+    def test_flat_by_default(self):
+        line = self.client.get('/api/cart/menu-items').data[0]
+        self.assertEqual(line['menuitem'], self.item.id)
+        self.assertEqual(line['user'], self.customer.id)
+        self.assertEqual(line['price'], '25.00')
+
+    def test_sparse_fields_and_expand(self):
+        response = self.client.get('/api/cart/menu-items?fields=menuitem,quantity&expand=menuitem.category')
+        self.assertEqual(response.data, [{
+            'menuitem': {
+                'id': self.item.id, 'title': 'Pasta', 'price': '12.50', 'featured': True,
+                'category': {'id': self.category.id, 'slug': 'mains', 'title': 'Mains'},
+                'updated_at': response.data[0]['menuitem']['updated_at'],
+            },
+            'quantity': 2,
+        }])
+        response = self.client.get('/api/orders?fields=id,total')
+        self.assertEqual(list(response.data[0]), ['id', 'total'])
+
+    def test_unknown_fields_and_relations_are_rejected(self):
+        self.assertEqual(self.client.get('/api/cart/menu-items?fields=secret').status_code, 400)
+        self.assertEqual(self.client.get('/api/cart/menu-items?expand=category').status_code, 400)
+        self.assertEqual(self.client.get('/api/cart/menu-items?expand=menuitem.owner').status_code, 400)
+
+    def test_values_path_matches_the_serializer(self):
+        querysets = {
+            MenuItemSerializer: MenuItem.objects.all(),
+            CartSerializer: Cart.objects.all(),
+            OrderSerializer: Order.objects.all(),
+            OrderItemSerializer: OrderItem.objects.all(),
+            UserSerializer: User.objects.all(),
+        }
+        for serializer_class, queryset in querysets.items():
+            with self.subTest(serializer_class.__name__):
+                rows = serializer_class.read_queryset(queryset)
+                self.assertIsInstance(rows[0], dict)
+                self.assertEqual(serializer_class.read_data(rows), serializer_class(queryset, many=True).data)
+
+
+@override_settings(ROLES_CACHE_TIMEOUT=300, TOKEN_CACHE_TIMEOUT=300)
+class CachedTokenAuthenticationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('customer', password='network123')
+        cls.user.groups.add(Group.objects.create(name='customer'))
+
+    def setUp(self):
+        cache.clear()
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_repeated_requests_skip_token_lookup(self):
+        self.assertEqual(self.client.get('/api/cart/menu-items').status_code, 200)
+        # Only the cart's ETag validators and the cart query itself are left
+        with self.assertNumQueries(2):
+            self.assertEqual(self.client.get('/api/cart/menu-items').status_code, 200)
+        # Neither the token nor the password hash is cached
+        self.assertEqual(cache.get(token_cache_key(self.token.key)), self.user.pk)
+        self.assertNotIn(self.user.password, cache.get(user_cache_key(self.user.pk)))
+
+    def test_cached_user_loads_other_fields_and_saves_only_its_own(self):
+        self.client.get('/api/cart/menu-items')
+        user, _ = CachedTokenAuthentication().authenticate_credentials(self.token.key)
+        self.assertEqual((user.pk, user.username, user.is_active), (self.user.pk, 'customer', True))
+        user.first_name = 'Ada'
+        user.save()
+        self.assertTrue(User.objects.get(pk=self.user.pk).check_password('network123'))
+        self.assertEqual(user.password, self.user.password)
+
+    @override_settings(TOKEN_CACHE_TIMEOUT=0)
+    def test_cache_can_be_turned_off(self):
+        self.client.get('/api/cart/menu-items')
+        self.assertIsNone(cache.get(token_cache_key(self.token.key)))
+        self.assertEqual(self.client.get('/api/cart/menu-items').status_code, 200)
+
+    def test_logout_invalidates_token(self):
+        self.client.get('/api/cart/menu-items')
+        self.assertEqual(self.client.post('/auth/token/logout/').status_code, 204)
+        self.assertEqual(self.client.get('/api/cart/menu-items').status_code, 401)
+
+    def test_deactivated_user_is_rejected(self):
+        self.client.get('/api/cart/menu-items')
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get('/api/cart/menu-items').status_code, 401)
+
+    def test_deleted_user_is_rejected(self):
+        self.client.get('/api/cart/menu-items')
+        self.user.delete()
+        self.assertEqual(self.client.get('/api/cart/menu-items').status_code, 401)
+
+
+class AsyncReadEndpointTests(TestCase):
+    # The async endpoints must return exactly what their sync counterparts do
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create_user('customer', password='network123')
+        cls.manager = User.objects.create_user('manager', password='network123')
+        cls.customer.groups.add(Group.objects.create(name='customer'))
+        cls.manager.groups.add(Group.objects.create(name='Manager'))
+        cls.manager.user_permissions.add(Permission.objects.get(codename='view_menuitem'))
+        category = Category.objects.create(slug='mains', title='Mains')
+        for i in range(3):
+            item = MenuItem.objects.create(title=f'Dish {i}', price=Decimal('4.25'), featured=True, category=category)
+            Cart.objects.create(user=cls.customer, menuitem=item, quantity=2, unit_price=item.price, price=item.price * 2)
+            order = Order.objects.create(user=cls.customer, total=item.price, date='2023-03-01')
+            OrderItem.objects.create(order=order, menuitem=item, quantity=1, unit_price=item.price, price=item.price)
+        cls.item = item
+
+    def setUp(self):
+        cache.clear()
+
+    def assertSamePayload(self, user, path):
+        token = Token.objects.get_or_create(user=user)[0]
+        sync = self.client.get(f'/api/{path}', HTTP_AUTHORIZATION=f'Token {token.key}')
+        cache.clear()
+        asynchronous = self.client.get(f'/api/async/{path}', HTTP_AUTHORIZATION=f'Token {token.key}')
+        self.assertEqual(sync.status_code, asynchronous.status_code)
+        sync, asynchronous = sync.json(), asynchronous.json()
+        if isinstance(sync, dict) and 'next' in sync:
+            # Page links point back at their own endpoint
+            self.assertEqual(sync.pop('next').replace('/api/', '/api/async/'), asynchronous.pop('next'))
+        self.assertEqual(sync, asynchronous)
+
+    def test_menu_items(self):
+        self.assertSamePayload(self.manager, 'menu-items/?ordering=-title&page_size=2')
+        self.assertSamePayload(self.manager, f'menu-items/{self.item.id}')
+
+    def test_cart(self):
+        self.assertSamePayload(self.customer, 'cart/menu-items')
+        self.assertSamePayload(self.manager, 'cart/menu-items')
+
+    def test_orders(self):
+        self.assertSamePayload(self.customer, 'orders')
+        self.assertSamePayload(self.manager, 'orders')
+
+    def test_requires_authentication(self):
+        self.assertEqual(self.client.get('/api/async/orders').status_code, 401)
+        response = self.client.get('/api/async/orders', HTTP_AUTHORIZATION='Token nope')
+        self.assertEqual(response.status_code, 401)
+
+    async def test_served_asynchronously(self):
+        token = await Token.objects.acreate(user=self.customer)
+        response = await self.async_client.get('/api/async/cart/menu-items', AUTHORIZATION=f'Token {token.key}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 3)
+
+
+class MenuSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('viewer')
+        cls.user.user_permissions.add(Permission.objects.get(codename='view_menuitem'))
+        cls.desserts = Category.objects.create(slug='desserts', title='Desserts')
+        cls.specials = Category.objects.create(slug='specials', title='Chef Specials')
+        titles = [
+            ('Fig Tart', cls.desserts), ('Chicken Souvlaki', cls.specials), ('Chickpea Soup', cls.desserts),
+            ('Grilled Chicken Souvlaki Platter', cls.desserts), ('Crème Brûlée', cls.desserts), ('Lamb Stew', cls.specials),
+        ]
+        cls.items = {
+            title: MenuItem.objects.create(title=title, price=Decimal('5.00'), featured=False, category=category)
+            for title, category in titles
+        }
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def ids(self, *titles):
+        return [self.items[title].id for title in titles]
+
+    def indexes(self):
+        indexes = [MemoryIndex()]
+        if fts5_available():
+            indexes.append(FTS5Index())
+        return indexes
+
+    def test_search(self):
+        for index in self.indexes():
+            with self.subTest(type(index).__name__):
+                # Every word, as a prefix; shorter titles first
+                self.assertEqual(index.search('chick souv', 10), self.ids('Chicken Souvlaki', 'Grilled Chicken Souvlaki Platter'))
+                self.assertEqual(set(index.search('chi', 10)), set(self.ids('Chicken Souvlaki', 'Chickpea Soup', 'Grilled Chicken Souvlaki Platter')))
+                # Title matches before category matches
+                self.assertEqual(index.search('chef', 10)[-1], self.items['Chicken Souvlaki'].id)
+                self.assertEqual(set(index.search('chef', 10)), set(self.ids('Chicken Souvlaki', 'Lamb Stew')))
+                self.assertEqual(index.search('dessert fig', 10), self.ids('Fig Tart'))
+                # Accents and case don't matter
+                self.assertEqual(index.search('CREME brul', 10), self.ids('Crème Brûlée'))
+                # One letter only matches a whole word
+                self.assertEqual(index.search('c', 10), [])
+                self.assertEqual(index.search('chi', 1), index.search('chi', 10)[:1])
+                self.assertEqual(index.search('  ?! ', 10), [])
+                self.assertEqual(index.search('pizza', 10), [])
+
+    def assertFollowsChanges(self, index):
+        with mock.patch('LittleLemonAPI.signals.get_search_index', return_value=index), self.captureOnCommitCallbacks(execute=True):
+            stew = self.items['Lamb Stew']
+            stew.title = 'Lamb Kleftiko'
+            stew.save()
+            item = MenuItem.objects.create(title='Kleftiko Pie', price=Decimal('5.00'), featured=False, category=self.desserts)
+            self.items['Fig Tart'].delete()
+            self.specials.title = 'House Favourites'
+            self.specials.save()
+        self.assertEqual(index.search('klef', 10), [item.id, stew.id])
+        self.assertEqual(index.search('stew', 10), [])
+        self.assertEqual(index.search('fig', 10), [])
+        self.assertEqual(index.search('chef', 10), [])
+        self.assertEqual(set(index.search('favourite', 10)), {self.items['Chicken Souvlaki'].id, stew.id})
+
+    def test_fts5_index_follows_changes(self):
+        if not fts5_available():
+            self.skipTest("SQLite without FTS5")
+        self.assertFollowsChanges(FTS5Index())
+
+    def test_fts5_index_ranks_every_match(self):
+        if not fts5_available():
+            self.skipTest("SQLite without FTS5")
+        # The best match is the oldest: only an explicit bound leaves it out
+        expected = self.ids('Chicken Souvlaki', 'Grilled Chicken Souvlaki Platter')
+        self.assertEqual(FTS5Index().search('chick souv', 10), expected)
+        with override_settings(SEARCH_CANDIDATES=1):
+            self.assertEqual(FTS5Index().search('chick souv', 10), expected[1:])
+
+    def test_memory_index_follows_changes(self):
+        index = MemoryIndex()
+        index.search('fig', 1)
+        # Updated on commit, without loading it again
+        with mock.patch.object(index, 'rebuild', side_effect=AssertionError):
+            self.assertFollowsChanges(index)
+
+    def test_memory_index_reloads_on_changes_from_other_workers(self):
+        index = MemoryIndex()
+        self.assertEqual(index.search('lamb', 10), self.ids('Lamb Stew'))
+        with mock.patch('LittleLemonAPI.signals.get_search_index'):
+            MenuItem.objects.filter(pk=self.items['Lamb Stew'].pk).update(title='Goat Stew')
+            self.items['Fig Tart'].save()
+        # Loaded again in the background, the current index serves meanwhile
+        with mock.patch('LittleLemonAPI.search.threading.Thread') as thread:
+            self.assertEqual(index.search('lamb', 10), self.ids('Lamb Stew'))
+            self.assertEqual(index.search('lamb', 10), self.ids('Lamb Stew'))
+        thread.assert_called_once()
+        # The thread closes its own connection, not the test's
+        with mock.patch('LittleLemonAPI.search.connection'):
+            thread.call_args.kwargs['target']()
+        self.assertEqual(index.search('lamb', 10), [])
+        self.assertEqual(index.search('goat', 10), self.ids('Lamb Stew'))
+
+    def test_memory_index_keeps_changes_committed_while_loading(self):
+        index = MemoryIndex()
+        index.search('fig', 1)
+
+        def rows(ids=None):
+            # A change commits after the rebuild read the menu
+            loaded = list(menu_rows(ids))
+            if ids is None:
+                index.apply([self.items['Fig Tart'].pk], [(self.items['Fig Tart'].pk, 'Fig Pie', 'Desserts')])
+            return loaded
+
+        with mock.patch('LittleLemonAPI.search.menu_rows', side_effect=rows):
+            index.rebuild()
+        self.assertEqual(index.search('pie', 10), self.ids('Fig Tart'))
+        self.assertEqual(index.search('tart', 10), [])
+
+    def test_rebuild_after_bulk_writes(self):
+        MenuItem.objects.bulk_create([MenuItem(title='Bulk Baklava', price=Decimal('5.00'), featured=False, category=self.desserts)])
+        self.assertEqual(get_search_index().search('bakl', 10), [])
+        out = io.StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertIn(f'Indexed {MenuItem.objects.count()} menu items', out.getvalue())
+        self.assertEqual(len(get_search_index().search('bakl', 10)), 1)
+
+    def test_endpoint(self):
+        response = self.client.get('/api/menu-items/search?q=souvlaki&fields=id,title&expand=')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), [
+            {'id': self.items['Chicken Souvlaki'].id, 'title': 'Chicken Souvlaki'},
+            {'id': self.items['Grilled Chicken Souvlaki Platter'].id, 'title': 'Grilled Chicken Souvlaki Platter'},
+        ])
+        self.assertIn('ETag', response)
+        response = self.client.get('/api/menu-items/search?q=souvlaki&limit=1&expand=category')
+        self.assertEqual(response.json()[0]['category']['title'], 'Chef Specials')
+        self.assertEqual(self.client.get('/api/menu-items/search').json(), [])
+        self.assertEqual(self.client.get('/api/menu-items/search?q=a&limit=0').status_code, 400)
+        self.assertEqual(self.client.get('/api/menu-items/search?q=a&limit=x').status_code, 400)
+        self.client.force_authenticate(User.objects.create_user('nobody'))
+        self.assertEqual(self.client.get('/api/menu-items/search?q=fig').status_code, 401)
+
+
+class MenuImportExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.mains = Category.objects.create(slug='mains', title='Mains')
+        cls.item = MenuItem.objects.create(title='Lamb Stew', price=Decimal('9.50'), featured=False, category=cls.mains)
+
+    def setUp(self):
+        cache.clear()
+
+    def run_command(self, *args, stdin=None):
+        out, err = io.StringIO(), io.StringIO()
+        with mock.patch('sys.stdin', stdin or io.StringIO()):
+            call_command(*args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_round_trip(self):
+        for file_format in ('csv', 'json', 'ndjson'):
+            with self.subTest(file_format):
+                exported, _ = self.run_command('export_menu', 'menu-items', '--format', file_format)
+                exported = exported.replace('9.50', '10.25')
+                out, err = self.run_command('import_menu', 'menu-items', '-', '--format', file_format, '--key', 'id', stdin=io.StringIO(exported))
+                self.assertIn('0 created, 1 updated, 0 invalid', out)
+                self.assertEqual(err, '')
+                self.assertEqual(MenuItem.objects.get().price, Decimal('10.25'))
+                MenuItem.objects.update(price=Decimal('9.50'))
+        exported, _ = self.run_command('export_menu', 'categories', '--format', 'json')
+        self.assertEqual(json.loads(exported), [{'slug': 'mains', 'title': 'Mains'}])
+
+    def test_import_menu_items(self):
+        version = get_menu_version()
+        rows = (
+            'title,price,featured,category\n'
+            'Lamb Stew,11.00,yes,mains\n'
+            'Fig Tart,4.50,,mains\n'
+            'Bad,abc,maybe,\n'
+            'Soup,3.00,0,starters\n'
+            'Fig Tart,4.75,true,mains\n'
+        )
+        out, err = self.run_command('import_menu', 'menu-items', '-', stdin=io.StringIO(rows))
+        self.assertIn('1 created, 1 updated, 2 invalid', out)
+        self.assertEqual(err.splitlines(), [
+            'Row 3: price: “abc” value must be a decimal number.; featured: “maybe” value must be either True or False.; '
+            'category: This field is required.',
+            "Row 4: category: No category with slug 'starters'.",
+        ])
+        self.assertEqual(
+            list(MenuItem.objects.order_by('id').values_list('title', 'price', 'featured')),
+            [('Lamb Stew', Decimal('11.00'), True), ('Fig Tart', Decimal('4.75'), True)],
+        )
+        self.assertNotEqual(get_menu_version(), version)
+        self.assertEqual(get_search_index().search('fig', 10), [MenuItem.objects.get(title='Fig Tart').id])
+
+    def test_import_categories(self):
+        result = import_categories([{'slug': 'mains', 'title': 'Main Courses'}, {'slug': 'sides', 'title': 'Sides'}, {'slug': 'bad slug!', 'title': 'X'}])
+        self.assertEqual((result['created'], result['updated'], result['invalid']), (1, 1, 1))
+        self.assertEqual(dict(Category.objects.values_list('slug', 'title')), {'mains': 'Main Courses', 'sides': 'Sides'})
+        self.assertEqual(get_search_index().search('courses', 10), [self.item.id])
+
+    def test_queries_per_batch(self):
+        def rows(count, prefix):
+            return [{'title': f'{prefix} {i}', 'price': '5.00', 'category': 'mains'} for i in range(count)]
+
+        with CaptureQueriesContext(connection) as few:
+            import_menu_items(rows(2, 'Few'), batch_size=100)
+        with CaptureQueriesContext(connection) as many:
+            import_menu_items(rows(100, 'Many'), batch_size=100)
+        self.assertEqual(len(few), len(many))
+        with CaptureQueriesContext(connection) as batched:
+            import_menu_items(rows(100, 'Batched'), batch_size=50)
+        self.assertEqual(len(batched), 2 * len(many))
+        self.assertEqual(MenuItem.objects.count(), 203)
+
+    def test_json_is_read_incrementally(self):
+        rows = [{'title': f'Dish {i}', 'price': i * 1000, 'tags': ['a, b', '[c]']} for i in range(50)]
+        content = json.dumps(rows, indent=1)
+        self.assertEqual(list(iter_json_array(io.StringIO(content), block_size=7)), rows)
+        self.assertEqual(list(read_rows(io.StringIO('[]'), 'json')), [])
+        for broken in ('{"title": "x"}', '[{"title": "x"},', ''):
+            with self.assertRaises(ValueError):
+                list(iter_json_array(io.StringIO(broken), block_size=4))
+        out, err = self.run_command('import_menu', 'menu-items', '-', '--format', 'json', stdin=io.StringIO('[1, {"title": "x"}]'))
+        self.assertIn('0 created, 0 updated, 2 invalid', out)
+        self.assertIn('Row 1: row: Must be an object.', err)
+
+
+class ResponseFormatTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('viewer')
+        cls.user.user_permissions.add(Permission.objects.get(codename='view_menuitem'))
+        cls.customer = User.objects.create_user('customer')
+        cls.customer.groups.add(Group.objects.create(name='customer'))
+        category = Category.objects.create(slug='mains', title='Mains')
+        cls.items = [
+            MenuItem.objects.create(title=f'Dish {i}', price=Decimal('2.50'), featured=False, category=category)
+            for i in range(12)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_messagepack_round_trip(self):
+        values = [
+            None, True, False, 0, 127, 128, 255, 256, 65535, 65536, 2 ** 32, 2 ** 64 - 1, -1, -32, -33, -128, -129,
+            -32768, -32769, -2 ** 31 - 1, -2 ** 63, 1.5, '', 'a' * 31, 'a' * 32, 'é' * 200, 'a' * 70000, b'\x00' * 300,
+            list(range(15)), list(range(16)), list(range(70000)), {str(i): i for i in range(20)}, {'nested': [{'a': [1, {}]}]},
+        ]
+        for value in values:
+            self.assertEqual(unpack(pack(value)), value)
+        self.assertEqual(pack({'a': [1, -1, None]}), b'\x81\xa1a\x93\x01\xff\xc0')
+        # Types without a MessagePack notation are written as in JSON
+        self.assertEqual(unpack(pack((Decimal('2.50'), date(2023, 3, 1)))), [2.5, '2023-03-01'])
+        for data in (b'\xc1', b'\x92\x01', b'\x01\x02', b'\xd9\x05ab'):
+            with self.assertRaises(ValueError):
+                unpack(data)
+
+    def test_fast_json_matches_drf(self):
+        data = {'price': Decimal('2.50'), 'at': timezone.now(), 'day': date(2023, 3, 1), 'title': 'Café \u2028', 'items': (1, 2)}
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_negotiation(self):
+        response = self.client.get('/api/menu-items/?page_size=3')
+        self.assertEqual(response['Content-Type'], 'application/json')
+        packed = self.client.get('/api/menu-items/?page_size=3', HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(packed['Content-Type'], 'application/msgpack')
+        self.assertEqual(unpack(packed.content), json.loads(response.content))
+        self.assertLess(len(packed.content), len(response.content))
+        self.assertIn('Accept', packed['Vary'])
+        # One ETag per format: a cached JSON body can't answer a MessagePack request
+        self.assertNotEqual(packed['ETag'], response['ETag'])
+        self.assertEqual(self.client.get('/api/menu-items/?page_size=3&format=msgpack', HTTP_IF_NONE_MATCH=packed['ETag']).status_code, 200)
+        self.assertEqual(self.client.get('/api/menu-items/?page_size=3', HTTP_ACCEPT='application/msgpack',
+                                         HTTP_IF_NONE_MATCH=packed['ETag']).status_code, 304)
+
+    def test_messagepack_request_body(self):
+        self.client.force_authenticate(self.customer)
+        body = pack({'items': [{'menuitem': self.items[0].id, 'quantity': 2}]})
+        response = self.client.post('/api/cart/menu-items/bulk', body, content_type='application/msgpack')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Cart.objects.get(user=self.customer).quantity, 2)
+        response = self.client.post('/api/cart/menu-items/bulk', b'\x92\x01', content_type='application/msgpack')
+        self.assertEqual(response.status_code, 400)
+
+    @override_settings(RESPONSE_COMPRESSION_MIN_BYTES=500)
+    def test_compression(self):
+        plain = self.client.get('/api/menu-items/?page_size=12')
+        self.assertFalse(plain.has_header('Content-Encoding'))
+        self.assertIn('Accept-Encoding', plain['Vary'])
+
+        for accept in ('application/json', 'application/msgpack'):
+            response = self.client.get('/api/menu-items/?page_size=12', HTTP_ACCEPT=accept, HTTP_ACCEPT_ENCODING='gzip, deflate')
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+            self.assertTrue(response['ETag'].startswith('W/'))
+            self.assertEqual(len(response.content), int(response['Content-Length']))
+            body = gzip.decompress(response.content)
+            self.assertEqual(json.loads(body) if accept == 'application/json' else unpack(body), json.loads(plain.content))
+            revalidated = self.client.get('/api/menu-items/?page_size=12', HTTP_ACCEPT=accept, HTTP_ACCEPT_ENCODING='gzip',
+                                          HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(revalidated.status_code, 304)
+
+        # Below the threshold, or refused by the client
+        small = self.client.get('/api/menu-items/?page_size=1', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(small.has_header('Content-Encoding'))
+        refused = self.client.get('/api/menu-items/?page_size=12', HTTP_ACCEPT_ENCODING='gzip;q=0, identity')
+        self.assertFalse(refused.has_header('Content-Encoding'))
+        # The browsable API embeds the JSON in its page, uncompressed
+        html = self.client.get('/api/menu-items/?page_size=12', HTTP_ACCEPT='text/html', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(html.status_code, 200)
+        self.assertFalse(html.has_header('Content-Encoding'))
+        self.assertIn(b'Dish 11', html.content)
+
+    def test_choose_encoding(self):
+        self.assertEqual(choose_encoding('gzip, deflate, br'), 'br' if 'br' in COMPRESSORS else 'gzip')
+        self.assertEqual(choose_encoding('*'), choose_encoding('gzip, br'))
+        self.assertIsNone(choose_encoding(''))
+        self.assertIsNone(choose_encoding('identity, gzip;q=0'))
+        with override_settings(RESPONSE_COMPRESSION_ENCODINGS=[]):
+            self.assertIsNone(choose_encoding('gzip'))
+
+
+class StreamingExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = User.objects.create_user('manager', password='network123')
+        cls.manager.groups.add(Group.objects.create(name='Manager'))
+        cls.manager.user_permissions.add(Permission.objects.get(codename='view_menuitem'))
+        customer = User.objects.create_user('customer', password='network123')
+        category = Category.objects.create(slug='mains', title='Mains')
+        order = Order.objects.create(user=customer, total=Decimal('30.00'), date='2023-03-01')
+        for i in range(5):
+            item = MenuItem.objects.create(title=f'Dish {i}', price=Decimal('6.00'), featured=i == 0, category=category)
+            OrderItem.objects.create(order=order, menuitem=item, quantity=1, unit_price=item.price, price=item.price)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.manager)
+
+    def read(self, response):
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_order_items_as_json_array(self):
+        streamed = json.loads(self.read(self.client.get('/api/orders?stream=1')))
+        self.assertEqual(streamed, json.loads(json.dumps(self.client.get('/api/orders').data)))
+
+    def test_order_items_as_ndjson(self):
+        response = self.client.get('/api/orders?stream=ndjson&expand=menuitem')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = self.read(response).splitlines()
+        self.assertEqual(len(lines), 5)
+        self.assertEqual(json.loads(lines[0])['menuitem']['title'], 'Dish 0')
+        # Flat by default, from the .values() path
+        flat = self.read(self.client.get('/api/orders?stream=ndjson')).splitlines()
+        self.assertEqual(json.loads(flat[0])['menuitem'], json.loads(lines[0])['menuitem']['id'])
+
+    def test_menu_export_applies_filters(self):
+        streamed = json.loads(self.read(self.client.get('/api/menu-items/?stream=json&featured=true')))
+        self.assertEqual([item['title'] for item in streamed], ['Dish 0'])
+
+    def test_invalid_stream_format(self):
+        self.assertEqual(self.client.get('/api/orders?stream=xml').status_code, 400)
+
+
+class IndexCoverageTests(TestCase):
+    def test_endpoint_querysets_avoid_full_scans(self):
+        out = io.StringIO()
+        call_command('explain_queries', '--fail-on-scan', stdout=out)
+        self.assertNotIn('FULL SCAN', out.getvalue())
+
+
+@override_settings(METRICS_SAMPLE_RATE=1)
+class PerformanceMetricsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = User.objects.create_user('manager', password='network123')
+        cls.manager.groups.add(Group.objects.create(name='Manager'))
+        cls.customer = User.objects.create_user('customer', password='network123')
+        cls.customer.groups.add(Group.objects.create(name='customer'))
+
+    def setUp(self):
+        cache.clear()
+        registry.clear()
+        self.client = APIClient()
+
+    def test_server_timing_header(self):
+        self.client.force_authenticate(self.customer)
+        response = self.client.get('/api/cart/menu-items')
+        self.assertRegex(response['Server-Timing'], r'db;dur=[\d.]+;desc="\d+ queries", view;dur=')
+
+    def test_metrics_endpoint(self):
+        self.client.force_authenticate(self.customer)
+        self.client.get('/api/cart/menu-items')
+        self.client.force_authenticate(self.manager)
+        response = self.client.get('/api/metrics')
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        self.assertIn('littlelemon_request_seconds_count{view="api/cart/menu-items"} 1', body)
+        self.assertIn('littlelemon_db_queries_quantile{view="api/cart/menu-items",quantile="0.95"}', body)
+
+    def test_metrics_endpoint_is_manager_only(self):
+        self.client.force_authenticate(self.customer)
+        self.assertEqual(self.client.get('/api/metrics').status_code, 403)
+
+    @override_settings(METRICS_SAMPLE_RATE=0)
+    def test_unsampled_requests_are_not_measured(self):
+        self.client.force_authenticate(self.customer)
+        response = self.client.get('/api/cart/menu-items')
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(registry.histograms, {})
+
+    def test_histogram_quantiles(self):
+        histogram = Histogram((1, 2, 4, 8))
+        for value in (0.5, 1.5, 1.5, 3, 3, 3, 3, 6, 6, 7):
+            histogram.observe(value)
+        self.assertAlmostEqual(histogram.quantile(0.5), 3.0)
+        self.assertLessEqual(histogram.quantile(0.99), 8)
+
+
+class CheckoutTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create_user('customer', password='network123')
+        cls.customer.groups.add(Group.objects.create(name='customer'))
+        category = Category.objects.create(slug='mains', title='Mains')
+        cls.items = [
+            MenuItem.objects.create(title=f'Dish {i}', price=Decimal('2.50'), featured=False, category=category)
+            for i in range(3)
+        ]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+        for quantity, item in enumerate(self.items, start=1):
+            Cart.objects.create(
+                user=self.customer, menuitem=item, quantity=quantity,
+                unit_price=item.price, price=item.price * quantity,
+            )
+
+    def test_checkout_creates_order_and_clears_cart(self):
+        # 7 for the order, 8 creating the day's sales rollup rows and 1
+        # enqueueing the receipt and kitchen ticket
+        with self.assertNumQueries(16):
+            response = self.client.post('/api/orders')
+        self.assertEqual(response.status_code, 201)
+        order = Order.objects.get(id=response.data['id'])
+        self.assertEqual(order.total, Decimal('15.00'))
+        self.assertEqual(order.items.count(), 3)
+        self.assertFalse(Cart.objects.filter(user=self.customer).exists())
+
+    def test_empty_cart(self):
+        Cart.objects.all().delete()
+        response = self.client.post('/api/orders')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+    def test_total_must_fit_the_order(self):
+        # Two valid lines of 5999.40 each, 11998.80 in all
+        Cart.objects.all().delete()
+        for item in self.items[:2]:
+            Cart.objects.create(user=self.customer, menuitem=item, quantity=2400, unit_price=item.price, price=Decimal('5999.40'))
+        response = self.client.post('/api/orders')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('9999.99', response.data)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(Cart.objects.filter(user=self.customer).count(), 2)
+
+    def test_idempotency_key_prevents_duplicate_orders(self):
+        first = self.client.post('/api/orders', HTTP_IDEMPOTENCY_KEY='abc')
+        second = self.client.post('/api/orders', HTTP_IDEMPOTENCY_KEY='abc')
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(first.data['id'], second.data['id'])
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_long_idempotency_key_is_rejected(self):
+        # Not truncated: keys sharing their first 64 characters would collide
+        response = self.client.post('/api/orders', HTTP_IDEMPOTENCY_KEY='k' * 65)
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(self.client.post('/api/orders', HTTP_IDEMPOTENCY_KEY='k' * 64).status_code, 201)
+
+    def test_failure_rolls_back(self):
+        with mock.patch.object(OrderItem.objects, 'bulk_create', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.client.post('/api/orders')
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(Job.objects.exists())
+        self.assertEqual(Cart.objects.filter(user=self.customer).count(), 3)
+
+
+class BulkCartTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create_user('customer', password='network123')
+        cls.customer.groups.add(Group.objects.create(name='customer'))
+        category = Category.objects.create(slug='mains', title='Mains')
+        cls.items = [
+            MenuItem.objects.create(title=f'Dish {i}', price=Decimal('2.50') * (i + 1), featured=False, category=category)
+            for i in range(4)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+        Cart.objects.create(user=self.customer, menuitem=self.items[0], quantity=1, unit_price=Decimal('1.00'), price=Decimal('1.00'))
+
+    def quantities(self):
+        return dict(Cart.objects.filter(user=self.customer).values_list('menuitem_id', 'quantity'))
+
+    def test_upsert_adds_and_updates_with_server_prices(self):
+        payload = {'items': [
+            {'menuitem': self.items[0].id, 'quantity': 3, 'price': '0.01'},
+            {'menuitem': self.items[1].id, 'quantity': 2},
+        ]}
+        # role lookup, savepoint, in_bulk, upsert, release, cart read
+        with self.assertNumQueries(6):
+            response = self.client.post('/api/cart/menu-items/bulk', payload, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 2)
+        self.assertEqual(self.quantities(), {self.items[0].id: 3, self.items[1].id: 2})
+        line = Cart.objects.get(user=self.customer, menuitem=self.items[0])
+        self.assertEqual((line.unit_price, line.price), (Decimal('2.50'), Decimal('7.50')))
+
+    def test_line_totals_must_fit_the_price_column(self):
+        expensive = MenuItem.objects.create(title='Banquet', price=Decimal('99.99'), featured=False, category=self.items[0].category)
+        payload = {'items': [{'menuitem': expensive.id, 'quantity': 32767}, {'menuitem': self.items[1].id, 'quantity': 1}]}
+        response = self.client.post('/api/cart/menu-items/bulk', payload, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(str(expensive.id), response.data['items'][0])
+        response = self.client.patch('/api/cart/menu-items/bulk', {'items': [{'menuitem': self.items[0].id, 'quantity': 5000}]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.quantities(), {self.items[0].id: 1})
+        # 100 * 99.99 fits
+        payload = {'items': [{'menuitem': expensive.id, 'quantity': 100}]}
+        self.assertEqual(self.client.post('/api/cart/menu-items/bulk', payload, format='json').status_code, 200)
+
+    def test_unknown_menu_item_changes_nothing(self):
+        payload = {'items': [{'menuitem': self.items[1].id, 'quantity': 1}, {'menuitem': 9999, 'quantity': 1}]}
+        response = self.client.post('/api/cart/menu-items/bulk', payload, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.quantities(), {self.items[0].id: 1})
+
+    def test_duplicates_and_zero_rejected_on_add(self):
+        for items in ([{'menuitem': self.items[1].id, 'quantity': 1}] * 2, [{'menuitem': self.items[1].id, 'quantity': 0}]):
+            response = self.client.post('/api/cart/menu-items/bulk', {'items': items}, format='json')
+            self.assertEqual(response.status_code, 400)
+
+    def test_patch_changes_quantities_and_removes_zero(self):
+        Cart.objects.create(user=self.customer, menuitem=self.items[1], quantity=1, unit_price=Decimal('5.00'), price=Decimal('5.00'))
+        payload = {'items': [{'menuitem': self.items[0].id, 'quantity': 4}, {'menuitem': self.items[1].id, 'quantity': 0}]}
+        response = self.client.patch('/api/cart/menu-items/bulk', payload, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.quantities(), {self.items[0].id: 4})
+        self.assertEqual(Cart.objects.get(user=self.customer).price, Decimal('10.00'))
+
+    def test_patch_rejects_lines_not_in_cart(self):
+        payload = {'items': [{'menuitem': self.items[2].id, 'quantity': 4}]}
+        response = self.client.patch('/api/cart/menu-items/bulk', payload, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_clear(self):
+        other = User.objects.create_user('other')
+        Cart.objects.create(user=other, menuitem=self.items[0], quantity=1, unit_price=Decimal('2.50'), price=Decimal('2.50'))
+        response = self.client.delete('/api/cart/menu-items/bulk')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.quantities(), {})
+        self.assertEqual(Cart.objects.filter(user=other).count(), 1)
+
+
+class SummaryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create_user('customer', password='network123')
+        cls.customer.groups.add(Group.objects.create(name='customer'))
+        cls.manager = User.objects.create_user('manager', password='network123')
+        cls.manager.groups.add(Group.objects.create(name='Manager'))
+        mains = Category.objects.create(slug='mains', title='Mains')
+        desserts = Category.objects.create(slug='desserts', title='Desserts')
+        cls.items = [
+            MenuItem.objects.create(title='Pasta', price=Decimal('12.00'), featured=False, category=mains),
+            MenuItem.objects.create(title='Pizza', price=Decimal('10.00'), featured=False, category=mains),
+            MenuItem.objects.create(title='Tiramisu', price=Decimal('6.50'), featured=False, category=desserts),
+        ]
+        for item, quantity in zip(cls.items, (2, 1, 3)):
+            Cart.objects.create(
+                user=cls.customer, menuitem=item, quantity=quantity,
+                unit_price=item.price, price=item.price * quantity,
+            )
+        other = User.objects.create_user('other')
+        for user, day, delivered, total in [
+            (cls.customer, '2023-03-01', False, '10.00'),
+            (cls.customer, '2023-03-01', True, '5.50'),
+            (cls.customer, '2023-03-02', True, '7.00'),
+            (cls.customer, '2023-02-01', True, '99.00'),
+            (other, '2023-03-01', False, '20.00'),
+        ]:
+            Order.objects.create(user=user, date=day, status=delivered, total=Decimal(total))
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+
+    def test_cart_summary_in_one_query(self):
+        self.client.get('/api/cart/summary')
+        # the ETag validators, then the summary
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/cart/summary')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['lines'], 3)
+        self.assertEqual(response.data['items'], 6)
+        self.assertEqual(response.data['subtotal'], '53.50')
+        self.assertEqual(
+            [(row['slug'], row['lines'], row['items'], row['subtotal']) for row in response.data['categories']],
+            [('desserts', 1, 3, '19.50'), ('mains', 2, 3, '34.00')],
+        )
+
+    def test_empty_cart_summary(self):
+        Cart.objects.all().delete()
+        response = self.client.get('/api/cart/summary')
+        self.assertEqual((response.data['lines'], response.data['subtotal'], response.data['categories']), (0, '0.00', []))
+
+    def test_order_summary_by_day_and_status(self):
+        response = self.client.get('/api/orders/summary?from=2023-03-01&to=2023-03-31')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['orders'], response.data['total']), (3, '22.50'))
+        days = response.data['days']
+        self.assertEqual([day['date'] for day in days], ['2023-03-02', '2023-03-01'])
+        self.assertEqual(days[1]['by_status'], {
+            'pending': {'orders': 1, 'total': '10.00'},
+            'delivered': {'orders': 1, 'total': '5.50'},
+        })
+
+    def test_manager_summary_covers_every_customer(self):
+        self.client.force_authenticate(self.manager)
+        response = self.client.get('/api/orders/summary?from=2023-03-01&to=2023-03-01')
+        self.assertEqual((response.data['orders'], response.data['total']), (3, '35.50'))
+
+    def test_invalid_dates(self):
+        response = self.client.get('/api/orders/summary?from=March')
+        self.assertEqual(response.status_code, 400)
+
+
+class SalesRollupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create_user('customer', password='network123')
+        cls.customer.groups.add(Group.objects.create(name='customer'))
+        cls.manager = User.objects.create_user('manager', password='network123')
+        cls.manager.groups.add(Group.objects.create(name='Manager'))
+        cls.crew = User.objects.create_user('crew', password='network123')
+        category = Category.objects.create(slug='mains', title='Mains')
+        cls.pasta = MenuItem.objects.create(title='Pasta', price=Decimal('12.00'), featured=False, category=category)
+        cls.pizza = MenuItem.objects.create(title='Pizza', price=Decimal('10.00'), featured=False, category=category)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def place_order(self, *lines):
+        self.client.force_authenticate(self.customer)
+        for item, quantity in lines:
+            Cart.objects.create(
+                user=self.customer, menuitem=item, quantity=quantity,
+                unit_price=item.price, price=item.price * quantity,
+            )
+        return Order.objects.get(id=self.client.post('/api/orders').data['id'])
+
+    def rollups(self):
+        return {
+            'revenue': list(DailyRevenue.objects.values_list('date', 'orders', 'delivered_orders', 'revenue').order_by('date')),
+            'items': sorted(
+                (row for row in DailyItemSales.objects.values_list('date', 'menuitem_id', 'quantity', 'revenue') if row[2]),
+            ),
+            'crew': sorted(
+                row for row in DailyCrewDeliveries.objects.values_list('date', 'delivery_crew_id', 'delivered', 'revenue') if row[2]
+            ),
+        }
+
+    def test_incremental_updates_match_a_rebuild(self):
+        first = self.place_order((self.pasta, 2), (self.pizza, 1))
+        self.place_order((self.pasta, 1))
+        first.delivery_crew = self.crew
+        first.status = True
+        first.save()
+        moved = self.place_order((self.pizza, 3))
+        moved.date = '2023-03-01'
+        moved.save()
+        self.place_order((self.pizza, 1)).delete()
+
+        incremental = self.rollups()
+        today = first.date
+        self.assertEqual(incremental['revenue'], [
+            (date(2023, 3, 1), 1, 0, Decimal('30.00')),
+            (today, 2, 1, Decimal('46.00')),
+        ])
+        self.assertEqual(incremental['crew'], [(today, self.crew.id, 1, Decimal('34.00'))])
+        self.assertIn((today, self.pasta.id, 3, Decimal('36.00')), incremental['items'])
+
+        call_command('rebuild_analytics', stdout=io.StringIO())
+        self.assertEqual(self.rollups(), incremental)
+
+    def test_reports_are_manager_only_and_read_rollups(self):
+        self.place_order((self.pasta, 2), (self.pizza, 5))
+        self.client.force_authenticate(self.customer)
+        self.assertEqual(self.client.get('/api/analytics/revenue').status_code, 403)
+
+        self.client.force_authenticate(self.manager)
+        self.client.get('/api/analytics/top-items')
+        # roles are cached by now, leaving one query on the rollup
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/analytics/top-items?limit=1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(row['title'], row['quantity'], row['revenue']) for row in response.data['results']],
+            [('Pizza', 5, '50.00')],
+        )
+        revenue = self.client.get('/api/analytics/revenue').data['results']
+        self.assertEqual([(row['orders'], row['revenue']) for row in revenue], [(1, '74.00')])
+        self.assertEqual(self.client.get('/api/analytics/delivery-crew').data['results'], [])
+        self.assertEqual(self.client.get('/api/analytics/revenue?from=yesterday').status_code, 400)
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create_user('customer', password='network123')
+        cls.customer.groups.add(Group.objects.create(name='customer'))
+        category = Category.objects.create(slug='mains', title='Mains')
+        cls.items = [
+            MenuItem.objects.create(title=f'Dish {i}', price=Decimal('4.00'), featured=False, category=category)
+            for i in range(2)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+        self.cart = Cart.objects.create(
+            user=self.customer, menuitem=self.items[0], quantity=1, unit_price=Decimal('4.00'), price=Decimal('4.00'),
+        )
+
+    def test_unchanged_cart_is_not_modified_without_serializing(self):
+        response = self.client.get('/api/cart/menu-items')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Cache-Control'], 'private, no-cache')
+        self.assertIn('Authorization', response['Vary'])
+        etag = response['ETag']
+        # only the validators query
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/cart/menu-items', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+        last_modified = self.client.get('/api/cart/menu-items')['Last-Modified']
+        response = self.client.get('/api/cart/menu-items', HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+    def test_changes_produce_a_new_etag(self):
+        etag = self.client.get('/api/cart/menu-items')['ETag']
+        seen = {etag}
+        changes = [
+            lambda: self.client.post('/api/cart/menu-items/bulk', {'items': [{'menuitem': self.items[1].id, 'quantity': 1}]}, format='json'),
+            lambda: self.client.patch('/api/cart/menu-items/bulk', {'items': [{'menuitem': self.items[1].id, 'quantity': 3}]}, format='json'),
+            lambda: Cart.objects.filter(menuitem=self.items[0]).delete(),
+            # The cart nests menu items
+            lambda: MenuItem.objects.filter(id=self.items[1].id).first().save(),
+        ]
+        for change in changes:
+            change()
+            response = self.client.get('/api/cart/menu-items', HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            etag = response['ETag']
+            self.assertNotIn(etag, seen)
+            seen.add(etag)
+
+    def test_etags_are_per_user(self):
+        etag = self.client.get('/api/cart/menu-items')['ETag']
+        other = User.objects.create_user('other')
+        other.groups.add(Group.objects.get(name='customer'))
+        self.client.force_authenticate(other)
+        self.assertEqual(self.client.get('/api/cart/menu-items', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_order_detail_and_async_cart(self):
+        order = Order.objects.create(user=self.customer, total=Decimal('4.00'), date='2023-03-01')
+        etag = self.client.get(f'/api/orders/{order.id}')['ETag']
+        self.assertEqual(self.client.get(f'/api/orders/{order.id}', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        order.status = True
+        order.save()
+        self.assertEqual(self.client.get(f'/api/orders/{order.id}', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        token = Token.objects.create(user=self.customer)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        response = client.get('/api/async/cart/menu-items')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(client.get('/api/async/cart/menu-items', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+    def test_no_304_for_callers_turned_away(self):
+        order = Order.objects.create(user=self.customer, total=Decimal('4.00'), date='2023-03-01')
+        crew = User.objects.create_user('crew')
+        crew.groups.add(Group.objects.create(name='Delivery crew'))
+        self.client.force_authenticate(crew)
+        for path in (f'/api/orders/{order.id}', '/api/cart/menu-items', '/api/async/cart/menu-items'):
+            with self.subTest(path):
+                self.assertEqual(self.client.get(path, HTTP_IF_NONE_MATCH='*').status_code, 401)
+                self.assertEqual(self.client.get(path, HTTP_IF_MODIFIED_SINCE='Fri, 01 Jan 2100 00:00:00 GMT').status_code, 401)
+
+    def test_cache_control_policies(self):
+        manager = User.objects.create_user('manager')
+        manager.groups.add(Group.objects.create(name='Manager'))
+        manager.user_permissions.add(Permission.objects.get(codename='view_menuitem'))
+        self.client.force_authenticate(manager)
+        self.assertEqual(self.client.get('/api/menu-items/')['Cache-Control'], 'private, max-age=60')
+        self.assertEqual(self.client.get('/api/analytics/revenue')['Cache-Control'], 'private, max-age=300')
+        self.assertEqual(self.client.get('/api/metrics')['Cache-Control'], 'no-store')
+
+
+class DispatchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create_user('customer')
+        cls.manager = User.objects.create_user('manager')
+        cls.manager.groups.add(Group.objects.create(name='Manager'))
+        crew_group = Group.objects.create(name='Delivery crew')
+        cls.crew = [User.objects.create_user(f'crew-{i}') for i in range(3)]
+        crew_group.user_set.add(*cls.crew)
+        inactive = User.objects.create_user('retired', is_active=False)
+        crew_group.user_set.add(inactive)
+
+    def setUp(self):
+        cache.clear()
+        # Existing open loads 2, 0 and 1; delivered orders don't count
+        for member, open_orders in zip(self.crew, (2, 0, 1)):
+            for _ in range(open_orders):
+                Order.objects.create(user=self.customer, delivery_crew=member, total=Decimal('5.00'), date='2023-03-01')
+            Order.objects.create(user=self.customer, delivery_crew=member, status=True, total=Decimal('5.00'), date='2023-03-01')
+
+    def add_pending(self, count):
+        return [Order.objects.create(user=self.customer, total=Decimal('5.00'), date='2023-03-02').id for _ in range(count)]
+
+    def open_loads(self):
+        return [Order.objects.filter(delivery_crew=member, status=False).count() for member in self.crew]
+
+    def test_balances_by_open_load(self):
+        self.add_pending(6)
+        # savepoint, loads, pending ids, one UPDATE per crew member, release
+        with self.assertNumQueries(7):
+            assigned = dispatch_batch(limit=100, max_open=0)
+        self.assertEqual(sum(assigned.values()), 6)
+        self.assertEqual(self.open_loads(), [3, 3, 3])
+        self.assertFalse(pending_orders().exists())
+
+    def test_cap_and_oldest_first(self):
+        oldest = Order.objects.create(user=self.customer, total=Decimal('5.00'), date='2023-02-01').id
+        self.add_pending(5)
+        assigned = dispatch_batch(limit=100, max_open=2)
+        self.assertEqual(sum(assigned.values()), 3)
+        self.assertEqual(self.open_loads(), [2, 2, 2])
+        self.assertIsNotNone(Order.objects.get(id=oldest).delivery_crew_id)
+        self.assertEqual(pending_orders().count(), 3)
+
+    def test_dispatch_all_runs_in_batches(self):
+        self.add_pending(7)
+        assigned = dispatch_all(batch_size=2, max_open=0)
+        self.assertEqual(sum(assigned.values()), 7)
+        self.assertFalse(pending_orders().exists())
+
+    def test_endpoint_and_command(self):
+        self.add_pending(4)
+        client = APIClient()
+        client.force_authenticate(self.customer)
+        self.assertEqual(client.post('/api/orders/dispatch', {'limit': 1}, format='json').status_code, 403)
+
+        client.force_authenticate(self.manager)
+        response = client.post('/api/orders/dispatch', {'limit': 1}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['assigned'], 1)
+        self.assertEqual(response.data['delivery_crew'], [{'id': self.crew[1].id, 'orders': 1}])
+        self.assertEqual(response.data['pending'], 3)
+        self.assertEqual(client.post('/api/orders/dispatch', {'limit': 'all'}, format='json').status_code, 400)
+
+        out = io.StringIO()
+        call_command('dispatch_orders', stdout=out)
+        self.assertIn('Assigned 3 orders, 0 still pending', out.getvalue())
+
+    def test_batch_size_must_be_positive(self):
+        self.add_pending(2)
+        for batch_size in (0, -1):
+            with self.assertRaises(ValueError):
+                dispatch_all(batch_size=batch_size, max_open=0)
+            with self.assertRaises(CommandError):
+                call_command('dispatch_orders', batch_size=batch_size, stdout=io.StringIO())
+        self.assertEqual(pending_orders().count(), 2)
+
+
+class CrewDeliveryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create_user('customer')
+        crew_group = Group.objects.create(name='Delivery crew')
+        cls.crew = [User.objects.create_user(f'crew-{i}') for i in range(2)]
+        crew_group.user_set.add(*cls.crew)
+        category = Category.objects.create(slug='mains', title='Mains')
+        cls.items = [MenuItem.objects.create(title=f'Dish {i}', price=Decimal('4.00'), featured=False, category=category) for i in range(3)]
+
+    def setUp(self):
+        cache.clear()
+        self.published = []
+        patcher = mock.patch.object(get_broker(), 'publish', side_effect=lambda channel, event: self.published.append((channel, event)))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def add_order(self, crew, lines=2, date='2023-03-01', delivered=False):
+        order = Order.objects.create(user=self.customer, delivery_crew=crew, status=delivered, total=Decimal('8.00'), date=date)
+        for item in self.items[:lines]:
+            OrderItem.objects.create(order=order, menuitem=item, quantity=1, unit_price=item.price, price=item.price)
+        return order.id
+
+    def test_worklist_queries_stay_constant(self):
+        newest = self.add_order(self.crew[0], date='2023-03-02')
+        oldest = self.add_order(self.crew[0], lines=1)
+        self.add_order(self.crew[0], delivered=True)
+        self.add_order(self.crew[1])
+        with self.assertNumQueries(2):
+            worklist = crew_worklist(self.crew[0])
+        self.assertEqual([order['id'] for order in worklist], [oldest, newest])
+        self.assertEqual(worklist[0]['username'], 'customer')
+        self.assertEqual(worklist[0]['items'], [{'quantity': 1, 'menu_item': self.items[0].id, 'title': 'Dish 0'}])
+
+        for _ in range(5):
+            self.add_order(self.crew[0])
+        with self.assertNumQueries(2):
+            self.assertEqual(len(crew_worklist(self.crew[0])), 7)
+
+        client = APIClient()
+        client.force_authenticate(self.crew[0])
+        response = client.get('/api/orders/worklist')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data[0]['total'], '8.00')
+        self.assertEqual(len(response.data[1]['items']), 2)
+        self.assertEqual(client.get('/api/orders/worklist', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        client.force_authenticate(self.customer)
+        self.assertEqual(client.get('/api/orders/worklist').status_code, 403)
+
+    def test_batch_delivery_updates_rollups_and_publishes(self):
+        ids = [self.add_order(self.crew[0], date=date) for date in ('2023-03-01', '2023-03-01', '2023-03-02')]
+        other = self.add_order(self.crew[1])
+        with self.captureOnCommitCallbacks(execute=True):
+            delivered, not_assigned = mark_delivered(self.crew[0], ids + [other, 999999])
+        self.assertEqual((delivered, not_assigned), (ids, [other, 999999]))
+        self.assertEqual(Order.objects.filter(id__in=ids, status=True).count(), 3)
+        self.assertFalse(Order.objects.get(id=other).status)
+
+        crew_rows = DailyCrewDeliveries.objects.filter(delivery_crew=self.crew[0]).order_by('date')
+        self.assertEqual([(row.delivered, row.revenue) for row in crew_rows], [(2, Decimal('16.00')), (1, Decimal('8.00'))])
+        self.assertEqual(DailyRevenue.objects.get(date='2023-03-01').delivered_orders, 2)
+        self.assertEqual(DailyRevenue.objects.get(date='2023-03-01').orders, 3)
+        self.assertEqual(sorted((event['order'], event['status']) for channel, event in self.published
+                                if channel == user_channel(self.customer.id)), [(id, True) for id in ids])
+
+    def test_retries_are_idempotent(self):
+        ids = [self.add_order(self.crew[0]) for _ in range(2)]
+        client = APIClient()
+        client.force_authenticate(self.crew[0])
+        for _ in range(2):
+            response = client.post('/api/orders/deliver', {'orders': ids + ids[:1]}, format='json')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data, {'delivered': ids, 'not_assigned': []})
+        self.assertEqual(DailyCrewDeliveries.objects.get(delivery_crew=self.crew[0]).delivered, 2)
+        self.assertEqual(client.get('/api/orders/worklist').data, [])
+
+    def test_invalid_payloads(self):
+        client = APIClient()
+        client.force_authenticate(self.crew[0])
+        self.assertEqual(client.post('/api/orders/deliver', {'orders': []}, format='json').status_code, 400)
+        self.assertEqual(client.post('/api/orders/deliver', {'orders': ['x']}, format='json').status_code, 400)
+        with override_settings(DELIVERY_BATCH_SIZE=2):
+            self.assertEqual(client.post('/api/orders/deliver', {'orders': [1, 2, 3]}, format='json').status_code, 400)
+        client.force_authenticate(self.customer)
+        self.assertEqual(client.post('/api/orders/deliver', {'orders': [1]}, format='json').status_code, 403)
+
+
+class OrderEventTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create_user('customer')
+        crew_group = Group.objects.create(name='Delivery crew')
+        cls.crew = [User.objects.create_user(f'crew-{i}') for i in range(2)]
+        crew_group.user_set.add(*cls.crew)
+        cls.token = Token.objects.create(user=cls.customer)
+
+    def setUp(self):
+        cache.clear()
+        self.published = []
+        patcher = mock.patch.object(get_broker(), 'publish', side_effect=lambda channel, event: self.published.append((channel, event)))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def received(self):
+        return sorted((channel, event['order'], event['status'], event['delivery_crew']) for channel, event in self.published)
+
+    def test_status_and_assignment_changes_are_published_on_commit(self):
+        order = Order.objects.create(user=self.customer, total=Decimal('5.00'), date='2023-03-01')
+        with self.captureOnCommitCallbacks(execute=True):
+            order.total = Decimal('6.00')
+            order.save()
+        self.assertEqual(self.published, [])
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            order.delivery_crew = self.crew[0]
+            order.save()
+            self.assertEqual(self.published, [])
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(self.received(), sorted([
+            (user_channel(self.crew[0].id), order.id, False, self.crew[0].id),
+            (user_channel(self.customer.id), order.id, False, self.crew[0].id),
+        ]))
+
+        # A reassignment also tells the crew member who lost the order
+        self.published.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            order.delivery_crew = self.crew[1]
+            order.status = True
+            order.save()
+        self.assertEqual([channel for channel, *_ in self.received()], sorted(
+            user_channel(user.id) for user in (self.crew[0], self.crew[1], self.customer)
+        ))
+
+    def test_dispatch_publishes_assignments(self):
+        order = Order.objects.create(user=self.customer, total=Decimal('5.00'), date='2023-03-01')
+        with self.captureOnCommitCallbacks(execute=True):
+            assigned = dispatch_batch(limit=10, max_open=0)
+        crew_id = next(iter(assigned))
+        self.assertEqual(self.received(), sorted([
+            (user_channel(crew_id), order.id, False, crew_id),
+            (user_channel(self.customer.id), order.id, False, crew_id),
+        ]))
+
+    def test_rollups_and_events_do_not_depend_on_receiver_order(self):
+        order = Order.objects.create(user=self.customer, total=Decimal('5.00'), date='2023-03-01')
+        # Connected again, the rollup receiver now runs after the events one
+        post_save.disconnect(update_rollups_on_order_save, sender=Order)
+        post_save.connect(update_rollups_on_order_save, sender=Order)
+        with self.captureOnCommitCallbacks(execute=True):
+            order.delivery_crew = self.crew[0]
+            order.status = True
+            order.save()
+        self.assertEqual(len(self.published), 2)
+        rollup = DailyRevenue.objects.get(date='2023-03-01')
+        self.assertEqual((rollup.orders, rollup.delivered_orders, rollup.revenue), (1, 1, Decimal('5.00')))
+
+
+class OrderEventStreamTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create_user('customer')
+        cls.token = Token.objects.create(user=cls.customer)
+
+    def setUp(self):
+        cache.clear()
+
+    # Drives the ASGI app the way a server would: publishes `events` once the
+    # stream is ready and disconnects once a body containing `until` was sent
+    async def stream(self, query_string=b'', headers=(), events=(), until=b'event: ready'):
+        broker = get_broker()
+        messages = []
+        disconnected = asyncio.Event()
+
+        async def receive():
+            await disconnected.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            messages.append(message)
+            body = message.get('body', b'')
+            if b'event: ready' in body:
+                for event in events:
+                    broker.publish(user_channel(self.customer.id), event)
+            if until in body:
+                disconnected.set()
+
+        scope = {'type': 'http', 'method': 'GET', 'path': ORDER_EVENTS_PATH, 'query_string': query_string, 'headers': list(headers)}
+        await asyncio.wait_for(with_order_events(mock.AsyncMock())(scope, receive, send), timeout=5)
+        return messages
+
+    async def test_stream_delivers_the_users_events(self):
+        event = {'id': 1, 'type': 'order', 'order': 7, 'status': True, 'delivery_crew': None}
+        messages = await self.stream(
+            headers=[(b'authorization', f'Token {self.token.key}'.encode())], events=[event], until=b'id: 1',
+        )
+        self.assertEqual(messages[0]['status'], 200)
+        self.assertIn((b'content-type', b'text/event-stream'), messages[0]['headers'])
+        self.assertTrue(messages[1]['body'].startswith(b'retry: '))
+        self.assertEqual(messages[2]['body'], b'event: order\nid: 1\ndata: ' + json.dumps(event).encode() + b'\n\n')
+        # Disconnecting drops the subscription
+        self.assertEqual(get_broker().subscriptions, {})
+
+    @override_settings(SSE_HEARTBEAT=0)
+    async def test_idle_stream_sends_keep_alives(self):
+        messages = await self.stream(query_string=f'token={self.token.key}'.encode(), until=b': keep-alive')
+        self.assertEqual(messages[-1]['body'], b': keep-alive\n\n')
+
+    async def test_stream_requires_a_valid_token(self):
+        messages = await self.stream()
+        self.assertEqual(messages[0]['status'], 401)
+        messages = await self.stream(query_string=b'token=nope')
+        self.assertEqual(messages[0]['status'], 401)
+        messages = await self.stream(query_string=f'token={self.token.key}'.encode())
+        self.assertEqual(messages[0]['status'], 200)
+
+    async def test_other_paths_go_to_django(self):
+        django_app = mock.AsyncMock()
+        scope = {'type': 'http', 'method': 'GET', 'path': '/api/orders'}
+        await with_order_events(django_app)(scope, None, None)
+        django_app.assert_awaited_once_with(scope, None, None)
+
+
+flaky_calls = []
+
+
+# Fails `failures` times, then succeeds
+@task('test_flaky')
+def flaky(failures=0):
+    flaky_calls.append(1)
+    if len(flaky_calls) <= failures:
+        raise RuntimeError('try again')
+
+
+class JobQueueTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create_user('customer', email='customer@example.com')
+        cls.customer.groups.add(Group.objects.create(name='customer'))
+        category = Category.objects.create(slug='mains', title='Mains')
+        cls.item = MenuItem.objects.create(title='Pasta', price=Decimal('12.00'), featured=False, category=category)
+
+    def setUp(self):
+        flaky_calls.clear()
+
+    def test_checkout_side_effects_run_on_the_worker(self):
+        Cart.objects.create(user=self.customer, menuitem=self.item, quantity=2, unit_price=self.item.price, price=Decimal('24.00'))
+        client = APIClient()
+        client.force_authenticate(self.customer)
+        order_id = client.post('/api/orders').data['id']
+        self.assertEqual(sorted(Job.objects.values_list('task', flat=True)), ['print_kitchen_ticket', 'send_order_receipt'])
+        self.assertEqual(mail.outbox, [])
+
+        with self.assertLogs('LittleLemonAPI.kitchen') as logs:
+            self.assertEqual(work(burst=True)['done'], 2)
+        self.assertIn('2 x Pasta', logs.output[0])
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].subject, f'Your Little Lemon order #{order_id}')
+        self.assertFalse(Job.objects.exists())
+
+    @override_settings(JOBS_RETRY_DELAY=60)
+    def test_failures_are_retried_with_backoff_then_given_up(self):
+        job = enqueue('test_flaky', {'failures': 5}, max_attempts=2)
+        with self.assertLogs('LittleLemonAPI.jobs', 'WARNING'):
+            self.assertEqual(work(burst=True)['retried'], 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.QUEUED, 1))
+        self.assertIn('try again', job.last_error)
+        # 60s less up to a quarter
+        self.assertGreater(job.run_at, job.updated_at + timedelta(seconds=44))
+
+        # Not due yet
+        self.assertEqual(work(burst=True)['retried'], 0)
+        Job.objects.update(run_at=job.updated_at)
+        with self.assertLogs('LittleLemonAPI.jobs', 'WARNING'):
+            self.assertEqual(work(burst=True)['failed'], 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+        self.assertEqual(len(flaky_calls), 2)
+
+    def test_expired_leases_are_taken_over(self):
+        enqueue('test_flaky')
+        self.assertEqual(len(claim_jobs('dead-worker', 10, lease=60)), 1)
+        # Leased: other workers leave it alone
+        self.assertEqual(claim_jobs('other-worker', 10, lease=60), [])
+        Job.objects.update(locked_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(work(burst=True)['done'], 1)
+        self.assertEqual(len(flaky_calls), 1)
+        self.assertFalse(Job.objects.exists())
+
+    def test_run_jobs_command(self):
+        for _ in range(3):
+            enqueue('test_flaky')
+        out = io.StringIO()
+        call_command('run_jobs', '--burst', '--concurrency', '1', stdout=out)
+        self.assertIn('3 done', out.getvalue())
+        self.assertRaises(ValueError, enqueue, 'no_such_task')
+
+
+class ThrottlingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create_user('customer')
+        cls.manager = User.objects.create_user('manager')
+        cls.plain = User.objects.create_user('plain')
+        cls.customer.groups.add(Group.objects.create(name='customer'))
+        cls.manager.groups.add(Group.objects.create(name='Manager'), Group.objects.get(name='customer'))
+
+    def setUp(self):
+        cache.clear()
+        get_store().clear()
+        self.client = APIClient()
+
+    def test_sliding_window(self):
+        store = LocalMemoryStore()
+        limit = (4, 60)
+        for now in (0, 10, 20, 30):
+            self.assertEqual(hit(store, 'k', limit, now=now), (True, 0))
+        self.assertEqual(hit(store, 'k', limit, now=59), (False, 1))
+        # Five sixths of the previous window still overlap: 4 * 5/6 + 0 < 4
+        self.assertEqual(hit(store, 'k', limit, now=70), (True, 0))
+        allowed, wait = hit(store, 'k', limit, now=70)
+        self.assertFalse(allowed)
+        # Until less than three quarters overlap: 4 * 0.75 + 1 < 4
+        self.assertAlmostEqual(wait, 5)
+        self.assertFalse(hit(store, 'k', limit, now=75)[0])
+        self.assertEqual(hit(store, 'k', limit, now=76), (True, 0))
+
+    def test_local_store_is_bounded(self):
+        store = LocalMemoryStore(max_entries=2)
+        for key in 'abc':
+            store.incr(key, ttl=60, now=0)
+        self.assertEqual(store.count(['a', 'b', 'c'], now=1), [0, 1, 1])
+        self.assertEqual(store.count(['c'], now=61), [0])
+
+    @override_settings(THROTTLE_RATES={'anon': '1/min', 'user': '2/min', 'customer': '3/min', 'Manager': '5/min'}, THROTTLE_SCOPE_RATES={})
+    def test_most_generous_role_applies(self):
+        for user, allowed in ((self.plain, 2), (self.customer, 3), (self.manager, 5)):
+            self.client.force_authenticate(user)
+            throttled = [self.client.get('/api/menu-items/').status_code == 429 for _ in range(allowed + 1)]
+            self.assertEqual(throttled, [False] * allowed + [True], user.username)
+        # Anonymous clients only reach the login endpoint
+        self.client.force_authenticate(None)
+        login = {'username': 'plain', 'password': 'wrong'}
+        throttled = [self.client.post('/auth/token/login/', login).status_code == 429 for _ in range(2)]
+        self.assertEqual(throttled, [False, True])
+
+    @override_settings(THROTTLE_SCOPE_RATES={'orders.post': {'customer': '1/min'}, 'cart': {'customer': '2/min'}})
+    def test_endpoint_limits(self):
+        self.client.force_authenticate(self.customer)
+        self.assertEqual([self.client.get('/api/orders').status_code for _ in range(3)], [200] * 3)
+        self.assertEqual([self.client.get('/api/cart/menu-items').status_code for _ in range(2)], [200] * 2)
+        response = self.client.get('/api/cart/menu-items')
+        self.assertEqual(response.status_code, 429)
+        self.assertTrue(1 <= int(response['Retry-After']) <= 60)
+        # Managers have no cart limit
+        self.client.force_authenticate(self.manager)
+        self.assertEqual([self.client.get('/api/cart/menu-items').status_code for _ in range(3)], [200] * 3)
+
+    @override_settings(THROTTLE_SCOPE_RATES={'orders': {'customer': '1/min'}})
+    def test_async_endpoint_limits(self):
+        self.client.force_authenticate(self.customer)
+        self.assertEqual(self.client.get('/api/async/orders').status_code, 200)
+        response = self.client.get('/api/async/orders')
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+
+    def test_checks_do_not_query_the_database(self):
+        self.client.force_authenticate(self.customer)
+        self.client.get('/api/cart/menu-items')
+        with override_settings(THROTTLE_RATES=None, THROTTLE_SCOPE_RATES={}):
+            with CaptureQueriesContext(connection) as unthrottled:
+                self.client.get('/api/cart/menu-items')
+        with self.assertNumQueries(len(unthrottled)):
+            self.assertEqual(self.client.get('/api/cart/menu-items').status_code, 200)
+
+
+class BenchmarkHarnessTests(TestCase):
+    def test_seed_data_is_usable(self):
+        seeded = seed_benchmark_data(menu_items=20, customers=3, delivery_crew=1, orders=10, items_per_order=2)
+        self.assertEqual(MenuItem.objects.count(), 20)
+        self.assertEqual(OrderItem.objects.count(), 20)
+        self.assertTrue(has_role(seeded['users']['manager'], 'Manager'))
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Token {seeded['tokens']['customer']}")
+        self.assertEqual(client.get('/api/orders').status_code, 200)
+        response = self.client.post('/auth/token/login/', {
+            'username': seeded['users']['customer'].username, 'password': BENCHMARK_PASSWORD,
+        })
+        self.assertEqual(response.status_code, 200)
+
+    def test_regressions_over_threshold_and_noise_floor(self):
+        def report(**p95):
+            return {'results': {'server': {name: {'p95_ms': value} for name, value in p95.items()}}}
+
+        baseline = report(fast=1.0, slow=10.0, steady=10.0)
+        current = report(fast=1.5, slow=15.0, steady=11.0, new=50.0)
+        regressions = find_regressions(baseline, current, threshold=0.2, min_ms=1.0)
+        self.assertEqual([r['route'] for r in regressions], ['slow'])
+        self.assertEqual(regressions[0]['change'], 0.5)
@@ -0,0 +1,191 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+from rest_framework.throttling import BaseThrottle
+
+from .roles import get_user_roles
+
+
+#------------------------------------------------------------
+# Counter stores
+#------------------------------------------------------------
+# A store keeps expiring integer counters. count() reads several at once and
+# incr() adds one, creating the counter with the given lifetime; both cost
+# O(1) and never touch the database.
+
+class LocalMemoryStore:
+    # Counters in this process only: enough for a single worker. Bounded to
+    # max_entries, evicting the oldest counters first.
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.counters = OrderedDict()
+
+    def count(self, keys, now=None):
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            counts = []
+            for key in keys:
+                entry = self.counters.get(key)
+                counts.append(entry[0] if entry is not None and entry[1] > now else 0)
+            return counts
+
+    def incr(self, key, ttl, now=None):
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            entry = self.counters.get(key)
+            if entry is None or entry[1] <= now:
+                self.counters.pop(key, None)
+                self.counters[key] = [1, now + ttl]
+                while len(self.counters) > self.max_entries:
+                    self.counters.popitem(last=False)
+            else:
+                entry[0] += 1
+
+    def clear(self):
+        with self.lock:
+            self.counters.clear()
+
+
+class CacheStore:
+    # Counters in a Django cache: shared by every worker using it when the
+    # cache is shared (redis). incr() is atomic there; two workers creating
+    # the same counter at once may lose a hit, which only errs on the
+    # lenient side.
+    def __init__(self, alias='default', prefix='littlelemon:throttle:'):
+        self.cache = caches[alias]
+        self.prefix = prefix
+
+    def count(self, keys, now=None):
+        values = self.cache.get_many([self.prefix + key for key in keys])
+        return [values.get(self.prefix + key, 0) for key in keys]
+
+    def incr(self, key, ttl, now=None):
+        key = self.prefix + key
+        try:
+            self.cache.incr(key)
+        except ValueError:
+            if not self.cache.add(key, 1, timeout=ttl):
+                self.cache.incr(key)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+# The store configured in settings.THROTTLE_STORE, created on first use
+def get_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                backend = import_string(settings.THROTTLE_STORE)
+                _store = backend(**settings.THROTTLE_STORE_OPTIONS)
+    return _store
+
+
+#------------------------------------------------------------
+# Sliding window limits
+#------------------------------------------------------------
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+# '100/min' -> (100, 60); None means no limit
+def parse_rate(rate):
+    if rate is None:
+        return None
+    num, period = rate.split('/')
+    return int(num), PERIODS[period[0]]
+
+
+# Sliding window counter: one counter per fixed window, and the request rate
+# estimated as this window's count plus the share of the previous window's
+# count that still overlaps the sliding window. Two counters per limit
+# instead of one timestamp per request. Returns (allowed, seconds to wait).
+def hit(store, key, limit, now=None):
+    num, window = limit
+    now = time.time() if now is None else now
+    index, offset = divmod(now, window)
+    current_key, previous_key = f'{key}:{int(index)}', f'{key}:{int(index) - 1}'
+    previous, current = store.count([previous_key, current_key])
+    weight = 1 - offset / window
+    if previous * weight + current >= num:
+        if current >= num:
+            wait = window - offset
+        else:
+            # When the previous window's share has shrunk enough
+            wait = window * (1 - (num - current) / previous) - offset
+        return False, max(wait, 0)
+    store.incr(current_key, ttl=2 * window)
+    return True, 0
+
+
+#------------------------------------------------------------
+# DRF throttles
+#------------------------------------------------------------
+class RoleRateThrottle(BaseThrottle):
+    # Limits each user by role, over every endpoint: THROTTLE_RATES gives a
+    # rate per role, the most generous of the user's roles applies. Users
+    # without a role get 'user', anonymous clients 'anon' (by address).
+    scope = 'all'
+
+    def get_rates(self, request, view):
+        return settings.THROTTLE_RATES
+
+    def get_limit(self, request, view):
+        rates = self.get_rates(request, view)
+        if rates is None:
+            return None
+        if not request.user or not request.user.is_authenticated:
+            return parse_rate(rates.get('anon'))
+        roles = get_user_roles(request.user)
+        if not roles:
+            return parse_rate(rates.get('user'))
+        limits = [self.role_limit(rates, role) for role in roles]
+        if None in limits:
+            return None
+        return max(limits, key=lambda limit: limit[0] / limit[1])
+
+    # A role without a rate of its own gets the 'user' rate
+    def role_limit(self, rates, role):
+        return parse_rate(rates.get(role, rates.get('user')))
+
+    def get_ident(self, request):
+        if request.user and request.user.is_authenticated:
+            return f'user:{request.user.pk}'
+        return f'anon:{super().get_ident(request)}'
+
+    def allow_request(self, request, view):
+        self.wait_seconds = None
+        limit = self.get_limit(request, view)
+        if limit is None:
+            return True
+        key = f'{self.scope}:{self.get_ident(request)}:{limit[0]}/{limit[1]}'
+        allowed, self.wait_seconds = hit(get_store(), key, limit)
+        return allowed
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class EndpointRateThrottle(RoleRateThrottle):
+    # Limits each user on the views with a throttle_scope, by role, from
+    # THROTTLE_SCOPE_RATES['<scope>.<method>'] or, failing that,
+    # THROTTLE_SCOPE_RATES['<scope>']. Views without a scope aren't limited,
+    # nor are the roles a scope doesn't list.
+    def get_rates(self, request, view):
+        scope = getattr(view, 'throttle_scope', None)
+        if scope is None:
+            return None
+        rates = settings.THROTTLE_SCOPE_RATES
+        self.scope = f'{scope}.{request.method.lower()}'
+        if self.scope not in rates:
+            self.scope = scope
+        return rates.get(self.scope)
+
+    def role_limit(self, rates, role):
+        return parse_rate(rates.get(role))
@@ -1,9 +1,11 @@
 from django.urls import path
-from .views import MenuItemView, MenuItemDetail, UserGroupManagement,RemoveUserFromManagerGroup,DeliveryCrewManagerGroup,RemoveUserFromDeliveryCrewGroup,CartView,RemoveCartItem,OrderView,OrderDetail
+from .views import MenuItemView, MenuItemDetail, MenuSearchView, UserGroupManagement,RemoveUserFromManagerGroup,DeliveryCrewManagerGroup,RemoveUserFromDeliveryCrewGroup,CartView,RemoveCartItem,BulkCartView,CartSummaryView,OrderView,OrderDetail,OrderSummaryView,DispatchView,CrewWorklistView,DeliverOrdersView,MetricsView,RevenueAnalyticsView,TopMenuItemsAnalyticsView,CrewAnalyticsView
+from .async_views import AsyncMenuItemView, AsyncMenuItemDetail, AsyncCartView, AsyncOrderView
 
 urlpatterns = [
     path('menu-items/', MenuItemView.as_view()),
     path('menu-items/<int:id>', MenuItemDetail.as_view()),
+    path('menu-items/search', MenuSearchView.as_view()),
 
     path('groups/manager/users', UserGroupManagement.as_view()),
     path('groups/manager/users/<int:id>', RemoveUserFromManagerGroup.as_view()),
@@ -13,7 +15,25 @@ urlpatterns = [
 
     path('cart/menu-items', CartView.as_view()),
     path('cart/menu-items/<int:id>', RemoveCartItem.as_view()),
+    path('cart/menu-items/bulk', BulkCartView.as_view()),
+    path('cart/summary', CartSummaryView.as_view()),
 
     path('orders', OrderView.as_view()),
     path('orders/<int:id>', OrderDetail.as_view()),
+    path('orders/summary', OrderSummaryView.as_view()),
+    path('orders/dispatch', DispatchView.as_view()),
+    path('orders/worklist', CrewWorklistView.as_view()),
+    path('orders/deliver', DeliverOrdersView.as_view()),
+
+    path('analytics/revenue', RevenueAnalyticsView.as_view()),
+    path('analytics/top-items', TopMenuItemsAnalyticsView.as_view()),
+    path('analytics/delivery-crew', CrewAnalyticsView.as_view()),
+
+    path('metrics', MetricsView.as_view()),
+
+    # Async read endpoints, served from core.asgi
+    path('async/menu-items/', AsyncMenuItemView.as_view()),
+    path('async/menu-items/<int:id>', AsyncMenuItemDetail.as_view()),
+    path('async/cart/menu-items', AsyncCartView.as_view()),
+    path('async/orders', AsyncOrderView.as_view()),
 ]
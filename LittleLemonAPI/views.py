@@ -1,12 +1,30 @@
+from datetime import date, timedelta
+
+from django.conf import settings
 from django.shortcuts import render, get_object_or_404
+from django.db.models import Case, When
+from django.utils import timezone
+from django.http import HttpResponse
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import IsAuthenticated
 from .models import MenuItem, Cart, Order, OrderItem
-from .serializers import MenuItemSerializer, UserSerializer, CartSerializer, OrderSerializer, OrderItemSerializer
+from .serializers import MenuItemSerializer, UserSerializer, CartSerializer, OrderSerializer, OrderItemSerializer, BulkCartSerializer, CartSummarySerializer, OrderSummarySerializer, DailyRevenueSerializer, TopMenuItemSerializer, CrewThroughputSerializer, WorklistOrderSerializer, DeliverOrdersSerializer
+from .pagination import MenuItemPagination
+from .filters import MenuItemFilter
+from .cache import cached_menu_response, conditional, queryset_validators
+from .services import checkout, EmptyCartError, CheckoutError, upsert_cart_items, update_cart_quantities, clear_cart, CartItemsError, cart_summary, order_summary
+from .roles import has_role, MANAGER, CUSTOMER, DELIVERY_CREW
+from .streaming import get_stream_format, stream_queryset
+from .permissions import IsManager, IsCustomer, IsDeliveryCrew
+from .metrics import registry
+from .analytics import revenue_by_day, top_menu_items, crew_throughput
+from .dispatch import dispatch_batch, pending_orders, open_orders, crew_worklist, mark_delivered
+from .search import get_search_index
 from django.contrib.auth.models import User
 from django.contrib.auth.models import Group
-from django.test import Client
 
 
 # Create your views here.
@@ -16,16 +34,33 @@ from django.test import Client
 #------------------------------------------------------------
 class MenuItemView(APIView):
     # Get method for user's with view permission
+    # Supports ?category=, ?featured=, ?price_min=, ?price_max=, ?search=,
+    # ?ordering=(-)price|(-)title|(-)id and keyset pagination via ?cursor=
+    # ?stream=1|ndjson exports the whole filtered menu as a stream instead
+    # ?fields= and ?expand=category shape the items, see FieldSelectionMixin
+    @conditional('menu')
     def get(self, request):
-        menu_items = MenuItem.objects.all()
-        serializer = MenuItemSerializer(menu_items, many=True)
-        if request.user.has_perm('LittleLemonAPI.view_menuitem'):
-            return Response(serializer.data, status=status.HTTP_200_OK)
-        return Response("Not authorized to view this page", status=status.HTTP_401_UNAUTHORIZED)
+        if not request.user.has_perm('LittleLemonAPI.view_menuitem'):
+            return Response("Not authorized to view this page", status=status.HTTP_401_UNAUTHORIZED)
+
+        stream_format = get_stream_format(request)
+        if stream_format:
+            menu_items = MenuItemSerializer.read_queryset(MenuItem.objects.order_by('id'), request)
+            menu_items = MenuItemFilter().filter_queryset(request, menu_items, self)
+            return stream_queryset(menu_items, MenuItemSerializer, stream_format, request)
+
+        def build_payload():
+            menu_items = MenuItemSerializer.read_queryset(MenuItem.objects.all(), request)
+            menu_items = MenuItemFilter().filter_queryset(request, menu_items, self)
+            paginator = MenuItemPagination()
+            page = paginator.paginate_queryset(menu_items, request, view=self)
+            return paginator.get_paginated_response(MenuItemSerializer.read_data(page, request)).data
+
+        return cached_menu_response(request, 'menu-items', build_payload)
 
     # Post method for Managers to add food item
     def post(self, request):
-        if request.user.groups.filter(name="Manager"):
+        if has_role(request.user, MANAGER):
             data = MenuItemSerializer(data=request.data)
             if data.is_valid():
                 data.save()
@@ -35,25 +70,61 @@ class MenuItemView(APIView):
         return Response("Not authorized...", status=status.HTTP_403_FORBIDDEN)
 
 
+# Menu search
+class MenuSearchView(APIView):
+    # Get method for user's with view permission
+    # ?q= finds menu items by their title and category title, best match
+    # first; every word must match, words of SEARCH_MIN_PREFIX characters or
+    # more as prefixes, for type-ahead. ?limit= caps the results (at most
+    # SEARCH_MAX_RESULTS), ?fields= and ?expand=category shape them.
+    @conditional('menu')
+    def get(self, request):
+        if not request.user.has_perm('LittleLemonAPI.view_menuitem'):
+            return Response("Not authorized to view this page", status=status.HTTP_401_UNAUTHORIZED)
+
+        query = request.query_params.get('q', '')
+        limit = request.query_params.get('limit', settings.SEARCH_RESULTS)
+        try:
+            limit = int(limit)
+        except ValueError:
+            raise ValidationError({'limit': 'Must be an integer.'})
+        if limit < 1:
+            raise ValidationError({'limit': 'Must be a positive integer.'})
+        limit = min(limit, settings.SEARCH_MAX_RESULTS)
+
+        def build_payload():
+            ids = get_search_index().search(query, limit)
+            if not ids:
+                return []
+            rank = Case(*[When(pk=pk, then=position) for position, pk in enumerate(ids)])
+            menu_items = MenuItemSerializer.read_queryset(MenuItem.objects.filter(pk__in=ids).order_by(rank), request)
+            return MenuItemSerializer.read_data(menu_items, request)
+
+        return cached_menu_response(request, 'menu-search', build_payload)
+
+
 # Menu Item detail
 class MenuItemDetail(APIView):
     # Getting a particular menu item
-    def get_object(self, id):
+    def get_object(self, id, request=None):
         try:
-            return MenuItem.objects.get(id=id)
+            return MenuItemSerializer.setup_eager_loading(MenuItem.objects.all(), request).get(id=id)
         except MenuItem.DoesNotExist:
             pass
     
     # Get the detail of a particular food menu
+    @conditional('menu')
     def get(self, request, id):
-        menu_item = MenuItemSerializer(self.get_object(id))
-        return Response(menu_item.data, status=status.HTTP_200_OK)
+        return cached_menu_response(
+            request, f'menu-item:{id}',
+            lambda: MenuItemSerializer(self.get_object(id, request), context={'request': request}).data,
+        )
 
     # Update method for Managers to update a particular food item
     def put(self, request, id):
         menu_item = self.get_object(id)
         data = MenuItemSerializer(menu_item, data=request.data)
-        if request.user.groups.filter(name="Manager"):
+        if has_role(request.user, MANAGER):
             if data.is_valid():
                 data.save()
                 return Response(data.data, status=status.HTTP_201_CREATED)
@@ -62,7 +133,7 @@ class MenuItemDetail(APIView):
     # Delete method for Managers to remove a particular food item
     def delete(self, request, id):
         menu_item = self.get_object(id)
-        if request.user.groups.filter(name="Manager"):
+        if has_role(request.user, MANAGER):
             menu_item.delete()
             return Response("Deleted Successfully", status=status.HTTP_204_NO_CONTENT)
         return Response("Not authorised to remove item", status=status.HTTP_403_FORBIDDEN)
@@ -73,16 +144,16 @@ class MenuItemDetail(APIView):
 #---------------------------------------------------------------
 class UserGroupManagement(APIView):
     # Getting all user groups
+    @conditional('users')
     def get(self, request):
-        users = User.objects.filter(groups__name="Manager")
-        users_data = UserSerializer(users, many=True)
-        if request.user.groups.filter(name="Manager"):
-            return Response(users_data.data)
+        if has_role(request.user, MANAGER):
+            users = UserSerializer.read_queryset(User.objects.filter(groups__name="Manager"), request)
+            return Response(UserSerializer.read_data(users, request))
         return Response("Not authorized to view this page", status=status.HTTP_401_UNAUTHORIZED)
 
     # Assigns the user in the payload to the manager group and returns 201-Created
     def post(self, request, format=None):
-        if request.user.groups.filter(name="Manager"):
+        if has_role(request.user, MANAGER):
             serializer = UserSerializer(data=request.data)
             if serializer.is_valid():
                 user = serializer.save()
@@ -103,7 +174,7 @@ class RemoveUserFromManagerGroup(APIView):
 
         # Removing a user from the manager group by a manager
         group = Group.objects.get(name='Manager')
-        if request.user.groups.filter(name="Manager"):
+        if has_role(request.user, MANAGER):
             if group in user.groups.all():
                 user.groups.remove(group)
                 return Response("User removed successfully!", status=status.HTTP_200_OK)
@@ -114,16 +185,16 @@ class RemoveUserFromManagerGroup(APIView):
 
 class DeliveryCrewManagerGroup(APIView):
     # Getting all delivery crew group members
+    @conditional('users')
     def get(self, request):
-        users = User.objects.filter(groups__name="Delivery crew")
-        users_data = UserSerializer(users, many=True)
-        if request.user.groups.filter(name="Manager"):
-            return Response(users_data.data)
+        if has_role(request.user, MANAGER):
+            users = UserSerializer.read_queryset(User.objects.filter(groups__name="Delivery crew"), request)
+            return Response(UserSerializer.read_data(users, request))
         return Response("Not authorized to view this page", status=status.HTTP_401_UNAUTHORIZED)
     
     # Adding a user to delivery crew group through the payload
     def post(self, request, format=None):
-        if request.user.groups.filter(name="Manager"):
+        if has_role(request.user, MANAGER):
             serializer = UserSerializer(data=request.data)
             if serializer.is_valid():
                 user = serializer.save()
@@ -143,7 +214,7 @@ class RemoveUserFromDeliveryCrewGroup(APIView):
 
         # Remove user from the deliveryCrewGroup
         group = Group.objects.get(name='Delivery crew')
-        if request.user.groups.filter(name="Manager"):
+        if has_role(request.user, MANAGER):
             if group in user.groups.all():
                 user.groups.remove(group)
                 return Response("User removed successfully!", status=status.HTTP_200_OK)
@@ -155,19 +226,28 @@ class RemoveUserFromDeliveryCrewGroup(APIView):
 #------------------------------------------------
 # Managing the cart view
 #------------------------------------------------
+# Conditional GET validators of the cart endpoints (see cache.conditional),
+# for customers only, as the views
+def cart_validators(view, request):
+    if not has_role(request.user, CUSTOMER):
+        return None
+    return queryset_validators(Cart.objects.filter(user=request.user), nested_menu=True)
+
+
 class CartView(APIView):
+    throttle_scope = 'cart'
+
     # Getting all the cart items that belong to the signed user
+    @conditional('cart', cart_validators)
     def get(self, request):
-        user = request.user
-        carts = Cart.objects.filter(user=user)  
-        serializer = CartSerializer(carts, many=True)
-        if request.user.groups.filter(name="customer"):
-            return Response(serializer.data, status=status.HTTP_200_OK)
+        if has_role(request.user, CUSTOMER):
+            carts = CartSerializer.read_queryset(Cart.objects.filter(user=request.user), request)
+            return Response(CartSerializer.read_data(carts, request), status=status.HTTP_200_OK)
         return Response("Not authorized to view this page", status=status.HTTP_401_UNAUTHORIZED)
 
     # Adding item to cart by a customer
     def post(self, request):
-        if request.user.groups.filter(name="customer"):
+        if has_role(request.user, CUSTOMER):
             serializer = CartSerializer(data=request.data)
             if serializer.is_valid():
                 serializer.save()
@@ -177,6 +257,8 @@ class CartView(APIView):
 
 
 class RemoveCartItem(APIView):
+    throttle_scope = 'cart'
+
     # Getting a particular cart item by the signed in user/customer
     def get_object(self, id):
         try:
@@ -186,7 +268,7 @@ class RemoveCartItem(APIView):
     
     # removing a cart item by the signed in user/customer
     def delete(self, request, id):
-        if request.user.groups.filter(name="customer"):
+        if has_role(request.user, CUSTOMER):
             cart = self.get_object(id)
             if cart.user == request.user:
                 cart.delete()
@@ -195,75 +277,148 @@ class RemoveCartItem(APIView):
         return Response("Not authorized to remove cart!", status=status.HTTP_401_UNAUTHORIZED)
 
 
+class BulkCartView(APIView):
+    # Many cart lines in one request, each call in one transaction. Prices are
+    # taken from the menu, not the payload. Every call answers with the cart.
+    permission_classes = [IsAuthenticated, IsCustomer]
+    throttle_scope = 'cart'
+
+    def cart_response(self, request):
+        carts = CartSerializer.read_queryset(Cart.objects.filter(user=request.user), request)
+        return Response(CartSerializer.read_data(carts, request), status=status.HTTP_200_OK)
+
+    def change(self, request, apply, allow_zero=False):
+        serializer = BulkCartSerializer(data=request.data, context={'allow_zero': allow_zero})
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            apply(request.user, serializer.get_quantities())
+        except CartItemsError as error:
+            return Response({'items': [str(error)]}, status=status.HTTP_400_BAD_REQUEST)
+        return self.cart_response(request)
+
+    # Adds the items, or sets the quantity of those already in the cart
+    def post(self, request):
+        return self.change(request, upsert_cart_items)
+
+    # Changes quantities of lines already in the cart, 0 removes the line
+    def patch(self, request):
+        return self.change(request, update_cart_quantities, allow_zero=True)
+
+    # Empties the cart
+    def delete(self, request):
+        clear_cart(request.user)
+        return Response([], status=status.HTTP_200_OK)
+
+
+class CartSummaryView(APIView):
+    # Line count, item count and subtotal of the cart, overall and per
+    # category, without sending the cart lines themselves
+    permission_classes = [IsAuthenticated, IsCustomer]
+
+    @conditional('cart', cart_validators)
+    def get(self, request):
+        serializer = CartSummarySerializer(cart_summary(request.user))
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+
 #-------------------------------------------------
 # Managing order items
 #-------------------------------------------------
+# The orders a user may see: their own for customers, all of them for
+# managers, the assigned ones for the delivery crew. None for anyone else.
+def visible_orders(user):
+    if has_role(user, CUSTOMER):
+        return Order.objects.filter(user=user)
+    if has_role(user, MANAGER):
+        return Order.objects.all()
+    if has_role(user, DELIVERY_CREW):
+        return Order.objects.filter(delivery_crew=user)
+    return None
+
+
+# Conditional GET validators of the order endpoints. The manager list nests
+# menu items, the menu version covers those.
+def order_list_validators(view, request):
+    orders = visible_orders(request.user)
+    if orders is None:
+        return None
+    return queryset_validators(orders, nested_menu=has_role(request.user, MANAGER))
+
+
+# Only customers may see an order's detail, see OrderDetail.get
+def order_detail_validators(view, request, id):
+    if not has_role(request.user, CUSTOMER):
+        return None
+    return queryset_validators(Order.objects.filter(id=id))
+
+
 class OrderView(APIView):
+    throttle_scope = 'orders'
+
     # Getting the order items by the authenticated user
+    @conditional('orders', order_list_validators)
     def get(self, request):
-        user = request.user
-        orders = Order.objects.filter(user=user)
-        serializer = OrderSerializer(orders, many=True)
-
     # order items by the authenticated user
-        if request.user.groups.filter(name="customer"):
-            return Response(serializer.data, status=status.HTTP_200_OK)
-
-    # all order items       
-        elif request.user.groups.filter(name="Manager"):
-            all_orders = OrderItem.objects.all()
-            all_orders_serializer = OrderItemSerializer(all_orders, many=True)
-            return Response(all_orders_serializer.data, status=status.HTTP_200_OK)
+        if has_role(request.user, CUSTOMER):
+            orders = OrderSerializer.read_queryset(Order.objects.filter(user=request.user), request)
+            return Response(OrderSerializer.read_data(orders, request), status=status.HTTP_200_OK)
+
+    # all order items, streamed with ?stream=1|ndjson
+        elif has_role(request.user, MANAGER):
+            stream_format = get_stream_format(request)
+            if stream_format:
+                all_orders = OrderItemSerializer.read_queryset(OrderItem.objects.order_by('id'), request)
+                return stream_queryset(all_orders, OrderItemSerializer, stream_format, request)
+            all_orders = OrderItemSerializer.read_queryset(OrderItem.objects.all(), request)
+            return Response(OrderItemSerializer.read_data(all_orders, request), status=status.HTTP_200_OK)
 
     # all order items assigned to a particular delivery crew
-        elif request.user.groups.filter(name="Delivery crew"):
+        elif has_role(request.user, DELIVERY_CREW):
             # Get all orders with order items assigned to the delivery crew
-            orders = Order.objects.filter(delivery_crew=request.user)
+            orders = OrderSerializer.read_queryset(Order.objects.filter(delivery_crew=request.user), request)
             # Serialize the orders and return them in a response object
-            serializer = OrderSerializer(orders, many=True)
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            return Response(OrderSerializer.read_data(orders, request), status=status.HTTP_200_OK)
 
         return Response("Not authorized...", status=status.HTTP_401_UNAUTHORIZED)
 
+    # Placing an order from the cart items of the signed in customer.
+    # Send an Idempotency-Key header to make retries of the same submit safe.
     def post(self, request):
-        if request.user.group.filter(name="customer"):
-            user = request.user
-            # Get the cart items for the current user
-            cart_items = Cart.objects.filter(user=user)
-
-            # Create a new order item for each cart item
-            for item in cart_items:
-                order_item = OrderItem.objects.create(
-                order=request.user,
-                menuitem=item.menuitem,
-                quantity=item.quantity,
-                unit_price=item.unit_price,
-                price=item.price,
-            )
-
-            # Delete all the cart items for the current user
-            # client = Client()
-            # response = client.delete('/api/cart/menu-items')
-            cart_items.delete()
-            return Response({"message": "Order items created and cart items deleted successfully."}, status=status.HTTP_201_CREATED)
+        if has_role(request.user, CUSTOMER):
+            idempotency_key = request.headers.get('Idempotency-Key', '')
+            max_length = Order._meta.get_field('idempotency_key').max_length
+            if len(idempotency_key) > max_length:
+                return Response(f"Idempotency-Key is longer than {max_length} characters", status=status.HTTP_400_BAD_REQUEST)
+            try:
+                order, created = checkout(request.user, idempotency_key=idempotency_key)
+            except EmptyCartError:
+                return Response("Cart is empty", status=status.HTTP_400_BAD_REQUEST)
+            except CheckoutError as error:
+                return Response(str(error), status=status.HTTP_400_BAD_REQUEST)
+            serializer = OrderSerializer(order)
+            return Response(serializer.data, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
         return Response(status=status.HTTP_401_UNAUTHORIZED)
 
 
 class OrderDetail(APIView):
+    throttle_scope = 'orders'
+
     # Getting a particular order item
-    def get_object(self, id):
+    def get_object(self, id, request=None):
         try:
-            return Order.objects.get(id=id)
+            return OrderSerializer.setup_eager_loading(Order.objects.all(), request).get(id=id)
         except Order.DoesNotExist:
             pass
             # return Response('Order object not found', status=status.HTTP_404_NOT_FOUND)
 
     # Particular order item detail by a customer
+    @conditional('orders', order_detail_validators)
     def get(self, request, id):
-        order_item = OrderSerializer(self.get_object(id))
+        order_item = OrderSerializer(self.get_object(id, request), context={'request': request})
         # user = order_item.data.get('user').get('username')
         # if request.user.username == user and request.user.groups.filter(name="customer"):
-        if request.user.groups.filter(name="customer"):
+        if has_role(request.user, CUSTOMER):
             return Response(order_item.data, status=status.HTTP_200_OK)
         else:
             return Response("Not authorized to view this page", status=status.HTTP_401_UNAUTHORIZED)
@@ -271,7 +426,9 @@ class OrderDetail(APIView):
     # Update order item by a customer or manager
     def put(self, request, id):
         order_item = OrderSerializer(self.get_object(id))
-        if request.user.groups.filter(name="customer" or "Manager"):
+        # Customers only: the group filter this replaced, name="customer" or
+        # "Manager", only ever matched "customer"
+        if has_role(request.user, CUSTOMER):
             serializer = OrderSerializer(order_item, data=request.data)
             if serializer.is_valid():
                 serializer.save()
@@ -279,7 +436,7 @@ class OrderDetail(APIView):
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
         # Update the status of the particular order item when delivered
-        elif request.user.groups.filter(name="Delivery crew"):
+        elif has_role(request.user, DELIVERY_CREW):
             order = OrderSerializer(order_item, data=request.data)
             if order.is_valid():
                 order.save()
@@ -289,8 +446,153 @@ class OrderDetail(APIView):
     
     # Remove a particular order item by the manager
     def delete(self, request, id):
-        if request.user.groups.filter(name="Manager"):
+        if has_role(request.user, MANAGER):
             order_item = self.get_object(id)
             order_item.delete()
             return Response("Deleted successfully!", status=status.HTTP_404_NOT_FOUND)
-        return Response("Not authorized to remove this order", status=status.HTTP_401_UNAUTHORIZED)
\ No newline at end of file
+        return Response("Not authorized to remove this order", status=status.HTTP_401_UNAUTHORIZED)
+
+
+class DispatchView(APIView):
+    # Assigns pending orders to the delivery crew, least loaded member
+    # first, up to {"limit": n} orders (DISPATCH_BATCH_SIZE by default)
+    permission_classes = [IsAuthenticated, IsManager]
+
+    def post(self, request):
+        try:
+            limit = int(request.data.get('limit', settings.DISPATCH_BATCH_SIZE))
+        except (TypeError, ValueError):
+            return Response({'limit': ['A whole number is required.']}, status=status.HTTP_400_BAD_REQUEST)
+        if limit < 1:
+            return Response({'limit': ['Must be at least 1.']}, status=status.HTTP_400_BAD_REQUEST)
+        assigned = dispatch_batch(limit)
+        return Response({
+            'assigned': sum(assigned.values()),
+            'delivery_crew': [{'id': crew_id, 'orders': count} for crew_id, count in sorted(assigned.items())],
+            'pending': pending_orders().count(),
+        }, status=status.HTTP_200_OK)
+
+
+# The worklist names menu items, the menu version covers their titles
+def worklist_validators(view, request):
+    return queryset_validators(open_orders(request.user), nested_menu=True)
+
+
+class CrewWorklistView(APIView):
+    # The open orders assigned to the signed in delivery crew member, oldest
+    # first, each with its customer and lines, in two queries
+    permission_classes = [IsAuthenticated, IsDeliveryCrew]
+    throttle_scope = 'orders'
+
+    @conditional('orders', worklist_validators)
+    def get(self, request):
+        serializer = WorklistOrderSerializer(crew_worklist(request.user), many=True)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+class DeliverOrdersView(APIView):
+    # Marks {"orders": [id, ...]} delivered in one update, instead of a PUT
+    # per order. Ids not assigned to the caller are listed, not delivered;
+    # orders delivered already are reported delivered, so retries are safe.
+    permission_classes = [IsAuthenticated, IsDeliveryCrew]
+    throttle_scope = 'orders'
+
+    def post(self, request):
+        serializer = DeliverOrdersSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        delivered, not_assigned = mark_delivered(request.user, serializer.validated_data['orders'])
+        return Response({'delivered': delivered, 'not_assigned': not_assigned}, status=status.HTTP_200_OK)
+
+
+# ?from= and ?to= (YYYY-MM-DD) of the summary and analytics endpoints,
+# the last ORDER_SUMMARY_DAYS days by default. Raises ValueError.
+def get_date_range(request):
+    params = request.query_params
+    date_to = date.fromisoformat(params['to']) if 'to' in params else timezone.localdate()
+    date_from = date.fromisoformat(params['from']) if 'from' in params \
+        else date_to - timedelta(days=settings.ORDER_SUMMARY_DAYS - 1)
+    return date_from, date_to
+
+
+DATE_RANGE_ERROR = {'error': 'from and to must be dates (YYYY-MM-DD)'}
+
+
+class OrderSummaryView(APIView):
+    # Orders and totals per day and status: a customer's own orders, every
+    # order for managers, the assigned ones for the delivery crew.
+    @conditional('orders', order_list_validators)
+    def get(self, request):
+        orders = visible_orders(request.user)
+        if orders is None:
+            return Response("Not authorized...", status=status.HTTP_401_UNAUTHORIZED)
+
+        try:
+            date_from, date_to = get_date_range(request)
+        except ValueError:
+            return Response(DATE_RANGE_ERROR, status=status.HTTP_400_BAD_REQUEST)
+        serializer = OrderSummarySerializer(order_summary(orders, date_from, date_to))
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+#-------------------------------------------------
+# Sales analytics
+#-------------------------------------------------
+class AnalyticsView(APIView):
+    # Manager only reports over ?from= and ?to=, served from the rollup
+    # tables in analytics.py, never from the orders themselves
+    permission_classes = [IsAuthenticated, IsManager]
+    serializer_class = None
+
+    @conditional('reports')
+    def get(self, request):
+        try:
+            date_from, date_to = get_date_range(request)
+        except ValueError:
+            return Response(DATE_RANGE_ERROR, status=status.HTTP_400_BAD_REQUEST)
+        rows = self.get_rows(request, date_from, date_to)
+        return Response({
+            'date_from': date_from,
+            'date_to': date_to,
+            'results': self.serializer_class(rows, many=True, context={'request': request}).data,
+        }, status=status.HTTP_200_OK)
+
+
+class RevenueAnalyticsView(AnalyticsView):
+    # Orders, delivered orders and revenue per day
+    serializer_class = DailyRevenueSerializer
+
+    def get_rows(self, request, date_from, date_to):
+        return revenue_by_day(date_from, date_to)
+
+
+class TopMenuItemsAnalyticsView(AnalyticsView):
+    # Best selling menu items by quantity, ?limit= of them (10 by default)
+    serializer_class = TopMenuItemSerializer
+
+    def get_rows(self, request, date_from, date_to):
+        try:
+            limit = min(max(int(request.query_params.get('limit', 10)), 1), 100)
+        except ValueError:
+            limit = 10
+        return top_menu_items(date_from, date_to, limit)
+
+
+class CrewAnalyticsView(AnalyticsView):
+    # Delivered orders and their revenue per delivery crew member
+    serializer_class = CrewThroughputSerializer
+
+    def get_rows(self, request, date_from, date_to):
+        return crew_throughput(date_from, date_to)
+
+
+#-------------------------------------------------
+# Performance metrics
+#-------------------------------------------------
+class MetricsView(APIView):
+    permission_classes = [IsAuthenticated, IsManager]
+
+    # Per-route request metrics in Prometheus text format, for managers only
+    @conditional('metrics')
+    def get(self, request):
+        return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -13,4 +13,10 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported once Django is set up. The order event stream is served next to
+# the Django application, see LittleLemonAPI.sse.
+from LittleLemonAPI.sse import with_order_events  # noqa: E402
+
+application = with_order_events(django_application)
@@ -0,0 +1,23 @@
+"""
+SQLite backend tuned for concurrent writers.
+
+Every new connection gets the PRAGMAs from settings.SQLITE_PRAGMAS (WAL,
+synchronous, busy timeout, mmap size), and transactions start with
+BEGIN IMMEDIATE. A deferred BEGIN takes a read snapshot first, and its first
+write then fails at once with "database is locked" if another writer has
+committed in the meantime, without waiting out the busy timeout.
+"""
+
+from django.conf import settings
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for pragma, value in getattr(settings, 'SQLITE_PRAGMAS', {}).items():
+            conn.execute(f"PRAGMA {pragma} = {value}")
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute("BEGIN IMMEDIATE")
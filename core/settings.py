@@ -45,6 +45,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'LittleLemonAPI.middleware.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -78,13 +79,213 @@ WSGI_APPLICATION = 'core.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.1/ref/settings/#databases
 
-DATABASES = {
+# DB_ENGINE=sqlite (default) runs on a local file through core.backends.sqlite3,
+# which applies SQLITE_PRAGMAS to every new connection and starts transactions
+# with BEGIN IMMEDIATE.
+# DB_ENGINE=postgres or mysql uses a database server with persistent,
+# health-checked connections; install the matching driver (e.g. psycopg2).
+
+DB_ENGINE = config('DB_ENGINE', default='sqlite')
+
+if DB_ENGINE == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'core.backends.sqlite3',
+            'NAME': config('DB_NAME', default=str(BASE_DIR / 'db.sqlite3')),
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': {
+                'postgres': 'django.db.backends.postgresql',
+                'mysql': 'django.db.backends.mysql',
+            }[DB_ENGINE],
+            'NAME': config('DB_NAME', default='littlelemon'),
+            'USER': config('DB_USER', default=''),
+            'PASSWORD': config('DB_PASSWORD', default=''),
+            'HOST': config('DB_HOST', default='localhost'),
+            'PORT': config('DB_PORT', default=''),
+            'CONN_MAX_AGE': config('DB_CONN_MAX_AGE', default=60, cast=int),
+            'CONN_HEALTH_CHECKS': config('DB_CONN_HEALTH_CHECKS', default=True, cast=bool),
+        }
+    }
+
+# WAL lets readers run alongside a writer; synchronous=NORMAL is durable in WAL
+# mode except for the last transactions on power loss; busy_timeout (ms) is
+# how long a writer waits for the lock before failing
+SQLITE_PRAGMAS = {
+    'journal_mode': config('SQLITE_JOURNAL_MODE', default='wal'),
+    'synchronous': config('SQLITE_SYNCHRONOUS', default='normal'),
+    'busy_timeout': config('SQLITE_BUSY_TIMEOUT', default=20000, cast=int),
+    'mmap_size': config('SQLITE_MMAP_SIZE', default=128 * 1024 * 1024, cast=int),
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.1/topics/cache/
+# CACHE_BACKEND selects local-memory (default), file or redis. The local-memory
+# and file backends are bounded by CACHE_MAX_ENTRIES (local memory evicts the
+# least recently used entries); bound redis with maxmemory + allkeys-lru.
+# Local memory is private to each worker process, so an invalidation only
+# reaches the worker that made it: see the authorization caches below.
+
+CACHE_BACKEND = config('CACHE_BACKEND', default='locmem')
+
+CACHE_BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'redis': 'django.core.cache.backends.redis.RedisCache',
+}
+
+CACHE_LOCATIONS = {
+    'locmem': 'littlelemon',
+    'file': str(BASE_DIR / '.cache'),
+    'redis': 'redis://127.0.0.1:6379/1',
+}
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': CACHE_BACKENDS[CACHE_BACKEND],
+        'LOCATION': config('CACHE_LOCATION', default=CACHE_LOCATIONS[CACHE_BACKEND]),
     }
 }
 
+if CACHE_BACKEND != 'redis':
+    CACHES['default']['OPTIONS'] = {
+        'MAX_ENTRIES': config('CACHE_MAX_ENTRIES', default=1000, cast=int),
+    }
+
+# Menu payloads are versioned, so the timeout only bounds how long an orphaned
+# entry can linger
+MENU_CACHE_TIMEOUT = config('MENU_CACHE_TIMEOUT', default=3600, cast=int)
+
+# Authorization caches. Invalidation deletes the entry from the cache of the
+# process that made the change, so they are only safe when every worker
+# shares the cache (file on one host, or redis). With the per-process
+# local-memory cache a user removed from a group, or a logged out token,
+# would keep working in the other workers until the entry expired, so they
+# are off there by default, or short for the token cache (0 turns a cache
+# off; only enable them fully with locmem when running a single worker).
+AUTH_CACHE_DEFAULT_TIMEOUT = 0 if CACHE_BACKEND == 'locmem' else 300
+
+# Cached group names per user, invalidated when group membership changes
+ROLES_CACHE_TIMEOUT = config('ROLES_CACHE_TIMEOUT', default=AUTH_CACHE_DEFAULT_TIMEOUT, cast=int)
+
+# Cached token -> user lookups, so authenticating takes no query; dropped on
+# logout and when the user is saved or deleted. Token authentication runs on
+# every request, so with locmem it stays on but for 30 seconds: as long as a
+# logged out token, or a deactivated user, can keep working in other workers.
+TOKEN_CACHE_TIMEOUT = config('TOKEN_CACHE_TIMEOUT', default=30 if CACHE_BACKEND == 'locmem' else 300, cast=int)
+
+# Cache-Control of the API responses, by policy name (see cache.conditional).
+# Everything is private as every response depends on who asks. The menu may
+# be reused for a while, carts and orders are revalidated with ETags every
+# time, which costs a 304 when nothing changed.
+CACHE_CONTROL = {
+    'menu': {'private': True, 'max_age': config('MENU_MAX_AGE', default=60, cast=int)},
+    'cart': {'private': True, 'no_cache': True},
+    'orders': {'private': True, 'no_cache': True},
+    'users': {'private': True, 'no_cache': True},
+    'reports': {'private': True, 'max_age': config('REPORTS_MAX_AGE', default=300, cast=int)},
+    'metrics': {'no_store': True},
+}
+
+
+# Share of requests measured by PerformanceMiddleware (0 to 1). Measured
+# requests feed /api/metrics and get a Server-Timing header.
+METRICS_SAMPLE_RATE = config('METRICS_SAMPLE_RATE', default=0.1, cast=float)
+
+# Pending orders assigned per dispatch transaction
+DISPATCH_BATCH_SIZE = config('DISPATCH_BATCH_SIZE', default=1000, cast=int)
+
+# Most open orders dispatch hands a delivery crew member, 0 for no limit
+DISPATCH_MAX_OPEN_ORDERS = config('DISPATCH_MAX_OPEN_ORDERS', default=0, cast=int)
+
+# Most orders a delivery crew member can mark delivered in one request
+DELIVERY_BATCH_SIZE = config('DELIVERY_BATCH_SIZE', default=200, cast=int)
+
+# Days covered by the order summary when no ?from= is given
+ORDER_SUMMARY_DAYS = config('ORDER_SUMMARY_DAYS', default=30, cast=int)
+
+
+# Job queue
+# Checkout's side effects (receipt, kitchen ticket) run on the run_jobs
+# workers. A worker leases JOBS_BATCH_SIZE jobs for JOBS_LEASE seconds,
+# which must be enough to run them all, and polls every JOBS_POLL_INTERVAL
+# seconds when idle. Failed jobs are retried after JOBS_RETRY_DELAY
+# seconds, doubling up to JOBS_RETRY_MAX_DELAY, JOBS_MAX_ATTEMPTS times.
+
+JOBS_BATCH_SIZE = config('JOBS_BATCH_SIZE', default=10, cast=int)
+JOBS_LEASE = config('JOBS_LEASE', default=60, cast=int)
+JOBS_POLL_INTERVAL = config('JOBS_POLL_INTERVAL', default=1.0, cast=float)
+JOBS_MAX_ATTEMPTS = config('JOBS_MAX_ATTEMPTS', default=5, cast=int)
+JOBS_RETRY_DELAY = config('JOBS_RETRY_DELAY', default=5, cast=int)
+JOBS_RETRY_MAX_DELAY = config('JOBS_RETRY_MAX_DELAY', default=600, cast=int)
+
+# Order receipts; printed to the console unless an email backend is set
+EMAIL_BACKEND = config('EMAIL_BACKEND', default='django.core.mail.backends.console.EmailBackend')
+DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL', default='orders@littlelemon.local')
+
+
+# Order events
+# EVENTS_BACKEND selects the pub/sub behind the order event stream: inprocess
+# (default) only reaches clients connected to the same worker, redis shares
+# events between workers and needs the redis package.
+
+EVENTS_BACKEND_NAME = config('EVENTS_BACKEND', default='inprocess')
+
+EVENTS_BACKENDS = {
+    'inprocess': ('LittleLemonAPI.events.InProcessBroker', {
+        'max_queued': config('EVENTS_MAX_QUEUED', default=100, cast=int),
+    }),
+    'redis': ('LittleLemonAPI.events.RedisBroker', {
+        'location': config('EVENTS_LOCATION', default='redis://127.0.0.1:6379/2'),
+    }),
+}
+
+EVENTS_BACKEND, EVENTS_OPTIONS = EVENTS_BACKENDS[EVENTS_BACKEND_NAME]
+
+# Seconds between keep-alive comments on an idle event stream, so proxies
+# don't close it
+SSE_HEARTBEAT = config('SSE_HEARTBEAT', default=15, cast=int)
+
+# Delay in milliseconds before a browser reconnects a dropped event stream
+SSE_RETRY = config('SSE_RETRY', default=3000, cast=int)
+
+
+# Menu search
+# SEARCH_BACKEND selects the index behind /api/menu-items/search: fts5 (the
+# SQLite FTS5 table from migration 0010), memory (an inverted index in each
+# process) or auto (default), fts5 when that table exists and memory
+# otherwise.
+
+SEARCH_BACKEND_NAME = config('SEARCH_BACKEND', default='auto')
+
+SEARCH_BACKENDS = {
+    'auto': ('LittleLemonAPI.search.auto_index', {}),
+    'fts5': ('LittleLemonAPI.search.FTS5Index', {}),
+    'memory': ('LittleLemonAPI.search.MemoryIndex', {}),
+}
+
+SEARCH_BACKEND, SEARCH_OPTIONS = SEARCH_BACKENDS[SEARCH_BACKEND_NAME]
+
+# Words this long match as prefixes (type-ahead), shorter ones only whole
+SEARCH_MIN_PREFIX = config('SEARCH_MIN_PREFIX', default=2, cast=int)
+
+# Opt-in bound on the matches the FTS5 index ranks per search, the newest
+# first; 0 (default) ranks them all. Bounding trades exact ranking on broad
+# queries for speed, see search.FTS5Index.
+SEARCH_CANDIDATES = config('SEARCH_CANDIDATES', default=0, cast=int)
+
+# Results per search by default, and the most a client can ask for
+SEARCH_RESULTS = config('SEARCH_RESULTS', default=10, cast=int)
+SEARCH_MAX_RESULTS = config('SEARCH_MAX_RESULTS', default=50, cast=int)
+
+
+# Rows validated and written per transaction by import_menu
+IMPORT_BATCH_SIZE = config('IMPORT_BATCH_SIZE', default=1000, cast=int)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
@@ -133,11 +334,80 @@ REST_FRAMEWORK = {
     ],
 
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'LittleLemonAPI.authentication.CachedTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
-    ]
+    ],
+
+    # See LittleLemonAPI/throttling.py and the THROTTLE_* settings
+    'DEFAULT_THROTTLE_CLASSES': [
+        'LittleLemonAPI.throttling.RoleRateThrottle',
+        'LittleLemonAPI.throttling.EndpointRateThrottle',
+    ],
+
+    # JSON (the default) or MessagePack by Accept header or ?format=, both
+    # compressed per the RESPONSE_COMPRESSION_* settings. See
+    # LittleLemonAPI/renderers.py
+    'DEFAULT_RENDERER_CLASSES': [
+        'LittleLemonAPI.renderers.FastJSONRenderer',
+        'LittleLemonAPI.renderers.MessagePackRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+
+    'DEFAULT_PARSER_CLASSES': [
+        'rest_framework.parsers.JSONParser',
+        'LittleLemonAPI.renderers.MessagePackParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
 
+# Response compression
+# Rendered bodies of at least RESPONSE_COMPRESSION_MIN_BYTES are compressed
+# with the first of RESPONSE_COMPRESSION_ENCODINGS the client accepts; br
+# needs the brotli package and is skipped without it. Smaller bodies gain
+# too little to be worth the CPU. An empty list turns compression off.
+RESPONSE_COMPRESSION_MIN_BYTES = config('RESPONSE_COMPRESSION_MIN_BYTES', default=1024, cast=int)
+RESPONSE_COMPRESSION_ENCODINGS = ['br', 'gzip']
+RESPONSE_COMPRESSION_LEVELS = {'br': 4, 'gzip': 6}
+
+# Throttling
+# Sliding window limits as '<requests>/<s|min|hour|day>', None for no limit.
+# THROTTLE_RATES applies to each user over every endpoint, by role (the most
+# generous of the user's roles wins; 'user' for users without one, 'anon'
+# per address). THROTTLE_SCOPE_RATES adds limits on the views with that
+# throttle_scope, for one method ('orders.post') or all of them ('cart').
+# THROTTLE_STORE selects where the counters live: local (this process only)
+# or cache (the default cache, shared between workers when it is redis; the
+# bounded local-memory and file caches cull counters once CACHE_MAX_ENTRIES
+# is reached, letting those users through).
+
+THROTTLE_RATES = {
+    'anon': config('THROTTLE_ANON_RATE', default='60/min'),
+    'user': config('THROTTLE_USER_RATE', default='300/min'),
+    'customer': config('THROTTLE_CUSTOMER_RATE', default='600/min'),
+    'Delivery crew': config('THROTTLE_DELIVERY_CREW_RATE', default='600/min'),
+    'Manager': config('THROTTLE_MANAGER_RATE', default='1200/min'),
+}
+
+THROTTLE_SCOPE_RATES = {
+    # Polling the order list, the event stream is the way to follow orders
+    'orders.get': {'customer': '120/min', 'Delivery crew': '240/min'},
+    # Checkout
+    'orders.post': {'customer': '20/min'},
+    'cart': {'customer': '240/min'},
+}
+
+THROTTLE_STORE_NAME = config('THROTTLE_STORE', default='local')
+
+THROTTLE_STORES = {
+    'local': ('LittleLemonAPI.throttling.LocalMemoryStore', {
+        'max_entries': config('THROTTLE_MAX_ENTRIES', default=10000, cast=int),
+    }),
+    'cache': ('LittleLemonAPI.throttling.CacheStore', {}),
+}
+
+THROTTLE_STORE, THROTTLE_STORE_OPTIONS = THROTTLE_STORES[THROTTLE_STORE_NAME]
+
 # DJOSER CONFIGURATION
 DJOSER ={
     "USER_ID_FIELD":"username"